@@ -0,0 +1,117 @@
+import sys
+import os
+import time
+import sqlite3
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    EMAIL_RECIPIENT,
+    ALERT_STATE_PATH,
+    ALERT_COOLDOWN_HOURS,
+    ALERT_MIN_PRICE_DROP,
+)
+
+
+def alert_key(row, default_recipient=EMAIL_RECIPIENT):
+    """(recipient, origin, sky_id) of an alert row.
+
+    Rows without a subscription go to default_recipient, rows without an origin
+    have origin "" (missing values may be None or NaN).
+    """
+    email, origin = row.get("email"), row.get("origin")
+    return (
+        email if isinstance(email, str) else default_recipient,
+        origin if isinstance(origin, str) else "",
+        row["sky_id"],
+    )
+
+
+class AlertStateStore:
+    """Last alerted price and time per recipient and destination, in SQLite.
+
+    Within the cooldown a destination is alerted again only when its price fell
+    by more than min_drop percent since the last alert. Entries older than the
+    cooldown no longer suppress anything and are deleted when alerts are recorded.
+    """
+
+    def __init__(
+        self,
+        path=ALERT_STATE_PATH,
+        cooldown_hours=ALERT_COOLDOWN_HOURS,
+        min_drop=ALERT_MIN_PRICE_DROP,
+    ):
+        self.path = path
+        self.cooldown = cooldown_hours * 3600
+        self.min_drop = min_drop
+
+    def enabled(self):
+        return self.cooldown > 0
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS alerts ("
+            "recipient TEXT, origin TEXT, sky_id TEXT, price REAL, alerted_at REAL, "
+            "PRIMARY KEY (recipient, origin, sky_id)) WITHOUT ROWID"
+        )
+        return connection
+
+    def last_alerts(self, keys):
+        """(price, alerted_at) of the last alert for each key, None if there is none."""
+        connection = self._connect()
+        try:
+            # One primary key lookup per candidate, on a single connection.
+            return [
+                connection.execute(
+                    "SELECT price, alerted_at FROM alerts "
+                    "WHERE recipient = ? AND origin = ? AND sky_id = ?",
+                    key,
+                ).fetchone()
+                for key in keys
+            ]
+        finally:
+            connection.close()
+
+    def suppress(self, alerts, now=None):
+        """Alert rows (a DataFrame) minus those suppressed by an earlier alert."""
+        if not self.enabled() or alerts.empty:
+            return alerts
+        now = time.time() if now is None else now
+        previous = self.last_alerts(
+            [alert_key(row) for row in alerts.to_dict(orient="records")]
+        )
+        last_price = np.array(
+            [np.nan if p is None else p[0] for p in previous], dtype=float
+        )
+        last_alerted_at = np.array(
+            [np.nan if p is None else p[1] for p in previous], dtype=float
+        )
+        price = alerts["cheapest_price"].to_numpy(dtype=float)
+        # NaN comparisons are False, so destinations never alerted are kept.
+        cooling_down = now - last_alerted_at < self.cooldown
+        not_cheaper = price >= last_price * (1 - self.min_drop / 100)
+        return alerts[~(cooling_down & not_cheaper)]
+
+    def record(self, rows, now=None):
+        """Stores rows as the last alerts and drops entries past the cooldown."""
+        if not self.enabled():
+            return
+        now = time.time() if now is None else now
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO alerts VALUES (?, ?, ?, ?, ?)",
+                    [(*alert_key(row), row["cheapest_price"], now) for row in rows],
+                )
+                connection.execute(
+                    "DELETE FROM alerts WHERE alerted_at < ?", (now - self.cooldown,)
+                )
+        finally:
+            connection.close()
+
+
+alert_state = AlertStateStore()
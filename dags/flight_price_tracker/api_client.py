@@ -0,0 +1,105 @@
+import sys
+import os
+import json
+import base64
+import asyncio
+import logging
+import aiohttp
+from airflow.exceptions import AirflowException
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    API_CONFIG,
+    ORIGINS,
+    DATE_WINDOWS,
+    FETCH_CONCURRENCY,
+    FETCH_TIMEOUT,
+)
+from rate_limiter import scheduler
+from response_cache import response_cache
+
+logger = logging.getLogger("airflow.task")
+
+URL = API_CONFIG["url"]
+HEADERS = API_CONFIG["headers"]
+
+
+def build_search_params(origins=None, date_windows=None):
+    """Expands configured origins and optional date windows into request params."""
+    origins = ORIGINS if origins is None else origins
+    date_windows = DATE_WINDOWS if date_windows is None else date_windows
+    if not date_windows:
+        return [dict(origin) for origin in origins]
+    return [{**origin, **window} for origin in origins for window in date_windows]
+
+
+def origin_label(params):
+    """Returns a readable origin code (e.g. WARS) decoded from fromEntityId."""
+    entity_id = params["fromEntityId"]
+    try:
+        return json.loads(base64.b64decode(entity_id))["s"]
+    except (ValueError, KeyError, TypeError):
+        return entity_id
+
+
+def extract_results(payload):
+    return payload["data"]["everywhereDestination"]["results"]
+
+
+def fetch_origin(params, url=URL, headers=HEADERS):
+    """Fetches quotes for a single origin with a blocking request."""
+    cached = response_cache.get(url, params)
+    if cached is not None:
+        return cached
+    response = scheduler.get(url, params=params, headers=headers, timeout=FETCH_TIMEOUT)
+    if response.status_code != 200:
+        raise AirflowException(
+            f"Error fecthing data. Status code {response.status_code}"
+        )
+    results = extract_results(response.json())
+    response_cache.put(url, params, results)
+    return results
+
+
+async def _fetch_origin_async(session, semaphore, url, params, headers):
+    cached = response_cache.get(url, params)
+    if cached is not None:
+        return cached
+    async with semaphore:
+        status, payload = await scheduler.get_async(
+            session, url, params=params, headers=headers
+        )
+        if status != 200:
+            raise AirflowException(f"Error fecthing data. Status code {status}")
+    results = extract_results(payload)
+    response_cache.put(url, params, results)
+    return results
+
+
+async def _fetch_origins_async(search_params, url, headers, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(
+            *(
+                _fetch_origin_async(session, semaphore, url, params, headers)
+                for params in search_params
+            ),
+            return_exceptions=True,
+        )
+
+
+def fetch_origins(search_params, url=URL, headers=HEADERS, concurrency=None):
+    """Fetches all origins concurrently over one pooled keep-alive session.
+
+    Returns a list of (params, results) pairs where results is either the list of
+    destination quotes or the exception raised for that origin.
+    """
+    concurrency = concurrency or FETCH_CONCURRENCY
+    # requests silently drops None headers (e.g. an unset API key), aiohttp does not.
+    headers = {key: value for key, value in headers.items() if value is not None}
+    results = asyncio.run(
+        _fetch_origins_async(search_params, url, headers, concurrency)
+    )
+    return list(zip(search_params, results))
@@ -0,0 +1,148 @@
+import sys
+import os
+import re
+import time
+import shutil
+import itertools
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import ARTIFACT_STORE, ARTIFACT_RETENTION_DAYS, LOCAL_STATE_DIR
+
+
+class LocalArtifactStore:
+    """Stores task payloads as Arrow IPC files, one directory per DAG run."""
+
+    def __init__(self, root=os.path.join(LOCAL_STATE_DIR, "artifacts")):
+        self.root = root
+
+    def write(self, run_id, name, table):
+        run_dir = os.path.join(self.root, re.sub(r"[^\w.-]", "_", run_id))
+        os.makedirs(run_dir, exist_ok=True)
+        path = os.path.join(run_dir, f"{name}.arrow")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        return path
+
+    def read(self, path):
+        """Memory-maps the file; column buffers are read lazily from the page cache."""
+        with pa.memory_map(path, "r") as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def purge(self, retention_days=ARTIFACT_RETENTION_DAYS):
+        """Removes run directories older than the retention period."""
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - retention_days * 86400
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+ARTIFACT_STORES = {"local": LocalArtifactStore}
+
+
+def get_artifact_store():
+    """Returns the configured artifact store, or None when payloads go through XCom."""
+    store_cls = ARTIFACT_STORES.get(ARTIFACT_STORE)
+    return store_cls() if store_cls else None
+
+
+def to_table(rows):
+    if isinstance(rows, pa.Table):
+        return rows
+    if isinstance(rows, pd.DataFrame):
+        return pa.Table.from_pandas(rows, preserve_index=False)
+    return pa.Table.from_struct_array(pa.array(rows))
+
+
+def is_reference(value):
+    return isinstance(value, dict) and "artifact" in value
+
+
+def _map_index(ti):
+    map_index = getattr(ti, "map_index", -1)
+    return map_index if isinstance(map_index, int) else -1
+
+
+def push_rows(ti, key, rows):
+    """Pushes rows (list of dicts or DataFrame) as XCom, or as an artifact reference."""
+    store = get_artifact_store()
+    if store is None:
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.to_dict(orient="records")
+        ti.xcom_push(key=key, value=rows)
+        return
+    path = None
+    if len(rows):
+        map_index = _map_index(ti)
+        name = (
+            f"{ti.task_id}.{key}"
+            if map_index < 0
+            else f"{ti.task_id}.{map_index}.{key}"
+        )
+        path = store.write(ti.run_id, name, to_table(rows))
+    ti.xcom_push(key=key, value={"artifact": path, "rows": len(rows)})
+
+
+def pull_value(ti, task_ids, key):
+    """Pulls an XCom, from the caller's own shard when the caller is a mapped task."""
+    map_index = _map_index(ti)
+    if map_index < 0:
+        return ti.xcom_pull(task_ids=task_ids, key=key)
+    return ti.xcom_pull(task_ids=task_ids, key=key, map_indexes=map_index)
+
+
+def pull_shards(ti, task_ids, key):
+    """XCom values of every shard of a mapped task, or its one value if not mapped."""
+    value = ti.xcom_pull(task_ids=task_ids, key=key)
+    # Pulls from mapped tasks return a lazy sequence rather than a list.
+    if value is None or isinstance(value, (list, dict)):
+        return [value]
+    return list(value)
+
+
+def load_rows(value):
+    """Rows of a push_rows XCom value: an Arrow table or a list of dicts."""
+    if not is_reference(value):
+        return value
+    if value["artifact"] is None:
+        return []
+    return get_artifact_store().read(value["artifact"])
+
+
+def pull_table(ti, task_ids, key):
+    """Pulls rows pushed with push_rows as an Arrow table, or a list of dicts from XCom."""
+    return load_rows(pull_value(ti, task_ids, key))
+
+
+def iter_rows(rows):
+    """Iterates dicts from a list of dicts or, batch by batch, from an Arrow table."""
+    if isinstance(rows, pa.Table):
+        return (row for batch in rows.to_batches() for row in batch.to_pylist())
+    return rows
+
+
+def to_frame(rows, columns=None):
+    """Columns (default all) of a list of dicts or an Arrow table as a DataFrame."""
+    if isinstance(rows, pa.Table):
+        return (rows if columns is None else rows.select(columns)).to_pandas()
+    return pd.DataFrame(rows, columns=columns)
+
+
+def pull_rows(ti, task_ids, key):
+    """Pulls rows pushed with push_rows by every shard as an iterable of dicts."""
+    return itertools.chain.from_iterable(
+        iter_rows(load_rows(value)) or () for value in pull_shards(ti, task_ids, key)
+    )
+
+
+def row_count(value):
+    """Number of rows in an XCom value pushed by push_rows."""
+    if is_reference(value):
+        return value["rows"]
+    return len(value) if value else 0
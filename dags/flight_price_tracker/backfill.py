@@ -0,0 +1,218 @@
+"""Loads archived API responses into the price history and seeds its statistics.
+
+    python backfill.py ARCHIVE_DIR [--workers 8]
+
+Archive files are .json (one response), .ndjson or .jsonl (one response per
+line), optionally gzipped. Each response is transformed like prepare_price_alerts
+does, with the time it was fetched as timestamp, and written with the configured
+storage backend. Loaded files are checkpointed, so an interrupted backfill
+resumes where it stopped when run again.
+"""
+
+import sys
+import os
+import json
+import gzip
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import LOCAL_STATE_DIR
+from api_client import extract_results, origin_label
+from data_pipeline import extract_flight_prices
+from storage_backend import get_storage_backend
+
+logger = logging.getLogger("airflow.task")
+
+ARCHIVE_SUFFIXES = (".json", ".ndjson", ".jsonl")
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+# Raw results transformed at once, bounding a worker's memory on large files.
+TRANSFORM_BATCH = 50000
+
+
+def _archive_name(path):
+    return path[: -len(".gz")] if path.endswith(".gz") else path
+
+
+def archive_files(directory):
+    """Archive files under directory, sorted by path."""
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if _archive_name(name).endswith(ARCHIVE_SUFFIXES)
+    )
+
+
+def iter_records(path):
+    """Streams the archived responses of a file, line by line for NDJSON."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        if _archive_name(path).endswith(".json"):
+            yield json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def fetch_time(envelope):
+    """Local time a response was fetched, from its "timestamp" or "stored_at"."""
+    if "timestamp" in envelope:
+        fetched_at = datetime.fromisoformat(envelope["timestamp"])
+        if fetched_at.tzinfo is not None:
+            fetched_at = fetched_at.astimezone().replace(tzinfo=None)
+        return fetched_at
+    if "stored_at" in envelope:
+        return datetime.fromtimestamp(envelope["stored_at"])
+    return None
+
+
+def record_results(record, default_time):
+    """Results of an archived response, tagged like fetch_data tags them.
+
+    A record is an API response, a list of results, or an envelope holding the
+    response as "payload" or its results as "results", with the fetch time as
+    "timestamp" (ISO) or "stored_at" (epoch seconds, as in the response cache)
+    and the origin as "origin" or the request "params". Without a fetch time the
+    results get default_time.
+    """
+    envelope = record if isinstance(record, dict) and "data" not in record else {}
+    payload = envelope.get("payload", envelope.get("results", record))
+    results = extract_results(payload) if isinstance(payload, dict) else payload
+    timestamp = (fetch_time(envelope) or default_time).strftime(TIMESTAMP_FORMAT)
+    origin = envelope.get("origin")
+    if origin is None and "params" in envelope:
+        origin = origin_label(envelope["params"])
+    for entry in results:
+        entry["timestamp"] = timestamp
+        if origin is not None:
+            entry["origin"] = origin
+    return results
+
+
+def transform_file(path):
+    """Path and rows of an archive file, built as prepare_price_alerts builds them.
+
+    Responses without fetch times take the file's modification time, one
+    microsecond apart, so quotes of different responses keep distinct ids.
+    """
+    mtime = datetime.fromtimestamp(os.path.getmtime(path))
+    frames, data = [], []
+    for number, record in enumerate(iter_records(path)):
+        default_time = mtime + timedelta(microseconds=number)
+        data.extend(record_results(record, default_time))
+        if len(data) >= TRANSFORM_BATCH:
+            frames.append(extract_flight_prices(data))
+            data = []
+    if data or not frames:
+        frames.append(extract_flight_prices(data))
+    rows = pd.concat(frames, ignore_index=True)
+    return path, pa.Table.from_pandas(rows, preserve_index=False)
+
+
+class BackfillCheckpoint:
+    """Archive files already loaded and their row counts, kept in a JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                self.loaded = json.load(f)
+        except FileNotFoundError:
+            self.loaded = {}
+
+    def mark(self, path, rows):
+        self.loaded[path] = rows
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.loaded, f)
+        os.replace(tmp_path, self.path)
+
+
+def default_checkpoint(directory):
+    """Checkpoint path in the state directory, one per archive directory."""
+    key = hashlib.sha256(os.path.abspath(directory).encode()).hexdigest()[:16]
+    return os.path.join(LOCAL_STATE_DIR, "backfill", f"{key}.json")
+
+
+def run_backfill(directory, storage=None, workers=None, checkpoint=None):
+    """Transforms the archive in a process pool and writes the rows as they arrive.
+
+    Statistics are seeded once, after every file was loaded. Rows are written with
+    deterministic ids or file names, so a file interrupted while being written
+    does not duplicate quotes when it is loaded again. Returns the rows loaded.
+    """
+    storage = storage or get_storage_backend()
+    checkpoint = BackfillCheckpoint(checkpoint or default_checkpoint(directory))
+    paths = [
+        path
+        for path in archive_files(os.path.abspath(directory))
+        if path not in checkpoint.loaded
+    ]
+    workers = workers or os.cpu_count()
+    logger.info(
+        "Backfilling %d archive files, %d already loaded.",
+        len(paths),
+        len(checkpoint.loaded),
+    )
+    start = time.perf_counter()
+    files = loaded = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        remaining = iter(paths)
+        while True:
+            # A few files are parsed ahead, so transformed rows never pile up.
+            for path in remaining:
+                pending.add(executor.submit(transform_file, path))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, rows = future.result()
+                storage.write(rows)
+                checkpoint.mark(path, rows.num_rows)
+                files += 1
+                loaded += rows.num_rows
+            elapsed = time.perf_counter() - start
+            logger.info(
+                "%d/%d files, %d rows in %.0fs (%.0f rows/s), %.0fs left",
+                files,
+                len(paths),
+                loaded,
+                elapsed,
+                loaded / elapsed,
+                elapsed / files * (len(paths) - files),
+            )
+    logger.info("Seeding statistics from the loaded history.")
+    storage.seed_statistics()
+    return loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory of archived API responses")
+    parser.add_argument("--workers", type=int, help="transform processes (CPUs)")
+    parser.add_argument("--checkpoint", help="checkpoint file of loaded archives")
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint, load all"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    checkpoint = args.checkpoint or default_checkpoint(args.directory)
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    run_backfill(args.directory, workers=args.workers, checkpoint=checkpoint)
+
+
+if __name__ == "__main__":
+    main()
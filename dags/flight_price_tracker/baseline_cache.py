@@ -0,0 +1,198 @@
+import sys
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    LOCAL_STATE_DIR,
+    BASELINE_CACHE_BACKEND,
+    BASELINE_CACHE_TTL,
+    BASELINE_CACHE_SIZE,
+    BASELINE_CACHE_REDIS_URL,
+)
+
+logger = logging.getLogger("airflow.task")
+
+# Longest a run waits for another run computing the same baseline.
+LOCK_TIMEOUT = 600
+
+
+def cache_key(parts):
+    raw = json.dumps(parts, sort_keys=True, default=list)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def encode_statistics(statistics):
+    """JSON-safe form of key -> (mean, std); keys may be tuples of group fields."""
+    return [
+        [list(key) if isinstance(key, tuple) else key, *value]
+        for key, value in statistics.items()
+    ]
+
+
+def decode_statistics(items):
+    return {
+        tuple(key) if isinstance(key, list) else key: (mean, std)
+        for key, mean, std in items
+    }
+
+
+class LocalBaselineStore:
+    """Baselines and the index version as files, shared by tasks on one worker."""
+
+    def __init__(self, directory=os.path.join(LOCAL_STATE_DIR, "baselines")):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, key):
+        try:
+            with open(self._path(f"{key}.json"), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, entry, ttl):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(f"{key}.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def version(self):
+        try:
+            with open(self._path("version"), "r") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def bump_version(self):
+        with self.lock("version"):
+            version = self.version() + 1
+            with open(self._path("version"), "w") as f:
+                f.write(str(version))
+        return version
+
+    @contextmanager
+    def lock(self, key):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(f"{key}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RedisBaselineStore:
+    """Baselines and the index version in Redis, shared by all workers."""
+
+    prefix = "flight_price_tracker:baseline:"
+
+    def __init__(self, url=BASELINE_CACHE_REDIS_URL):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(f"{self.prefix}{key}")
+        return json.loads(value) if value else None
+
+    def put(self, key, entry, ttl):
+        self.client.set(f"{self.prefix}{key}", json.dumps(entry), ex=int(ttl))
+
+    def version(self):
+        return int(self.client.get(f"{self.prefix}version") or 0)
+
+    def bump_version(self):
+        return self.client.incr(f"{self.prefix}version")
+
+    @contextmanager
+    def lock(self, key):
+        with self.client.lock(
+            f"{self.prefix}{key}.lock",
+            timeout=LOCK_TIMEOUT,
+            blocking_timeout=LOCK_TIMEOUT,
+        ):
+            yield
+
+
+BASELINE_STORES = {"local": LocalBaselineStore, "redis": RedisBaselineStore}
+
+
+class BaselineCache:
+    """Alert baselines cached in process (LRU) and in a store shared by runs.
+
+    Entries expire after ttl seconds and are invalidated when index_data bumps the
+    store's version. Concurrent runs missing the same entry compute it once.
+    """
+
+    def __init__(
+        self, store=None, ttl=BASELINE_CACHE_TTL, max_entries=BASELINE_CACHE_SIZE
+    ):
+        self._store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @property
+    def store(self):
+        # Created on first use, so the Redis client is only imported when configured.
+        if self._store is None:
+            self._store = BASELINE_STORES[BASELINE_CACHE_BACKEND]()
+        return self._store
+
+    def _fresh(self, entry, version):
+        return (
+            entry is not None
+            and entry["version"] == version
+            and time.time() - entry["stored_at"] <= self.ttl
+        )
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, parts, compute):
+        """Cached baseline for the key parts, computed with compute() when stale."""
+        if self.ttl <= 0:
+            return compute()
+        key = cache_key(parts)
+        version = self.store.version()
+        entry = self._entries.get(key)
+        if self._fresh(entry, version):
+            self._entries.move_to_end(key)
+            return decode_statistics(entry["statistics"])
+        entry = self.store.get(key)
+        if not self._fresh(entry, version):
+            with self.store.lock(key):
+                # Another run may have computed it while this one waited.
+                entry = self.store.get(key)
+                if not self._fresh(entry, version):
+                    logger.info("Computing baseline statistics for %s", parts)
+                    entry = {
+                        "version": version,
+                        "stored_at": time.time(),
+                        "statistics": encode_statistics(compute()),
+                    }
+                    self.store.put(key, entry, self.ttl)
+        self._remember(key, entry)
+        return decode_statistics(entry["statistics"])
+
+    def bump_version(self):
+        """Invalidates cached baselines after new prices were indexed."""
+        if self.ttl > 0:
+            self.store.bump_version()
+
+
+baseline_cache = BaselineCache()
@@ -6,7 +6,10 @@ AIRFLOW_VAR_FLIGHT_DATA_API_KEY = os.getenv("AIRFLOW_VAR_FLIGHT_DATA_API_KEY")
 EMAIL_RECIPIENT = os.getenv("AIRFLOW_VAR_EMAIL_RECIPIENT")
 INDEX = "flight_prices"
 API_CONFIG = {
-    "url": "https://sky-scanner3.p.rapidapi.com/flights/search-roundtrip",
+    "url": os.getenv(
+        "AIRFLOW_VAR_FLIGHT_API_URL",
+        "https://sky-scanner3.p.rapidapi.com/flights/search-roundtrip",
+    ),
     "params": {
         "fromEntityId": "eyJlIjoiMjc1NDc0NTQiLCJzIjoiV0FSUyIsImgiOiIyNzU0NzQ1NCIsInQiOiJDSVRZIn0="
     },
@@ -16,3 +19,155 @@ API_CONFIG = {
     },
 }
 MIN_COUNT = 30
+
+# Comma separated fromEntityIds; defaults to the single origin in API_CONFIG.
+ORIGINS = [
+    {"fromEntityId": entity_id.strip()}
+    for entity_id in os.getenv(
+        "AIRFLOW_VAR_FLIGHT_ORIGINS", API_CONFIG["params"]["fromEntityId"]
+    ).split(",")
+    if entity_id.strip()
+]
+# Optional comma separated "departDate:returnDate" pairs searched for every origin.
+DATE_WINDOWS = [
+    dict(zip(("departDate", "returnDate"), window.strip().split(":")))
+    for window in os.getenv("AIRFLOW_VAR_FLIGHT_DATE_WINDOWS", "").split(",")
+    if window.strip()
+]
+FETCH_CONCURRENCY = int(os.getenv("AIRFLOW_VAR_FETCH_CONCURRENCY", "8"))
+FETCH_TIMEOUT = 20
+
+# RapidAPI plan limits shared by all concurrently running fetch tasks.
+API_RATE_LIMIT = float(os.getenv("AIRFLOW_VAR_API_RATE_LIMIT", "5"))
+API_BURST = int(os.getenv("AIRFLOW_VAR_API_BURST", "5"))
+API_MAX_ACTIVE_FETCHES = int(os.getenv("AIRFLOW_VAR_API_MAX_ACTIVE_FETCHES", "1"))
+API_MAX_RETRIES = int(os.getenv("AIRFLOW_VAR_API_MAX_RETRIES", "4"))
+API_BACKOFF_BASE = 1.0
+API_BACKOFF_MAX = 60.0
+
+# Local directory for caches and state shared by tasks running on the same worker.
+LOCAL_STATE_DIR = os.getenv(
+    "AIRFLOW_VAR_FLIGHT_TRACKER_STATE_DIR",
+    os.path.join(
+        os.getenv("AIRFLOW_HOME", os.path.expanduser("~/airflow")),
+        "flight_price_tracker",
+    ),
+)
+# Seconds an API response is reused (e.g. by task retries); 0 disables the cache.
+RESPONSE_CACHE_TTL = int(os.getenv("AIRFLOW_VAR_RESPONSE_CACHE_TTL", "0"))
+# Only pass on destinations whose price changed since the previous run of the origin.
+ONLY_CHANGED_QUOTES = (
+    os.getenv("AIRFLOW_VAR_ONLY_CHANGED_QUOTES", "false").lower() == "true"
+)
+
+# "xcom" passes payloads through the metadata database, "local" writes Arrow files
+# under LOCAL_STATE_DIR and passes only a reference (requires storage shared by workers).
+ARTIFACT_STORE = os.getenv("AIRFLOW_VAR_ARTIFACT_STORE", "xcom")
+ARTIFACT_RETENTION_DAYS = int(os.getenv("AIRFLOW_VAR_ARTIFACT_RETENTION_DAYS", "2"))
+
+# "aggregation" aggregates the raw index every run; "incremental" reads per-location
+# running statistics that index_data updates with each run's rows.
+STATISTICS_MODE = os.getenv("AIRFLOW_VAR_STATISTICS_MODE", "aggregation")
+STATISTICS_INDEX = "flight_prices_location_stats"
+
+# Baseline for price alerts: "all" history, "window:<days>" (e.g. window:30) or
+# "ewm:<half-life days>" (e.g. ewm:7), the latter two read per-location daily rollups.
+# "quantile:<percent>" (e.g. quantile:25) alerts below that percentile of the
+# per-location price sketches.
+BASELINE_MODE = os.getenv("AIRFLOW_VAR_BASELINE_MODE", "all")
+ROLLUP_INDEX = "flight_prices_daily"
+EWM_HORIZON_HALF_LIVES = 5
+SKETCH_INDEX = "flight_prices_location_sketches"
+# Centroids per sketch are about half the compression.
+SKETCH_COMPRESSION = 200
+
+# Fields statistics are grouped by: "location" or "origin,location".
+STATISTICS_GROUP_BY = tuple(
+    os.getenv("AIRFLOW_VAR_STATISTICS_GROUP_BY", "location").split(",")
+)
+STATISTICS_PAGE_SIZE = 1000
+# Above 1, statistics are fetched as this many location partitions in parallel.
+STATISTICS_PARTITIONS = int(os.getenv("AIRFLOW_VAR_STATISTICS_PARTITIONS", "1"))
+
+# Bulk indexing: documents per request, sender threads and request size limit.
+BULK_CHUNK_SIZE = int(os.getenv("AIRFLOW_VAR_BULK_CHUNK_SIZE", "500"))
+BULK_THREADS = int(os.getenv("AIRFLOW_VAR_BULK_THREADS", "4"))
+BULK_MAX_CHUNK_BYTES = int(
+    os.getenv("AIRFLOW_VAR_BULK_MAX_CHUNK_BYTES", str(10 * 1024 * 1024))
+)
+
+# "monthly" writes quotes to flight_prices-YYYY.MM indices read through READ_ALIAS.
+INDEX_PARTITIONING = os.getenv("AIRFLOW_VAR_INDEX_PARTITIONING", "none")
+READ_ALIAS = f"{INDEX}_read"
+# Monthly indices older than this are downsampled into daily rollups and deleted.
+RAW_RETENTION_MONTHS = int(os.getenv("AIRFLOW_VAR_RAW_RETENTION_MONTHS", "12"))
+
+# Comma-separated Elasticsearch URLs; when unset the Airflow connection is used.
+ELASTIC_HOSTS = [
+    host for host in os.getenv("AIRFLOW_VAR_ELASTIC_HOSTS", "").split(",") if host
+]
+ELASTIC_SNIFF = os.getenv("AIRFLOW_VAR_ELASTIC_SNIFF", "false").lower() == "true"
+ELASTIC_CLIENT_OPTIONS = {
+    "connections_per_node": int(os.getenv("AIRFLOW_VAR_ELASTIC_POOL_SIZE", "10")),
+    "http_compress": os.getenv("AIRFLOW_VAR_ELASTIC_HTTP_COMPRESS", "true").lower()
+    == "true",
+    "request_timeout": float(os.getenv("AIRFLOW_VAR_ELASTIC_REQUEST_TIMEOUT", "30")),
+    "retry_on_timeout": True,
+    "max_retries": int(os.getenv("AIRFLOW_VAR_ELASTIC_MAX_RETRIES", "3")),
+    "sniff_on_start": ELASTIC_SNIFF,
+    "sniff_on_node_failure": ELASTIC_SNIFF,
+    "min_delay_between_sniffing": 60,
+}
+
+# Quotes arrive every 30 minutes, so price indices need no near real-time refresh.
+INDEX_REFRESH_INTERVAL = os.getenv("AIRFLOW_VAR_INDEX_REFRESH_INTERVAL", "30s")
+
+# "memory" or "otlp" records a span and metrics per pipeline stage.
+TELEMETRY_EXPORTER = os.getenv("AIRFLOW_VAR_TELEMETRY_EXPORTER", "none")
+# When set, each task writes cProfile and tracemalloc dumps to this directory.
+TELEMETRY_PROFILE_DIR = os.getenv("AIRFLOW_VAR_TELEMETRY_PROFILE_DIR", "")
+
+# Origins are split into this many shards, each fetched, prepared and indexed by its
+# own mapped task instance; at most PIPELINE_MAX_ACTIVE_SHARDS run at once.
+PIPELINE_SHARDS = int(os.getenv("AIRFLOW_VAR_PIPELINE_SHARDS", "1"))
+PIPELINE_MAX_ACTIVE_SHARDS = int(
+    os.getenv("AIRFLOW_VAR_PIPELINE_MAX_ACTIVE_SHARDS", "8")
+)
+
+# Indexing retries on its own, apart from the alert branch.
+INDEX_RETRIES = int(os.getenv("AIRFLOW_VAR_INDEX_RETRIES", "5"))
+
+# Seconds alert baselines are reused by later and concurrent runs; 0 disables the
+# cache. Indexing new prices invalidates them. "local" shares them through
+# LOCAL_STATE_DIR, "redis" through BASELINE_CACHE_REDIS_URL.
+BASELINE_CACHE_TTL = int(os.getenv("AIRFLOW_VAR_BASELINE_CACHE_TTL", "0"))
+BASELINE_CACHE_BACKEND = os.getenv("AIRFLOW_VAR_BASELINE_CACHE_BACKEND", "local")
+BASELINE_CACHE_REDIS_URL = os.getenv(
+    "AIRFLOW_VAR_BASELINE_CACHE_REDIS_URL", "redis://localhost:6379/0"
+)
+BASELINE_CACHE_SIZE = 8
+
+# JSON lines of alert subscriptions (see subscriptions.SubscriptionStore). Without the
+# file, every price drop is sent to EMAIL_RECIPIENT.
+SUBSCRIPTIONS_PATH = os.getenv(
+    "AIRFLOW_VAR_SUBSCRIPTIONS_PATH",
+    os.path.join(LOCAL_STATE_DIR, "subscriptions.jsonl"),
+)
+# Standard deviations below the mean a price must drop to alert, unless set per
+# subscription.
+DEFAULT_SENSITIVITY = 0.5
+
+# Hours a destination is not alerted again to the same recipient, unless its price
+# fell by more than ALERT_MIN_PRICE_DROP percent; 0 alerts on every run.
+ALERT_COOLDOWN_HOURS = float(os.getenv("AIRFLOW_VAR_ALERT_COOLDOWN_HOURS", "0"))
+ALERT_MIN_PRICE_DROP = float(os.getenv("AIRFLOW_VAR_ALERT_MIN_PRICE_DROP", "0"))
+ALERT_STATE_PATH = os.getenv(
+    "AIRFLOW_VAR_ALERT_STATE_PATH", os.path.join(LOCAL_STATE_DIR, "alert_state.sqlite")
+)
+
+# Where quotes are stored and statistics computed: "elasticsearch", or "parquet" for
+# a local month-partitioned Parquet dataset under PARQUET_STORE_DIR (no cluster).
+STORAGE_BACKEND = os.getenv("AIRFLOW_VAR_STORAGE_BACKEND", "elasticsearch")
+PARQUET_STORE_DIR = os.getenv(
+    "AIRFLOW_VAR_PARQUET_STORE_DIR", os.path.join(LOCAL_STATE_DIR, "prices")
+)
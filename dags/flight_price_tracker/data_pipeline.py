@@ -1,14 +1,43 @@
 import sys
 import os
+import logging
 from datetime import datetime
-import requests
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from airflow.exceptions import AirflowException
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from elasticsearch_utils import ElasticsearchConnection
-from config import API_CONFIG
+from storage_backend import get_storage_backend
+from api_client import build_search_params, fetch_origin, fetch_origins, origin_label
+from rate_limiter import scheduler
+from response_cache import quote_diff
+from telemetry import stage, record
+from baseline_cache import baseline_cache
+from subscriptions import load_subscription_index, match_subscriptions
+from price_statistics import alert_threshold, has_mean_floor
+from alert_state import alert_state
+from artifact_store import (
+    get_artifact_store,
+    push_rows,
+    pull_table,
+    pull_shards,
+    row_count,
+)
+from config import (
+    API_CONFIG,
+    INDEX,
+    MIN_COUNT,
+    ONLY_CHANGED_QUOTES,
+    STATISTICS_MODE,
+    BASELINE_MODE,
+    STATISTICS_GROUP_BY,
+    PIPELINE_SHARDS,
+    STORAGE_BACKEND,
+)
+
+logger = logging.getLogger("airflow.task")
 
 
 URL = API_CONFIG["url"]
@@ -16,72 +45,307 @@ PARAMS = API_CONFIG["params"]
 HEADERS = API_CONFIG["headers"]
 
 
-def fetch_data(**kwargs) -> str:
-    """Fetches current flight price data"""
-    response = requests.get(URL, params=PARAMS, headers=HEADERS, timeout=20)
-    if response.status_code != 200:
-        raise AirflowException(
-            f"Error fecthing data. Status code {response.status_code}"
-        )
-    data = response.json()["data"]["everywhereDestination"]["results"]
+def plan_shards(shards=PIPELINE_SHARDS):
+    """Splits the search params into op_kwargs of the mapped per-shard tasks."""
+    search_params = build_search_params()
+    shards = max(1, min(shards, len(search_params)))
+    return [{"search_params": search_params[i::shards]} for i in range(shards)]
+
+
+@stage("fetch_data")
+def fetch_data(search_params=None, **kwargs) -> str:
+    """Fetches current flight price data, for the given shard of search params"""
+    all_search_params = build_search_params()
+    search_params = search_params or all_search_params
+    received = scheduler.received_bytes
+    with stage("fetch_data.api"):
+        if len(all_search_params) == 1:
+            data = only_changed(
+                search_params[0], fetch_origin(search_params[0]), kwargs["ti"].run_id
+            )
+            if "origin" in STATISTICS_GROUP_BY:
+                for entry in data:
+                    entry["origin"] = origin_label(search_params[0])
+        else:
+            data = fetch_multiple_origins(search_params, kwargs["ti"].run_id)
+        record(rows=len(data), payload_bytes=scheduler.received_bytes - received)
+    scheduler.log_counters()
     current_time = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")
     for entry in data:
         entry["timestamp"] = current_time
-    kwargs["ti"].xcom_push(key="fetched_data", value=data)
+    store = get_artifact_store()
+    if store is not None:
+        store.purge()
+    try:
+        push_rows(kwargs["ti"], "fetched_data", data)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # Arrow infers the schema from every field, also from those never read.
+        logger.warning("Keeping only the quote fields of the fetched data: %s", e)
+        push_rows(kwargs["ti"], "fetched_data", project_quotes(data))
 
 
-def prepare_price_alerts(location_price_statistics, **kwargs):
-    """Prepares flight price data for indexing and prepares subset for email notification"""
-    data = kwargs["ti"].xcom_pull(task_ids="fetch_data", key="fetched_data")
-    flight_prices_df = pd.json_normalize(data, sep="_")
-    if flight_prices_df.empty:
-        raise AirflowException("No data found.")
-    flight_prices_df["cheapest_price"] = np.where(
-        flight_prices_df["content_flightQuotes_cheapest_direct"],
-        flight_prices_df["content_flightQuotes_cheapest_rawPrice"],
-        flight_prices_df["content_flightQuotes_direct_rawPrice"],
+def fetch_multiple_origins(search_params, run_id=None):
+    """Fetches all origins concurrently and tags each quote with its origin.
+
+    Failed origins are logged and skipped; the task only fails when every origin failed.
+    """
+    data = []
+    failures = []
+    for params, results in fetch_origins(search_params):
+        origin = origin_label(params)
+        if isinstance(results, Exception):
+            logger.warning("Fetching origin %s failed: %s", origin, results)
+            failures.append(origin)
+            continue
+        results = only_changed(params, results, run_id)
+        for entry in results:
+            entry["origin"] = origin
+        data.extend(results)
+    if len(failures) == len(search_params):
+        raise AirflowException(f"Error fecthing data for all origins: {failures}")
+    return data
+
+
+def only_changed(params, results, run_id=None):
+    """Drops destinations whose price is unchanged since the last run, if enabled."""
+    if not ONLY_CHANGED_QUOTES:
+        return results
+    changed = quote_diff.changed_quotes(URL, params, results, run_id)
+    logger.info(
+        "%d of %d quotes changed since the last run", len(changed), len(results)
+    )
+    return changed
+
+
+# Raw result fields needed downstream, as paths into each nested result entry.
+QUOTE_FIELDS = {
+    "sky_id": ("skyId",),
+    "location": ("content", "location", "name"),
+    "cheapest_direct": ("content", "flightQuotes", "cheapest", "direct"),
+    "cheapest_raw_price": ("content", "flightQuotes", "cheapest", "rawPrice"),
+    "direct_raw_price": ("content", "flightQuotes", "direct", "rawPrice"),
+    "timestamp": ("timestamp",),
+    "origin": ("origin",),
+}
+
+
+def _field_tree(paths):
+    """Nested dict of the keys along the paths, with None at the leaves."""
+    tree = {}
+    for path in paths:
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = None
+    return tree
+
+
+QUOTE_TREE = _field_tree(QUOTE_FIELDS.values())
+
+
+def _project(value, tree):
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        if subtree is None:
+            projected[key] = value[key]
+        elif isinstance(value[key], dict):
+            projected[key] = _project(value[key], subtree)
+    return projected
+
+
+def project_quotes(data):
+    """Entries reduced to the QUOTE_FIELDS paths, keeping their nesting."""
+    return [_project(entry, QUOTE_TREE) for entry in data]
+
+
+def _field_values(data, path):
+    """Values at path for each entry; NaN where missing, as pd.json_normalize does."""
+    values = []
+    append = values.append
+    for entry in data:
+        value = entry
+        try:
+            for key in path:
+                value = value[key]
+        except (KeyError, TypeError):
+            value = np.nan
+        append(value)
+    return pd.Series(values)
+
+
+def _arrow_field_values(table, path):
+    """Values at path, as _field_values reads them from the equivalent dicts.
+
+    Flags are NaN (true for np.where) where the field or a struct above it is
+    missing, and False where they are null. Arrow cannot tell a key missing from
+    only some entries from a null one, so both read as null.
+    """
+    missing = pd.Series(np.nan, index=range(table.num_rows))
+    if path[0] not in table.column_names:
+        return missing
+    column = table[path[0]]
+    parent_null = pc.is_null(column)
+    for key in path[1:]:
+        if not pa.types.is_struct(column.type) or column.type.get_field_index(key) < 0:
+            return missing
+        column = pc.struct_field(column, key)
+        if key != path[-1]:
+            parent_null = pc.or_(parent_null, pc.is_null(column))
+    if not pa.types.is_boolean(column.type):
+        return column.to_pandas()
+    values = column.fill_null(False).to_pandas().astype(object)
+    return values.mask(parent_null.to_pandas(), np.nan)
+
+
+def extract_flight_prices(data):
+    """Builds the indexed rows from raw results, reading only the fields they need."""
+    if isinstance(data, pa.Table):
+        table = data.select(
+            [
+                name
+                for name in ("skyId", "content", "timestamp", "origin")
+                if name in data.column_names
+            ]
+        )
+        columns = {
+            name: _arrow_field_values(table, path)
+            for name, path in QUOTE_FIELDS.items()
+        }
+    else:
+        columns = {
+            name: _field_values(data, path) for name, path in QUOTE_FIELDS.items()
+        }
+    cheapest_price = np.where(
+        columns["cheapest_direct"],
+        columns["cheapest_raw_price"],
+        columns["direct_raw_price"],
     )
-    flight_prices_df = flight_prices_df[flight_prices_df["cheapest_price"] >= 0]
-    flight_prices_df["content_location_name"] = flight_prices_df[
-        "content_location_name"
-    ].replace(r" ", "_", regex=True)
-    flight_prices_df = (
-        flight_prices_df.loc[
-            :, ["skyId", "content_location_name", "cheapest_price", "timestamp"]
-        ]
-        .rename(columns={"content_location_name": "location", "skyId": "sky_id"})
-        .dropna()
+    keep = cheapest_price >= 0
+    locations = columns["location"][keep]
+    flight_prices_df = pd.DataFrame(
+        {
+            "sky_id": columns["sky_id"][keep],
+            "location": [
+                name.replace(" ", "_") if isinstance(name, str) else name
+                for name in locations
+            ],
+            "cheapest_price": cheapest_price[keep],
+            "timestamp": columns["timestamp"][keep],
+        },
+        index=locations.index,
     )
-    kwargs["ti"].xcom_push(
-        key="all_rows", value=flight_prices_df.to_dict(orient="records")
+    if columns["origin"].notna().any():
+        flight_prices_df["origin"] = columns["origin"][keep]
+    return flight_prices_df.dropna()
+
+
+def join_statistics(
+    flight_prices_df, location_price_statistics, group_by=STATISTICS_GROUP_BY
+):
+    """Rows with their group's average_price and std_dev; rows without are dropped."""
+    statistics = pd.DataFrame.from_dict(
+        location_price_statistics,
+        orient="index",
+        columns=["average_price", "std_dev"],
     )
-    if location_price_statistics:
-        flight_prices_df[["average_price", "std_dev"]] = flight_prices_df[
-            "location"
-        ].apply(
-            lambda loc: pd.Series(location_price_statistics.get(loc, (np.nan, np.nan)))
-        )
-        flight_prices_df = flight_prices_df.dropna(subset=["average_price", "std_dev"])
-        low_flight_prices_df = flight_prices_df[
-            flight_prices_df["cheapest_price"]
-            < np.maximum(
-                flight_prices_df["average_price"] - 0.5 * flight_prices_df["std_dev"],
-                flight_prices_df["average_price"] * 0.9,
-            )
-        ].drop(columns=["std_dev"])
-        kwargs["ti"].xcom_push(
-            key="rows_to_notify", value=low_flight_prices_df.to_dict(orient="records")
+    if len(group_by) > 1:
+        statistics.index = pd.MultiIndex.from_tuples(statistics.index, names=group_by)
+        flight_prices_df = flight_prices_df.reindex(
+            columns=flight_prices_df.columns.union(group_by, sort=False)
         )
+    return flight_prices_df.join(statistics, on=list(group_by)).dropna(
+        subset=["average_price", "std_dev"]
+    )
 
 
-def check_for_price_alerts(**kwargs):
-    prepare_price_alerts(
-        ElasticsearchConnection.get_location_price_statistics(), **kwargs
+def find_price_drops(
+    flight_prices_df,
+    location_price_statistics,
+    group_by=STATISTICS_GROUP_BY,
+    mode=BASELINE_MODE,
+):
+    """Rows priced below the alert threshold of their group, see alert_threshold."""
+    flight_prices_df = join_statistics(
+        flight_prices_df, location_price_statistics, group_by
     )
+    threshold = alert_threshold(
+        flight_prices_df["average_price"],
+        flight_prices_df["std_dev"],
+        mean_floor=has_mean_floor(mode),
+    )
+    return flight_prices_df[flight_prices_df["cheapest_price"] < threshold].drop(
+        columns=["std_dev"]
+    )
+
+
+@stage("prepare_price_alerts")
+def prepare_price_alerts(location_price_statistics, **kwargs):
+    """Prepares flight price data for indexing and prepares subset for email notification"""
+    data = pull_table(kwargs["ti"], task_ids="fetch_data", key="fetched_data")
+    if data is None or len(data) == 0:
+        if ONLY_CHANGED_QUOTES:
+            logger.info("No quotes changed since the last run.")
+            push_rows(kwargs["ti"], "all_rows", [])
+            return
+        raise AirflowException("No data found.")
+    with stage("prepare_price_alerts.extract"):
+        flight_prices_df = extract_flight_prices(data)
+        record(rows=len(flight_prices_df), payload=data)
+    push_rows(kwargs["ti"], "all_rows", flight_prices_df)
+    if location_price_statistics:
+        subscription_index = load_subscription_index()
+        if subscription_index is None:
+            with stage("prepare_price_alerts.find_price_drops"):
+                price_drops = find_price_drops(
+                    flight_prices_df, location_price_statistics
+                )
+                record(rows=len(price_drops))
+        else:
+            with stage("prepare_price_alerts.match_subscriptions"):
+                price_drops = match_subscriptions(
+                    join_statistics(flight_prices_df, location_price_statistics),
+                    subscription_index,
+                )
+                record(rows=len(price_drops))
+        if alert_state.enabled():
+            with stage("prepare_price_alerts.suppress"):
+                price_drops = alert_state.suppress(price_drops)
+                record(rows=len(price_drops))
+        push_rows(kwargs["ti"], "rows_to_notify", price_drops)
+
+
+def get_baseline_statistics():
+    """Per-group (average, std) for the configured baseline and statistics mode."""
+    return baseline_cache.get_or_compute(
+        (
+            STORAGE_BACKEND,
+            INDEX,
+            BASELINE_MODE,
+            STATISTICS_MODE,
+            STATISTICS_GROUP_BY,
+            MIN_COUNT,
+        ),
+        compute_baseline_statistics,
+    )
+
+
+def compute_baseline_statistics():
+    storage = get_storage_backend()
+    if BASELINE_MODE != "all":
+        return storage.get_baseline_statistics(BASELINE_MODE)
+    if STATISTICS_MODE == "incremental":
+        return storage.get_running_statistics()
+    return storage.get_location_price_statistics()
+
+
+def check_for_price_alerts(**kwargs):
+    prepare_price_alerts(get_baseline_statistics(), **kwargs)
 
 
 def should_send_email(**kwargs):
-    rows_to_notify = kwargs["ti"].xcom_pull(
-        key="rows_to_notify", task_ids="prepare_price_alerts"
+    shards = pull_shards(
+        kwargs["ti"], task_ids="prepare_price_alerts", key="rows_to_notify"
     )
-    return bool(rows_to_notify)
+    return sum(row_count(rows_to_notify) for rows_to_notify in shards) > 0
@@ -1,104 +1,920 @@
 import sys
 import os
+import time
+import hashlib
 import logging
-from elasticsearch import Elasticsearch, helpers
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from elasticsearch import Elasticsearch, NotFoundError, helpers
 from airflow.hooks.base import BaseHook
+from airflow.stats import Stats
 
 from airflow.exceptions import AirflowException
 
-
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from config import ELASTIC_PASSWORD, INDEX, MIN_COUNT, ELASTIC_CONN_NAME
+from config import (
+    ELASTIC_PASSWORD,
+    INDEX,
+    MIN_COUNT,
+    ELASTIC_CONN_NAME,
+    STATISTICS_MODE,
+    STATISTICS_INDEX,
+    BASELINE_MODE,
+    ROLLUP_INDEX,
+    EWM_HORIZON_HALF_LIVES,
+    SKETCH_INDEX,
+    STATISTICS_GROUP_BY,
+    STATISTICS_PAGE_SIZE,
+    STATISTICS_PARTITIONS,
+    BULK_CHUNK_SIZE,
+    BULK_THREADS,
+    BULK_MAX_CHUNK_BYTES,
+    INDEX_PARTITIONING,
+    READ_ALIAS,
+    RAW_RETENTION_MONTHS,
+    ELASTIC_HOSTS,
+    ELASTIC_CLIENT_OPTIONS,
+    LOCAL_STATE_DIR,
+    INDEX_REFRESH_INTERVAL,
+)
+from artifact_store import pull_table, iter_rows, to_frame
+from telemetry import stage, record
+from baseline_cache import baseline_cache
+from storage_backend import StorageBackend
+from price_statistics import (
+    MERGE_SCRIPT,
+    DECAY_WEIGHT,
+    summarize_batch,
+    summaries_to_statistics,
+    parse_baseline_mode,
+    weighted_statistics,
+    quantile_statistics,
+    group_key,
+)
+from quantile_sketch import TDigest
+
+# Bump when templates change so every deployment installs them again.
+TEMPLATE_VERSION = 4
+BOOTSTRAP_MARKER = os.path.join(LOCAL_STATE_DIR, "elasticsearch_bootstrap")
+
+# Keyword fields keep a .keyword subfield, so queries work on indices from before
+# location and origin were mapped as keywords.
+PRICE_MAPPING = {
+    "properties": {
+        "sky_id": {"type": "keyword", "index": False},
+        "location": {"type": "keyword", "fields": {"keyword": {"type": "keyword"}}},
+        "origin": {"type": "keyword", "fields": {"keyword": {"type": "keyword"}}},
+        "cheapest_price": {"type": "float"},
+        "timestamp": {"type": "date", "format": "date_optional_time"},
+    }
+}
+
+SUMMARY_PROPERTIES = {
+    "origin": {"type": "keyword"},
+    "location": {"type": "keyword"},
+    "count": {"type": "long"},
+    "mean": {"type": "double"},
+    "m2": {"type": "double"},
+    "sum": {"type": "double"},
+    "sum_sq": {"type": "double"},
+    "batches": {"type": "keyword", "index": False, "doc_values": False},
+}
+
+# A quote is identified by destination, origin and fetch time.
+DOCUMENT_ID_FIELDS = ("sky_id", "origin", "timestamp")
+
+# Sketches are kept at the finest grain and merged into coarser groups on read.
+SKETCH_FIELDS = ("origin", "location", "month")
+SKETCH_CONFLICT_RETRIES = 5
+# Raw prices buffered per sketch while rebuilding from the price index.
+SKETCH_REBUILD_BUFFER = 10000
+# Batch ids kept per summary or sketch, enough to cover any retry of a batch.
+BATCHES_KEPT = 100
+# Failed documents logged individually per bulk load; the rest are only counted.
+FAILURES_LOGGED = 10
 
 logger = logging.getLogger("airflow.task")
 
 
-class ElasticsearchConnection:
-    _instance = None
+def document_id(doc):
+    """Deterministic _id, so a retried run cannot index the same quote twice."""
+    key = "|".join(str(doc.get(field)) for field in DOCUMENT_ID_FIELDS)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+@contextmanager
+def es_operation(name):
+    """Emits the latency and errors of an Elasticsearch operation as metrics."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        Stats.incr(f"flight_price_tracker.es.{name}.errors")
+        raise
+    finally:
+        Stats.timing(
+            f"flight_price_tracker.es.{name}", (time.perf_counter() - start) * 1000
+        )
+
+
+def index_templates():
+    """(name, index patterns, template) of every index the tracker writes to."""
+    return [
+        (
+            INDEX,
+            [INDEX, f"{INDEX}-*"],
+            {
+                "settings": {"refresh_interval": INDEX_REFRESH_INTERVAL},
+                "mappings": PRICE_MAPPING,
+                "aliases": {READ_ALIAS: {}},
+            },
+        ),
+        (
+            STATISTICS_INDEX,
+            [STATISTICS_INDEX],
+            {"mappings": {"properties": SUMMARY_PROPERTIES}},
+        ),
+        (
+            ROLLUP_INDEX,
+            [ROLLUP_INDEX],
+            {
+                "mappings": {
+                    "properties": {**SUMMARY_PROPERTIES, "day": {"type": "date"}}
+                }
+            },
+        ),
+        (
+            SKETCH_INDEX,
+            [SKETCH_INDEX],
+            {
+                "mappings": {
+                    "properties": {
+                        "origin": {"type": "keyword"},
+                        "location": {"type": "keyword"},
+                        "month": {"type": "keyword"},
+                        "count": {"type": "long"},
+                        "sketch": {"type": "binary"},
+                        "batches": {
+                            "type": "keyword",
+                            "index": False,
+                            "doc_values": False,
+                        },
+                    }
+                }
+            },
+        ),
+    ]
+
+
+def _read_marker():
+    try:
+        with open(BOOTSTRAP_MARKER, "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_marker(value):
+    os.makedirs(os.path.dirname(BOOTSTRAP_MARKER), exist_ok=True)
+    tmp_path = f"{BOOTSTRAP_MARKER}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(value)
+    os.replace(tmp_path, BOOTSTRAP_MARKER)
+
+
+def monthly_index(timestamp):
+    """Monthly price index of a timestamp, e.g. flight_prices-2025.03."""
+    return f"{INDEX}-{timestamp[:4]}.{timestamp[5:7]}"
+
+
+def months_ago(months, now=None):
+    """Monthly price index of the month the given number of months back."""
+    now = now or datetime.now(timezone.utc)
+    month = now.year * 12 + now.month - 1 - months
+    return monthly_index(f"{month // 12:04d}-{month % 12 + 1:02d}")
+
+
+def price_write_index(doc):
+    if INDEX_PARTITIONING == "monthly":
+        return monthly_index(doc["timestamp"])
+    return INDEX
+
+
+def price_read_indices(days=None, now=None):
+    """Raw price indices to query, limited to the months intersecting the last days."""
+    if INDEX_PARTITIONING != "monthly":
+        return INDEX
+    if days is None:
+        return READ_ALIAS
+    now = now or datetime.now(timezone.utc)
+    month = (now - timedelta(days=days)).replace(day=1)
+    indices = []
+    while month <= now:
+        indices.append(monthly_index(month.isoformat()))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return indices
+
+
+def batch_id(ti):
+    """Id of a task instance's rows, recorded by merges so each is merged once."""
+    map_index = getattr(ti, "map_index", -1)
+    return f"{ti.run_id}|{map_index if isinstance(map_index, int) else -1}"
+
+
+def sketch_document(key, digest, batches=()):
+    """Sketch document for an (origin, location, month) key; origin "" is omitted."""
+    doc = {field: value for field, value in zip(SKETCH_FIELDS, key) if value != ""}
+    doc = {**doc, "count": int(digest.count), "sketch": digest.to_base64()}
+    if batches:
+        doc["batches"] = list(batches)[-BATCHES_KEPT:]
+    return doc
+
+
+def composite_sources(fields, keyword=True):
+    return [
+        {field: {"terms": {"field": f"{field}.keyword" if keyword else field}}}
+        for field in fields
+    ]
+
+
+def summary_from_stats(key, doc_count, price_stats):
+    """Summary document from an extended_stats aggregation result."""
+    return {
+        **key,
+        "count": doc_count,
+        "mean": price_stats["avg"],
+        "m2": price_stats["variance_population"] * doc_count,
+        "sum": price_stats["sum"],
+        "sum_sq": price_stats["sum_of_squares"],
+    }
+
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            instance = super().__new__(cls)
-            conn = BaseHook.get_connection(ELASTIC_CONN_NAME)
-            instance.es = Elasticsearch(
-                [conn.host], basic_auth=("elastic", ELASTIC_PASSWORD)
+class ElasticsearchConnection(StorageBackend):
+    """Storage backend keeping quotes and their statistics in Elasticsearch.
+
+    Instances share the process's client, so creating one per task is cheap.
+    """
+
+    _client = None
+    _hosts = None
+    _bootstrapped = False
+
+    def __init__(self, es=None):
+        self._es = es
+
+    @property
+    def es(self):
+        """The given client, or the process's client created on first use."""
+        return self._es if self._es is not None else self.client()
+
+    @classmethod
+    def client(cls):
+        """The Elasticsearch client of this process, created on first use."""
+        if cls._client is None:
+            cls._client = Elasticsearch(
+                cls._resolve_hosts(),
+                basic_auth=("elastic", ELASTIC_PASSWORD),
+                **ELASTIC_CLIENT_OPTIONS,
             )
-            cls._instance = instance
-        return cls._instance.es
+        return cls._client
 
     @classmethod
-    def create_elasticsearch_index(cls):
-        es = cls()
-        mapping = {
-            "mappings": {
-                "properties": {
-                    "sky_id": {
-                        "type": "text",
-                        "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
-                    },
-                    "location": {
-                        "type": "text",
-                        "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
-                    },
-                    "cheapest_price": {"type": "float"},
-                    "timestamp": {"type": "date", "format": "date_optional_time"},
-                }
-            }
-        }
+    def _resolve_hosts(cls):
+        """Hosts from config, or the Airflow connection looked up once per process."""
+        if cls._hosts is None:
+            cls._hosts = ELASTIC_HOSTS or [
+                BaseHook.get_connection(ELASTIC_CONN_NAME).host
+            ]
+        return cls._hosts
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # Pooled sockets must not be shared with a forked child, the hosts can.
+        cls._client = None
+
+    def health_check(self):
+        """Returns the cluster status, raising when it is unreachable or red."""
+        with es_operation("health"):
+            status = self.es.cluster.health(timeout="10s")["status"]
+        if status == "red":
+            raise AirflowException("Elasticsearch cluster status is red.")
+        return status
+
+    def bootstrap(self, force=False):
+        """Installs the index templates once per deployment.
+
+        The bootstrap state is cached in the process and in a marker file keyed by
+        template version and hosts; delete the marker or use force after a reset.
+        """
+        if self._bootstrapped and not force:
+            return
+        marker = f"{TEMPLATE_VERSION}|{','.join(self._resolve_hosts())}"
+        if force or _read_marker() != marker:
+            es = self.es
+            with es_operation("bootstrap"):
+                for name, patterns, template in index_templates():
+                    es.indices.put_index_template(
+                        name=name,
+                        index_patterns=patterns,
+                        template=template,
+                        version=TEMPLATE_VERSION,
+                        priority=200,
+                    )
+                # Quotes indexed before the template stay readable through the alias.
+                es.options(ignore_status=404).indices.put_alias(
+                    index=INDEX, name=READ_ALIAS
+                )
+            _write_marker(marker)
+        type(self)._bootstrapped = True
+
+    def create_elasticsearch_index(self):
+        """Installs the templates mapping the price and summary indices."""
         try:
-            if not es.indices.exists(index=INDEX):
-                es.indices.create(index=INDEX, body=mapping)
+            self.bootstrap(force=True)
         except Exception as e:
             raise AirflowException(f"Error creating index '{INDEX}': {e}") from e
 
-    @classmethod
-    def delete_elasticsearch_index(cls, index_name):
-        es = cls()
+    def delete_elasticsearch_index(self, index_name):
+        es = self.es
         try:
-            if es.indices.exists(index=index_name):
-                es.indices.delete(index=index_name)
+            es.options(ignore_status=404).indices.delete(index=index_name)
         except Exception as e:
             raise AirflowException(f"Error deleting index '{index_name}': {e}") from e
 
-    @classmethod
-    def index_data(cls, **kwargs):
-        es = cls()
-        if not es.indices.exists(index=INDEX):
-            es.indices.create(index=INDEX)
-        docs = kwargs["ti"].xcom_pull(task_ids="prepare_price_alerts", key="all_rows")
-        actions = [
-            {"_op_type": "index", "_index": INDEX, "_source": doc} for doc in docs
-        ]
-        helpers.bulk(es, actions)
+    @stage("index_data")
+    def index_data(self, **kwargs):
+        rows = pull_table(kwargs["ti"], task_ids="prepare_price_alerts", key="all_rows")
+        with stage("index_data.bulk"):
+            created = self.write(rows)
+            record(rows=len(created), payload=rows)
+        frame = to_frame(rows)
+        if frame.empty:
+            return
+        baseline_kind, _ = parse_baseline_mode(BASELINE_MODE)
+        # The whole batch is merged, also on retries whose documents all exist;
+        # merges skip summaries and sketches that already hold the batch.
+        batch = batch_id(kwargs["ti"])
+        if STATISTICS_MODE == "incremental":
+            self.update_running_statistics(
+                frame[[*STATISTICS_GROUP_BY, "cheapest_price"]], batch=batch
+            )
+        if baseline_kind in ("window", "ewm"):
+            self.update_daily_rollups(
+                frame[[*STATISTICS_GROUP_BY, "cheapest_price", "timestamp"]],
+                batch=batch,
+            )
+        if baseline_kind == "quantile":
+            self.update_quantile_sketches(frame, batch=batch)
+        baseline_cache.bump_version()
 
-    @classmethod
-    def get_location_price_statistics(cls):
-        """Fetches average and stadard deviation of prices per location."""
-        es = cls()
+    def write(self, rows):
+        """Creates a document per row, returns the ids of the newly created ones."""
+        self.bootstrap()
+        actions = (
+            {
+                "_op_type": "create",
+                "_index": price_write_index(doc),
+                "_id": document_id(doc),
+                "_source": doc,
+            }
+            for doc in iter_rows(rows) or ()
+        )
+        return self.stream_bulk(actions)
+
+    def seed_statistics(self):
+        """Rebuilds the summaries, rollups or sketches the configured modes read.
+
+        Used after loading quotes with write, which does not maintain them.
+        """
+        self.es.indices.refresh(index=price_read_indices())
+        baseline_kind, _ = parse_baseline_mode(BASELINE_MODE)
+        if STATISTICS_MODE == "incremental":
+            self.rebuild_running_statistics()
+        if baseline_kind in ("window", "ewm"):
+            self.rebuild_daily_rollups()
+        if baseline_kind == "quantile":
+            self.rebuild_quantile_sketches()
+        baseline_cache.bump_version()
+
+    def stream_bulk(
+        self,
+        actions,
+        chunk_size=BULK_CHUNK_SIZE,
+        thread_count=BULK_THREADS,
+        max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+    ):
+        """Streams actions through parallel bulk requests, returns the created ids.
+
+        Documents that already exist are skipped. The first failed documents are
+        logged with their id and error, and all failures are raised together once
+        every chunk has been sent.
+        """
+        created = set()
+        existing = 0
+        failures = []
+        results = helpers.parallel_bulk(
+            self.es,
+            actions,
+            thread_count=thread_count,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            raise_on_error=False,
+        )
+        with es_operation("bulk"):
+            for ok, item in results:
+                result = next(iter(item.values()))
+                if ok:
+                    created.add(result["_id"])
+                elif result.get("status") == 409:
+                    existing += 1
+                else:
+                    failures.append(result)
+                    if len(failures) <= FAILURES_LOGGED:
+                        logger.warning(
+                            "Document %s failed to index: %s",
+                            result.get("_id"),
+                            result.get("error"),
+                        )
+        logger.info(
+            "Indexed %d documents, %d already indexed, %d failed",
+            len(created),
+            existing,
+            len(failures),
+        )
+        if failures:
+            raise AirflowException(f"{len(failures)} documents failed to index.")
+        return created
+
+    def _iter_composite_buckets(self, index, query):
+        """Streams the buckets of the "groups" composite aggregation page by page."""
+        # A list names monthly indices, some of which may not exist.
+        options = {"ignore_unavailable": True} if isinstance(index, list) else {}
+        while True:
+            with es_operation("search"):
+                response = self.es.search(index=index, body=query, **options)
+            if "aggregations" not in response:
+                logger.info("Error: No aggregations found in response.")
+                return
+            result = response["aggregations"]["groups"]
+            yield from result["buckets"]
+            if not result["buckets"] or "after_key" not in result:
+                return
+            query["aggs"]["groups"]["composite"]["after"] = result["after_key"]
+
+    def _iter_price_stats(self, group_by):
+        """Yields (key, doc_count, extended_stats) per group of the price index."""
         query = {
             "size": 0,
             "aggs": {
-                "by_location": {
-                    "terms": {"field": "location.keyword", "size": 1000},
+                "groups": {
+                    "composite": {
+                        "size": STATISTICS_PAGE_SIZE,
+                        "sources": composite_sources(group_by),
+                    },
                     "aggs": {
-                        "average_price": {"avg": {"field": "cheapest_price"}},
-                        "price_std_deviation": {
-                            "extended_stats": {"field": "cheapest_price"}
+                        "price_stats": {"extended_stats": {"field": "cheapest_price"}}
+                    },
+                }
+            },
+        }
+        for bucket in self._iter_composite_buckets(price_read_indices(), query):
+            yield bucket["key"], bucket["doc_count"], bucket["price_stats"]
+
+    def _partition_price_stats(self, group_by, partition, partitions):
+        """Price stats of one location partition, nesting other group fields inside."""
+        aggs = {"price_stats": {"extended_stats": {"field": "cheapest_price"}}}
+        inner_fields = [field for field in group_by if field != "location"]
+        for field in reversed(inner_fields):
+            aggs = {
+                field: {
+                    "terms": {
+                        "field": f"{field}.keyword",
+                        "size": STATISTICS_PAGE_SIZE,
+                    },
+                    "aggs": aggs,
+                }
+            }
+        query = {
+            "size": 0,
+            "aggs": {
+                "location": {
+                    "terms": {
+                        "field": "location.keyword",
+                        "size": STATISTICS_PAGE_SIZE,
+                        "include": {
+                            "partition": partition,
+                            "num_partitions": partitions,
                         },
                     },
+                    "aggs": aggs,
                 }
             },
         }
-        response = es.search(index=INDEX, body=query)
-        if "aggregations" not in response:
-            logger.info("Error: No aggregations found in response.")
-            return None
-        location_price_statistics = {
-            bucket["key"]: (
-                bucket["average_price"]["value"],
-                bucket["price_std_deviation"]["std_deviation"],
+        with es_operation("search"):
+            response = self.es.search(index=price_read_indices(), body=query)
+        if response["aggregations"]["location"]["sum_other_doc_count"]:
+            logger.warning(
+                "Partition %d has more than %d locations, increase the partitions.",
+                partition,
+                STATISTICS_PAGE_SIZE,
+            )
+
+        def flatten(agg, fields, key):
+            for bucket in agg["buckets"]:
+                bucket_key = {**key, fields[0]: bucket["key"]}
+                if len(fields) == 1:
+                    yield bucket_key, bucket["doc_count"], bucket["price_stats"]
+                else:
+                    yield from flatten(bucket[fields[1]], fields[1:], bucket_key)
+
+        return list(
+            flatten(
+                response["aggregations"]["location"], ["location", *inner_fields], {}
+            )
+        )
+
+    @stage("get_location_price_statistics")
+    def get_location_price_statistics(
+        self, group_by=STATISTICS_GROUP_BY, partitions=STATISTICS_PARTITIONS
+    ):
+        """Fetches average and stadard deviation of prices per location.
+
+        Groups are streamed over composite aggregation pages, or fetched as parallel
+        location partitions, so every location gets statistics regardless of count.
+        """
+        if partitions > 1:
+            with ThreadPoolExecutor(max_workers=partitions) as executor:
+                results = executor.map(
+                    lambda partition: self._partition_price_stats(
+                        group_by, partition, partitions
+                    ),
+                    range(partitions),
+                )
+                groups = [group for result in results for group in result]
+        else:
+            groups = self._iter_price_stats(group_by)
+        statistics = {
+            group_key(key, group_by): (
+                price_stats["avg"],
+                price_stats["std_deviation"],
             )
-            for bucket in response["aggregations"]["by_location"]["buckets"]
-            if bucket["doc_count"] >= MIN_COUNT
+            for key, doc_count, price_stats in groups
+            if doc_count >= MIN_COUNT
         }
-        return location_price_statistics
+        record(rows=len(statistics))
+        return statistics
+
+    def _merge_summaries(self, index, summary, id_fields, batch=None):
+        """Merges (count, mean, m2, sum, sum_sq) rows into summary documents.
+
+        With a batch id, summaries that already merged the batch are left as is.
+        """
+        actions = (
+            {
+                "_op_type": "update",
+                "_index": index,
+                "_id": "|".join(str(record[field]) for field in id_fields),
+                "retry_on_conflict": 5,
+                "script": {
+                    "source": MERGE_SCRIPT,
+                    "params": {**record, "batch": batch, "batches_kept": BATCHES_KEPT},
+                },
+                "upsert": record if batch is None else {**record, "batches": [batch]},
+            }
+            for record in summary.to_dict(orient="records")
+        )
+        with es_operation("bulk"):
+            helpers.bulk(self.es, actions)
+
+    def update_running_statistics(self, rows, group_by=STATISTICS_GROUP_BY, batch=None):
+        """Merges the count, mean and M2 of new rows into the per-group summaries."""
+        self._merge_summaries(
+            STATISTICS_INDEX,
+            summarize_batch(rows, group_fields=group_by),
+            id_fields=group_by,
+            batch=batch,
+        )
+
+    def update_daily_rollups(self, rows, group_by=STATISTICS_GROUP_BY, batch=None):
+        """Merges new rows into per-group, per-day rollups."""
+        rows = rows.assign(day=rows["timestamp"].str[:10])
+        self._merge_summaries(
+            ROLLUP_INDEX,
+            summarize_batch(rows, group_fields=(*group_by, "day")),
+            id_fields=(*group_by, "day"),
+            batch=batch,
+        )
+
+    def rebuild_running_statistics(self, group_by=STATISTICS_GROUP_BY):
+        """Recomputes the per-group summaries from the full price index."""
+        self.bootstrap()
+        es = self.es
+        # Created up front so an empty price index still leaves summaries to read.
+        with es_operation("create"):
+            es.options(ignore_status=400).indices.create(index=STATISTICS_INDEX)
+        actions = (
+            {
+                "_op_type": "index",
+                "_index": STATISTICS_INDEX,
+                "_id": "|".join(str(key[field]) for field in group_by),
+                "_source": summary_from_stats(key, doc_count, price_stats),
+            }
+            for key, doc_count, price_stats in self._iter_price_stats(group_by)
+            if price_stats["avg"] is not None
+        )
+        with es_operation("bulk"):
+            helpers.bulk(es, actions, refresh="wait_for")
+
+    def get_running_statistics(self, group_by=STATISTICS_GROUP_BY):
+        """Reads average and standard deviation per group from the summaries."""
+        es = self.es
+
+        def read():
+            with es_operation("search"):
+                return {
+                    group_key(hit["_source"], group_by): (
+                        hit["_source"]["count"],
+                        hit["_source"]["mean"],
+                        hit["_source"]["m2"],
+                    )
+                    for hit in helpers.scan(es, index=STATISTICS_INDEX)
+                    if all(field in hit["_source"] for field in group_by)
+                }
+
+        try:
+            summaries = read()
+        except NotFoundError:
+            logger.info("No running statistics found, rebuilding from '%s'.", INDEX)
+            self.rebuild_running_statistics(group_by)
+            summaries = read()
+        return summaries_to_statistics(summaries, MIN_COUNT)
+
+    def rebuild_daily_rollups(
+        self, group_by=STATISTICS_GROUP_BY, days=None, source=None
+    ):
+        """Recomputes per-group, per-day rollups from raw quotes.
+
+        Only the last days are recomputed when given, reading just the indices that
+        hold them; source overrides the raw indices read.
+        """
+        self.bootstrap()
+        es = self.es
+        with es_operation("create"):
+            es.options(ignore_status=400).indices.create(index=ROLLUP_INDEX)
+        query = {
+            "size": 0,
+            "aggs": {
+                "groups": {
+                    "composite": {
+                        "size": STATISTICS_PAGE_SIZE,
+                        "sources": [
+                            *composite_sources(group_by),
+                            {
+                                "day": {
+                                    "date_histogram": {
+                                        "field": "timestamp",
+                                        "calendar_interval": "1d",
+                                        "format": "yyyy-MM-dd",
+                                    }
+                                }
+                            },
+                        ],
+                    },
+                    "aggs": {
+                        "price_stats": {"extended_stats": {"field": "cheapest_price"}}
+                    },
+                }
+            },
+        }
+        if days is not None:
+            query["query"] = {"range": {"timestamp": {"gte": f"now-{int(days)}d/d"}}}
+        actions = (
+            {
+                "_op_type": "index",
+                "_index": ROLLUP_INDEX,
+                "_id": "|".join(str(bucket["key"][f]) for f in (*group_by, "day")),
+                "_source": summary_from_stats(
+                    bucket["key"], bucket["doc_count"], bucket["price_stats"]
+                ),
+            }
+            for bucket in self._iter_composite_buckets(
+                source or price_read_indices(days), query
+            )
+            if bucket["price_stats"]["avg"] is not None
+        )
+        with es_operation("bulk"):
+            helpers.bulk(es, actions)
+        es.indices.refresh(index=ROLLUP_INDEX)
+
+    def get_baseline_statistics(self, mode=BASELINE_MODE, group_by=STATISTICS_GROUP_BY):
+        """Average and standard deviation per group over a window or with decay.
+
+        Reads the daily rollups; "window:<days>" weighs the last days equally and
+        "ewm:<half-life days>" decays each day's rollup by its age.
+        """
+        kind, days = parse_baseline_mode(mode)
+        if kind == "all":
+            return self.get_location_price_statistics(group_by)
+        if kind == "quantile":
+            # The parameter of quantile mode is the percentile.
+            return self.get_quantile_statistics(days, group_by)
+        horizon = days if kind == "window" else days * EWM_HORIZON_HALF_LIVES
+        params = {
+            "now": datetime.now(timezone.utc).timestamp() * 1000,
+            "half_life": (days or 0) * 86400 * 1000,
+        }
+
+        def weighted(field):
+            if kind == "window":
+                return {"field": field}
+            return {
+                "script": {
+                    "source": f"{DECAY_WEIGHT} * doc['{field}'].value",
+                    "params": params,
+                }
+            }
+
+        weighted_sums = {
+            name: {"sum": weighted(field)}
+            for name, field in (
+                ("weight", "count"),
+                ("weighted_sum", "sum"),
+                ("weighted_sum_sq", "sum_sq"),
+            )
+        }
+        query = {
+            "size": 0,
+            "query": {"range": {"day": {"gte": f"now-{int(horizon)}d/d"}}},
+            "aggs": {
+                "groups": {
+                    "composite": {
+                        "size": STATISTICS_PAGE_SIZE,
+                        "sources": composite_sources(group_by, keyword=False),
+                    },
+                    "aggs": {"count": {"sum": {"field": "count"}}, **weighted_sums},
+                }
+            },
+        }
+
+        def read():
+            return {
+                group_key(bucket["key"], group_by): weighted_statistics(
+                    bucket["weight"]["value"],
+                    bucket["weighted_sum"]["value"],
+                    bucket["weighted_sum_sq"]["value"],
+                )
+                for bucket in self._iter_composite_buckets(ROLLUP_INDEX, query)
+                if bucket["count"]["value"] >= MIN_COUNT
+            }
+
+        try:
+            return read()
+        except NotFoundError:
+            logger.info("No daily rollups found, rebuilding from '%s'.", INDEX)
+            self.rebuild_daily_rollups(group_by, days=horizon)
+            return read()
+
+    def _write_sketches(self, digests, batch=None):
+        """Merges digests into stored sketches, keyed by sketch document _id.
+
+        Writes are conditional on the sequence number read, so concurrent runs
+        merging into the same sketch retry instead of overwriting each other.
+        With a batch id, sketches that already merged the batch are left as is.
+        """
+        for _ in range(SKETCH_CONFLICT_RETRIES):
+            with es_operation("mget"):
+                docs = self.es.mget(index=SKETCH_INDEX, ids=list(digests))["docs"]
+            actions = []
+            for doc in docs:
+                key, digest = digests[doc["_id"]]
+                action = {"_index": SKETCH_INDEX, "_id": doc["_id"]}
+                batches = []
+                if doc.get("found"):
+                    batches = doc["_source"].get("batches", [])
+                    if batch is not None and batch in batches:
+                        continue
+                    stored = TDigest.from_base64(doc["_source"]["sketch"])
+                    digest = stored.merge(digest)
+                    action.update(
+                        _op_type="index",
+                        if_seq_no=doc["_seq_no"],
+                        if_primary_term=doc["_primary_term"],
+                    )
+                else:
+                    action["_op_type"] = "create"
+                if batch is not None:
+                    batches = [*batches, batch]
+                actions.append(
+                    {**action, "_source": sketch_document(key, digest, batches)}
+                )
+            with es_operation("bulk"):
+                _, errors = helpers.bulk(self.es, actions, raise_on_error=False)
+            failed = [next(iter(error.values())) for error in errors]
+            if any(item.get("status") != 409 for item in failed):
+                raise AirflowException(f"Failed to write price sketches: {failed}")
+            digests = {item["_id"]: digests[item["_id"]] for item in failed}
+            if not digests:
+                return
+        raise AirflowException(
+            f"Price sketches {sorted(digests)} kept conflicting with concurrent runs."
+        )
+
+    def update_quantile_sketches(self, rows, batch=None):
+        """Merges new prices into the per origin, location and month sketches."""
+        rows = rows.assign(month=rows["timestamp"].str[:7])
+        if "origin" not in rows:
+            rows = rows.assign(origin="")
+        digests = {
+            "|".join(key): (key, TDigest().update(group["cheapest_price"]))
+            for key, group in rows.groupby(list(SKETCH_FIELDS), sort=False)
+        }
+        self._write_sketches(digests, batch)
+
+    def rebuild_quantile_sketches(self):
+        """Recomputes the sketches from every raw quote in the price indices."""
+        self.bootstrap()
+        es = self.es
+        with es_operation("create"):
+            es.options(ignore_status=400).indices.create(index=SKETCH_INDEX)
+        digests, buffers = {}, {}
+
+        def flush(key):
+            digests.setdefault(key, TDigest()).update(buffers.pop(key))
+
+        with es_operation("scan"):
+            for hit in helpers.scan(
+                es,
+                index=price_read_indices(),
+                query={
+                    "_source": ["origin", "location", "cheapest_price", "timestamp"]
+                },
+            ):
+                doc = hit["_source"]
+                key = (doc.get("origin", ""), doc["location"], doc["timestamp"][:7])
+                buffers.setdefault(key, []).append(doc["cheapest_price"])
+                if len(buffers[key]) >= SKETCH_REBUILD_BUFFER:
+                    flush(key)
+        for key in list(buffers):
+            flush(key)
+        actions = (
+            {
+                "_op_type": "index",
+                "_index": SKETCH_INDEX,
+                "_id": "|".join(key),
+                "_source": sketch_document(key, digest),
+            }
+            for key, digest in digests.items()
+        )
+        with es_operation("bulk"):
+            helpers.bulk(es, actions, refresh="wait_for")
+
+    def get_quantile_statistics(self, percent, group_by=STATISTICS_GROUP_BY):
+        """Median and percentile-based spread per group from the price sketches.
+
+        Sketches of different origins and months are merged into their group.
+        """
+        es = self.es
+
+        def read():
+            digests = {}
+            with es_operation("search"):
+                for hit in helpers.scan(es, index=SKETCH_INDEX):
+                    doc = hit["_source"]
+                    if all(field in doc for field in group_by):
+                        digests.setdefault(group_key(doc, group_by), TDigest()).merge(
+                            TDigest.from_base64(doc["sketch"])
+                        )
+            return digests
+
+        try:
+            digests = read()
+        except NotFoundError:
+            logger.info("No price sketches found, rebuilding from '%s'.", INDEX)
+            self.rebuild_quantile_sketches()
+            digests = read()
+        return {
+            key: quantile_statistics(digest, percent)
+            for key, digest in digests.items()
+            if digest.count >= MIN_COUNT
+        }
+
+    def apply_retention(self, retention_months=RAW_RETENTION_MONTHS):
+        """Downsamples monthly price indices past retention into rollups, then drops them."""
+        if INDEX_PARTITIONING != "monthly":
+            logger.info("Retention only applies to monthly price indices.")
+            return
+        self.health_check()
+        es = self.es
+        cutoff = months_ago(retention_months)
+        for index in sorted(es.indices.get(index=f"{INDEX}-*")):
+            if index >= cutoff:
+                break
+            self.rebuild_daily_rollups(source=index)
+            es.indices.delete(index=index)
+            logger.info(
+                "Downsampled '%s' into '%s' and deleted it.", index, ROLLUP_INDEX
+            )
+
+
+os.register_at_fork(after_in_child=ElasticsearchConnection._reset_after_fork)
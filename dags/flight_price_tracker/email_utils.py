@@ -1,15 +1,64 @@
-def prepare_email_body(**kwargs):
-    rows_to_notify = kwargs["ti"].xcom_pull(
-        key="rows_to_notify", task_ids="prepare_price_alerts"
+import sys
+import os
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from artifact_store import pull_rows
+from telemetry import stage, record
+from alert_state import alert_state
+from price_statistics import baseline_label
+from config import EMAIL_RECIPIENT, BASELINE_MODE
+
+DIGEST_HEADER = "The following locations have flight deals:\n"
+
+
+def alert_line(row, label="Average Price"):
+    """One alert, with the baseline average_price (a median for quantile
+    baselines) shown under label."""
+    origin = f"Origin: {row['origin']}, " if row.get("origin") else ""
+    return (
+        f"{origin}Location: {row['location']}, "
+        f"Cheapest Price: ${row['cheapest_price']}, "
+        f"{label}: ${row['average_price']}"
     )
-    if not rows_to_notify:
-        return None
 
-    body = "The following locations have flight deals:\n\n"
-    for row in rows_to_notify:
-        location = row["location"]
-        cheapest_price = row["cheapest_price"]
-        avg_price = row["average_price"]
-        body += f"Location: {location}, Cheapest Price: ${cheapest_price}, Average Price: ${avg_price}\n"
 
-    return body
+def build_digests(
+    rows, default_recipient=EMAIL_RECIPIENT, label=baseline_label(BASELINE_MODE)
+):
+    """One email body per recipient listing all of their alerts.
+
+    Rows matched by subscriptions carry the recipient's email; rows without one
+    (no subscription store) go to default_recipient.
+    """
+    lines = defaultdict(list)
+    for row in rows:
+        lines[row.get("email") or default_recipient].append(alert_line(row, label))
+    return [
+        {"to": recipient, "html_content": "\n".join([DIGEST_HEADER, *alerts, ""])}
+        for recipient, alerts in lines.items()
+    ]
+
+
+@stage("prepare_digests")
+def prepare_digests(**kwargs):
+    """Digests of every shard's alerts, as send_email keyword arguments."""
+    rows_to_notify = list(
+        pull_rows(kwargs["ti"], task_ids="prepare_price_alerts", key="rows_to_notify")
+    )
+    digests = build_digests(rows_to_notify)
+    record(rows=len(digests))
+    return digests
+
+
+def record_sent_alerts(**kwargs):
+    """Records every shard's alerts for suppression, once all digests were sent.
+
+    Alerts of a failed send are not recorded, so the next run alerts again.
+    """
+    if alert_state.enabled():
+        alert_state.record(
+            pull_rows(
+                kwargs["ti"], task_ids="prepare_price_alerts", key="rows_to_notify"
+            )
+        )
@@ -0,0 +1,28 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from task_callables import lazy_callable
+
+with DAG(
+    "flight_price_retention",
+    default_args={
+        "owner": "airflow",
+        "retries": 3,
+        "retry_delay": timedelta(minutes=5),
+    },
+    description="Downsamples and drops monthly price indices past retention",
+    schedule_interval="@daily",
+    start_date=datetime(2025, 3, 1),
+    catchup=False,
+    max_active_runs=1,
+) as flight_price_retention_dag:
+
+    apply_retention_task = PythonOperator(
+        task_id="apply_retention",
+        python_callable=lazy_callable("storage_backend:apply_retention"),
+    )
@@ -5,11 +5,16 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator, ShortCircuitOperator
 from airflow.operators.email import EmailOperator
 
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-import data_pipeline
-import email_utils
-import elasticsearch_utils
-from config import EMAIL_RECIPIENT
+# Task modules import pandas and the Elasticsearch client, so they are only
+# imported when a task runs; parsing this file needs just config.
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from task_callables import lazy_callable
+from config import (
+    API_MAX_ACTIVE_FETCHES,
+    PIPELINE_MAX_ACTIVE_SHARDS,
+    INDEX_RETRIES,
+)
 
 with DAG(
     "flight_price_tracker",
@@ -25,36 +30,55 @@ with DAG(
     max_active_runs=3,
 ) as flight_price_dag:
 
-    fetch_data_task = PythonOperator(
-        task_id="fetch_data",
-        python_callable=data_pipeline.fetch_data,
+    plan_shards_task = PythonOperator(
+        task_id="plan_shards",
+        python_callable=lazy_callable("data_pipeline:plan_shards"),
     )
-    prepare_price_alerts_task = PythonOperator(
+    # One mapped instance per shard; map indexes line up across the three tasks.
+    fetch_data_task = PythonOperator.partial(
+        task_id="fetch_data",
+        python_callable=lazy_callable("data_pipeline:fetch_data"),
+        max_active_tis_per_dag=API_MAX_ACTIVE_FETCHES,
+    ).expand(op_kwargs=plan_shards_task.output)
+    prepare_price_alerts_task = PythonOperator.partial(
         task_id="prepare_price_alerts",
-        python_callable=data_pipeline.check_for_price_alerts,
-    )
-    index_data_task = PythonOperator(
+        python_callable=lazy_callable("data_pipeline:check_for_price_alerts"),
+        max_active_tis_per_dag=PIPELINE_MAX_ACTIVE_SHARDS,
+    ).expand(op_kwargs=plan_shards_task.output)
+    index_data_task = PythonOperator.partial(
         task_id="index_data",
-        python_callable=elasticsearch_utils.ElasticsearchConnection.index_data,
-    )
+        python_callable=lazy_callable("storage_backend:index_data"),
+        max_active_tis_per_dag=PIPELINE_MAX_ACTIVE_SHARDS,
+        retries=INDEX_RETRIES,
+        retry_delay=timedelta(seconds=30),
+        retry_exponential_backoff=True,
+        max_retry_delay=timedelta(minutes=10),
+    ).expand(op_kwargs=plan_shards_task.output)
     should_continue_task = ShortCircuitOperator(
         task_id="should_continue",
-        python_callable=data_pipeline.should_send_email,
+        python_callable=lazy_callable("data_pipeline:should_send_email"),
     )
     generate_email_content = PythonOperator(
-        task_id="generate_email_content", python_callable=email_utils.prepare_email_body
+        task_id="generate_email_content",
+        python_callable=lazy_callable("email_utils:prepare_digests"),
     )
-    send_email = EmailOperator(
+    # One email per recipient, each listing all of their alerts.
+    send_email = EmailOperator.partial(
         task_id="send_email",
-        to=EMAIL_RECIPIENT,
         subject="Price Alert for Cheap Tickets",
-        html_content="{{ ti.xcom_pull(task_ids='generate_email_content') }}",
+    ).expand_kwargs(generate_email_content.output)
+    record_alerts = PythonOperator(
+        task_id="record_alerts",
+        python_callable=lazy_callable("email_utils:record_sent_alerts"),
     )
+    # Indexing and alerting fan out from prepare, so a slow or retried bulk write
+    # neither delays nor re-sends the alert.
+    plan_shards_task >> fetch_data_task >> prepare_price_alerts_task
+    prepare_price_alerts_task >> index_data_task
     (
-        fetch_data_task
-        >> prepare_price_alerts_task
-        >> index_data_task
+        prepare_price_alerts_task
         >> should_continue_task
         >> generate_email_content
         >> send_email
+        >> record_alerts
     )
@@ -0,0 +1,266 @@
+import sys
+import os
+import shutil
+import hashlib
+import logging
+import operator
+from functools import reduce
+from datetime import datetime, timedelta
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    PARQUET_STORE_DIR,
+    MIN_COUNT,
+    STATISTICS_GROUP_BY,
+    STATISTICS_PARTITIONS,
+    BASELINE_MODE,
+    EWM_HORIZON_HALF_LIVES,
+    RAW_RETENTION_MONTHS,
+)
+from artifact_store import pull_table, to_table
+from telemetry import stage, record
+from baseline_cache import baseline_cache
+from storage_backend import StorageBackend
+from price_statistics import (
+    group_key,
+    parse_baseline_mode,
+    weighted_statistics,
+    quantile_statistics,
+)
+
+logger = logging.getLogger("airflow.task")
+
+PRICE_SCHEMA = pa.schema(
+    [
+        ("sky_id", pa.string()),
+        ("location", pa.string()),
+        ("origin", pa.string()),
+        ("cheapest_price", pa.float64()),
+        ("timestamp", pa.string()),
+    ]
+)
+MONTH_PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+COMPACTED_FILE = "compacted.parquet"
+
+
+class _ExactQuantiles:
+    """Exact percentiles of one group, shaped like the TDigest quantile sketch."""
+
+    def __init__(self, prices):
+        self.prices = prices
+
+    def quantile(self, q):
+        return float(np.quantile(self.prices, q))
+
+
+def _frame_key(key, group_by):
+    """Statistics key of a pandas groupby key."""
+    return group_key(
+        dict(zip(group_by, key if isinstance(key, tuple) else (key,))), group_by
+    )
+
+
+class ParquetStore(StorageBackend):
+    """Quotes in a local Parquet dataset partitioned by month, queried with Arrow.
+
+    Files are sorted by location and timestamp, so filters on both are pushed down
+    to month partitions and row group statistics. Statistics are computed from
+    the raw quotes on every call; scans of local columnar files are fast enough
+    that no summaries or rollups are kept.
+    """
+
+    def __init__(self, root=PARQUET_STORE_DIR):
+        self.root = root
+
+    def write(self, rows):
+        """Writes rows as one file per month; writing the same rows again replaces it."""
+        if rows is None or not len(rows):
+            return 0
+        table = to_table(rows)
+        table = pa.table(
+            {
+                field.name: (
+                    table[field.name].cast(field.type)
+                    if field.name in table.column_names
+                    else pa.nulls(table.num_rows, field.type)
+                )
+                for field in PRICE_SCHEMA
+            }
+        )
+        table = table.append_column(
+            "month", pc.utf8_slice_codeunits(table["timestamp"], 0, 7)
+        ).sort_by([("location", "ascending"), ("timestamp", "ascending")])
+        # Named after its rows, so a retried task overwrites its earlier file.
+        keys = pc.binary_join_element_wise(
+            pc.fill_null(table["sky_id"], ""),
+            pc.fill_null(table["origin"], ""),
+            table["timestamp"],
+            "|",
+        )
+        batch_id = hashlib.sha1("\n".join(keys.to_pylist()).encode()).hexdigest()
+        ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=MONTH_PARTITIONING,
+            basename_template=f"{batch_id}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        return table.num_rows
+
+    def _scan(self, columns, days=None, locations=None, now=None):
+        """Columns of the stored quotes, of the last days and given locations only."""
+        if not os.path.isdir(self.root):
+            return PRICE_SCHEMA.empty_table().select(columns)
+        dataset = ds.dataset(
+            self.root,
+            schema=PRICE_SCHEMA.append(pa.field("month", pa.string())),
+            format="parquet",
+            partitioning=MONTH_PARTITIONING,
+        )
+        condition = None
+        if days is not None:
+            cutoff = ((now or datetime.now()) - timedelta(days=days)).isoformat()
+            condition = (ds.field("month") >= cutoff[:7]) & (
+                ds.field("timestamp") >= cutoff
+            )
+        if locations is not None:
+            in_locations = ds.field("location").isin(list(locations))
+            condition = in_locations if condition is None else condition & in_locations
+        return dataset.to_table(columns=columns, filter=condition)
+
+    @stage("index_data")
+    def index_data(self, **kwargs):
+        rows = pull_table(kwargs["ti"], task_ids="prepare_price_alerts", key="all_rows")
+        written = self.write(rows)
+        record(rows=written)
+        if written:
+            baseline_cache.bump_version()
+
+    def seed_statistics(self):
+        # Statistics are computed from the raw quotes, only cached baselines are stale.
+        baseline_cache.bump_version()
+
+    def _statistics(self, table, group_by):
+        grouped = (
+            table.filter(
+                reduce(
+                    operator.and_, [pc.field(field).is_valid() for field in group_by]
+                )
+            )
+            .group_by(list(group_by))
+            .aggregate(
+                [
+                    ("cheapest_price", "count"),
+                    ("cheapest_price", "mean"),
+                    ("cheapest_price", "stddev"),
+                ]
+            )
+        )
+        return {
+            group_key(row, group_by): (
+                row["cheapest_price_mean"],
+                row["cheapest_price_stddev"],
+            )
+            for row in grouped.to_pylist()
+            if row["cheapest_price_count"] >= MIN_COUNT
+        }
+
+    @stage("get_location_price_statistics")
+    def get_location_price_statistics(
+        self,
+        group_by=STATISTICS_GROUP_BY,
+        partitions=STATISTICS_PARTITIONS,
+        days=None,
+        locations=None,
+    ):
+        """Mean and population std per group, optionally of the last days and given
+        locations only; partitions is ignored as Arrow already scans in parallel."""
+        table = self._scan([*group_by, "cheapest_price"], days, locations)
+        statistics = self._statistics(table, group_by)
+        record(rows=len(statistics))
+        return statistics
+
+    def get_running_statistics(self, group_by=STATISTICS_GROUP_BY):
+        return self.get_location_price_statistics(group_by)
+
+    def get_baseline_statistics(self, mode=BASELINE_MODE, group_by=STATISTICS_GROUP_BY):
+        kind, parameter = parse_baseline_mode(mode)
+        if kind == "all":
+            return self.get_location_price_statistics(group_by)
+        if kind == "window":
+            return self.get_location_price_statistics(group_by, days=parameter)
+        now = datetime.now()
+        days = parameter * EWM_HORIZON_HALF_LIVES if kind == "ewm" else None
+        frame = self._scan(
+            [*group_by, "cheapest_price", "timestamp"], days, now=now
+        ).to_pandas()
+        frame = frame.dropna(subset=list(group_by))
+        if kind == "quantile":
+            return {
+                _frame_key(key, group_by): quantile_statistics(
+                    _ExactQuantiles(prices.to_numpy()), parameter
+                )
+                for key, prices in frame.groupby(list(group_by))["cheapest_price"]
+                if len(prices) >= MIN_COUNT
+            }
+        age_days = (now - frame["timestamp"].astype("datetime64[us]")).dt.days
+        weight = 0.5 ** (age_days / parameter)
+        frame = frame.assign(
+            weight=weight,
+            weighted_sum=weight * frame["cheapest_price"],
+            weighted_sum_sq=weight * frame["cheapest_price"] ** 2,
+        )
+        sums = frame.groupby(list(group_by)).agg(
+            count=("cheapest_price", "count"),
+            weight=("weight", "sum"),
+            weighted_sum=("weighted_sum", "sum"),
+            weighted_sum_sq=("weighted_sum_sq", "sum"),
+        )
+        return {
+            _frame_key(key, group_by): weighted_statistics(
+                row["weight"], row["weighted_sum"], row["weighted_sum_sq"]
+            )
+            for key, row in sums.iterrows()
+            if row["count"] >= MIN_COUNT
+        }
+
+    def compact(self, month):
+        """Rewrites a month's files as one file sorted by location and timestamp."""
+        directory = os.path.join(self.root, f"month={month}")
+        files = sorted(
+            entry.path
+            for entry in os.scandir(directory)
+            if not entry.name.startswith(".")
+        )
+        if len(files) <= 1:
+            return
+        table = ds.dataset(files, schema=PRICE_SCHEMA, format="parquet").to_table()
+        table = table.sort_by([("location", "ascending"), ("timestamp", "ascending")])
+        tmp_path = os.path.join(directory, f".{COMPACTED_FILE}.{os.getpid()}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(directory, COMPACTED_FILE))
+        for path in files:
+            if os.path.basename(path) != COMPACTED_FILE:
+                os.remove(path)
+
+    def apply_retention(self, retention_months=RAW_RETENTION_MONTHS):
+        """Deletes months past retention and compacts the other finished months."""
+        if not os.path.isdir(self.root):
+            return
+        now = datetime.now()
+        current = f"{now:%Y-%m}"
+        month = now.year * 12 + now.month - 1 - retention_months
+        cutoff = f"{month // 12:04d}-{month % 12 + 1:02d}"
+        for entry in sorted(os.scandir(self.root), key=lambda entry: entry.name):
+            month = entry.name.partition("=")[2]
+            if month < cutoff:
+                shutil.rmtree(entry.path)
+                logger.info("Deleted quotes of %s past retention.", month)
+            elif month < current:
+                self.compact(month)
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+# Merges a batch (count, mean, m2) into a stored summary (Chan et al. parallel update).
+# sum and sum_sq let rollups be combined by plain (or decay weighted) sum aggregations.
+# The last batches_kept batch ids are stored, so a retried batch is merged only once.
+MERGE_SCRIPT = """
+if (ctx._source.batches == null) { ctx._source.batches = []; }
+if (params.batch != null && ctx._source.batches.contains(params.batch)) {
+  ctx.op = 'noop';
+} else {
+  double n_a = ctx._source.count;
+  double n_b = params.count;
+  double n = n_a + n_b;
+  double delta = params.mean - ctx._source.mean;
+  ctx._source.mean += delta * n_b / n;
+  ctx._source.m2 += params.m2 + delta * delta * n_a * n_b / n;
+  ctx._source.count = (long) n;
+  ctx._source.sum = (ctx._source.sum ?: 0.0) + params.sum;
+  ctx._source.sum_sq = (ctx._source.sum_sq ?: 0.0) + params.sum_sq;
+  if (params.batch != null) {
+    ctx._source.batches.add(params.batch);
+    if (ctx._source.batches.size() > params.batches_kept) {
+      ctx._source.batches.remove(0);
+    }
+  }
+}
+"""
+
+# Weight of a daily rollup for exponentially decayed baselines.
+DECAY_WEIGHT = (
+    "Math.pow(0.5, (params.now - doc['day'].value.toInstant().toEpochMilli())"
+    " / params.half_life)"
+)
+
+
+def summarize_batch(rows, group_fields=("location",), value_field="cheapest_price"):
+    """Count, mean, M2 (sum of squared deviations), sum and sum of squares per group."""
+    grouped = rows.groupby(list(group_fields), sort=False)[value_field]
+    summary = grouped.agg(["count", "mean", "sum"])
+    summary["m2"] = grouped.var(ddof=0) * summary["count"]
+    summary["sum_sq"] = (
+        rows[value_field].pow(2).groupby([rows[field] for field in group_fields]).sum()
+    )
+    return summary.reset_index()
+
+
+def group_key(key, group_by):
+    """Statistics key: the location alone, or a tuple such as (origin, location)."""
+    if len(group_by) == 1:
+        return key[group_by[0]]
+    return tuple(key[field] for field in group_by)
+
+
+def parse_baseline_mode(mode):
+    """Splits "all", "window:<days>", "ewm:<half-life days>" or "quantile:<percent>"
+    into (kind, parameter)."""
+    kind, _, parameter = mode.partition(":")
+    if kind == "all" and not parameter:
+        return kind, None
+    if kind in ("window", "ewm") and parameter:
+        return kind, float(parameter)
+    if kind == "quantile" and parameter and 0 < float(parameter) < 50:
+        return kind, float(parameter)
+    raise ValueError(f"Unknown baseline mode '{mode}'")
+
+
+def has_mean_floor(mode):
+    """Whether quotes 10% below the baseline mean alert regardless of its spread.
+
+    Not for quantile baselines: their (median, spread) threshold is the chosen
+    percentile, which the floor would replace whenever it is below 0.9 * median.
+    """
+    return parse_baseline_mode(mode)[0] != "quantile"
+
+
+def alert_threshold(mean, std, sensitivity=0.5, mean_floor=True):
+    """Price below which a quote alerts: mean - sensitivity * std, or 0.9 * mean
+    if that is higher and mean_floor is set."""
+    threshold = mean - sensitivity * std
+    return np.maximum(threshold, 0.9 * mean) if mean_floor else threshold
+
+
+def baseline_label(mode):
+    """Name of the baseline statistic compared with, as shown in alerts."""
+    return (
+        "Median Price"
+        if parse_baseline_mode(mode)[0] == "quantile"
+        else "Average Price"
+    )
+
+
+def quantile_statistics(digest, percent):
+    """(median, spread) from a price sketch, for the mean/std based alert rule.
+
+    spread is twice the distance from the median down to the percentile, so
+    median - 0.5 * spread, the default alert threshold, is that percentile
+    (see has_mean_floor).
+    """
+    median = digest.quantile(0.5)
+    return median, 2 * (median - digest.quantile(percent / 100))
+
+
+def weighted_statistics(weight, weighted_sum, weighted_sum_sq):
+    """Mean and standard deviation from (optionally decay weighted) sums."""
+    mean = weighted_sum / weight
+    variance = max(weighted_sum_sq / weight - mean * mean, 0.0)
+    return mean, float(np.sqrt(variance))
+
+
+def merge_statistics(a, b):
+    """Merges two (count, mean, m2) summaries into one."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+
+def to_mean_and_std(count, mean, m2):
+    """Mean and population standard deviation, as extended_stats reports them."""
+    return mean, float(np.sqrt(m2 / count)) if count else np.nan
+
+
+def summaries_to_statistics(summaries, min_count):
+    """Maps key -> (count, mean, m2) summaries to key -> (mean, std) for alerting."""
+    return {
+        key: to_mean_and_std(*summary)
+        for key, summary in summaries.items()
+        if summary[0] >= min_count
+    }
@@ -0,0 +1,89 @@
+import sys
+import os
+import base64
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import SKETCH_COMPRESSION
+
+
+class TDigest:
+    """Mergeable quantile sketch of a price distribution (merging t-digest).
+
+    Prices are kept as at most ~compression / 2 weighted centroids, which are
+    smallest in the tails (k1 scale function), so low percentiles such as p10 stay
+    accurate. Digests of different origins or months merge into one of the same
+    size, so memory per location stays constant.
+    """
+
+    def __init__(self, compression=SKETCH_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        # Centroids sharing a unit of k = compression / 2pi * asin(2q - 1) merge.
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def update(self, values):
+        """Adds a batch of values; returns the digest."""
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._compress(
+                np.concatenate([self.means, values]),
+                np.concatenate([self.weights, np.ones(len(values))]),
+            )
+        return self
+
+    def merge(self, other):
+        """Merges another digest into this one; returns the digest."""
+        if other.count:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(
+                np.concatenate([self.means, other.means]),
+                np.concatenate([self.weights, other.weights]),
+            )
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), NaN for an empty digest."""
+        if not self.count:
+            return np.nan
+        # Each centroid's mean sits at the middle of the ranks it covers.
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(
+            np.interp(
+                q * self.count,
+                np.r_[0.0, centers, self.count],
+                np.r_[self.min, self.means, self.max],
+            )
+        )
+
+    def to_base64(self):
+        """Compact serialized form: float64 compression, min, max, means, weights."""
+        array = np.r_[self.compression, self.min, self.max, self.means, self.weights]
+        return base64.b64encode(array.astype("<f8").tobytes()).decode()
+
+    @classmethod
+    def from_base64(cls, data):
+        array = np.frombuffer(base64.b64decode(data), dtype="<f8")
+        digest = cls(compression=array[0])
+        digest.min, digest.max = float(array[1]), float(array[2])
+        digest.means, digest.weights = np.split(array[3:].copy(), 2)
+        return digest
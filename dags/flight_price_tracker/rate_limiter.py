@@ -0,0 +1,153 @@
+import sys
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import aiohttp
+import requests
+from airflow.stats import Stats
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    API_RATE_LIMIT,
+    API_BURST,
+    API_MAX_ACTIVE_FETCHES,
+    API_MAX_RETRIES,
+    API_BACKOFF_BASE,
+    API_BACKOFF_MAX,
+)
+
+logger = logging.getLogger("airflow.task")
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers that overdraw it are queued by wait time."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes one token and returns how long the caller must wait before using it."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def parse_retry_after(value):
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RequestScheduler:
+    """Paces API requests through a token bucket and retries throttled requests.
+
+    Cross-run coordination comes from the fetch task's concurrency limit, so each
+    active fetch gets an equal share of the plan's request rate.
+    """
+
+    def __init__(
+        self,
+        rate=API_RATE_LIMIT / API_MAX_ACTIVE_FETCHES,
+        capacity=max(API_BURST // API_MAX_ACTIVE_FETCHES, 1),
+        max_retries=API_MAX_RETRIES,
+        backoff_base=API_BACKOFF_BASE,
+        backoff_max=API_BACKOFF_MAX,
+    ):
+        self.bucket = TokenBucket(rate, capacity)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.counters = {"sent": 0, "throttled": 0, "retried": 0}
+        # Response bytes received, for the fetch payload size without re-serializing.
+        self.received_bytes = 0
+
+    def _incr(self, counter):
+        self.counters[counter] += 1
+        Stats.incr(f"flight_price_tracker.api.{counter}")
+
+    def retry_delay(self, attempt, retry_after=None):
+        """Honours Retry-After when given, otherwise full-jitter exponential backoff."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _should_retry(self, status, attempt):
+        if status == 429:
+            self._incr("throttled")
+        if status in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+            self._incr("retried")
+            return True
+        return False
+
+    def get(self, url, **kwargs):
+        """Sends a rate limited GET, retrying throttled and transient failures."""
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self.bucket.reserve())
+            self._incr("sent")
+            try:
+                response = requests.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._incr("retried")
+                time.sleep(self.retry_delay(attempt))
+                continue
+            if not self._should_retry(response.status_code, attempt):
+                self.received_bytes += len(response.content)
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            time.sleep(self.retry_delay(attempt, retry_after))
+        return response
+
+    async def get_async(self, session, url, **kwargs):
+        """Async variant of get; returns the status code and the decoded JSON body."""
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self.bucket.reserve())
+            self._incr("sent")
+            try:
+                async with session.get(url, **kwargs) as response:
+                    if not self._should_retry(response.status, attempt):
+                        if response.status != 200:
+                            return response.status, None
+                        self.received_bytes += response.content_length or 0
+                        return response.status, await response.json()
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                self._incr("retried")
+                retry_after = None
+            await asyncio.sleep(self.retry_delay(attempt, retry_after))
+        return response.status, None
+
+    def log_counters(self):
+        logger.info("API requests: %s", self.counters)
+
+
+scheduler = RequestScheduler()
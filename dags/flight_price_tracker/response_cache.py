@@ -0,0 +1,98 @@
+import sys
+import os
+import json
+import time
+import hashlib
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import LOCAL_STATE_DIR, RESPONSE_CACHE_TTL
+
+
+def cache_key(url, params):
+    """Stable key for a request made with the given url and query params."""
+    raw = json.dumps([url, params], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def quote_price(entry):
+    """Price used for alerts: cheapest quote if it is direct, otherwise the direct quote."""
+    quotes = entry.get("content", {}).get("flightQuotes", {})
+    if quotes.get("cheapest", {}).get("direct"):
+        return quotes.get("cheapest", {}).get("rawPrice")
+    return quotes.get("direct", {}).get("rawPrice")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+class ResponseCache:
+    """On-disk cache of API results keyed by url and params, expiring after ttl seconds."""
+
+    def __init__(
+        self,
+        directory=os.path.join(LOCAL_STATE_DIR, "responses"),
+        ttl=RESPONSE_CACHE_TTL,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, url, params):
+        return os.path.join(self.directory, f"{cache_key(url, params)}.json")
+
+    def get(self, url, params):
+        if self.ttl <= 0:
+            return None
+        cached = _read_json(self._path(url, params))
+        if cached is None or time.time() - cached["stored_at"] > self.ttl:
+            return None
+        return cached["results"]
+
+    def put(self, url, params, results):
+        if self.ttl > 0:
+            _write_json(
+                self._path(url, params), {"stored_at": time.time(), "results": results}
+            )
+
+
+class QuoteDiff:
+    """Remembers the last seen price per destination to pass on only changed quotes.
+
+    The prices a run was compared with are kept along with its run_id, so a
+    retried fetch of the same run passes on the same quotes instead of none.
+    """
+
+    def __init__(self, directory=os.path.join(LOCAL_STATE_DIR, "quotes")):
+        self.directory = directory
+
+    def changed_quotes(self, url, params, results, run_id=None):
+        path = os.path.join(self.directory, f"{cache_key(url, params)}.json")
+        state = _read_json(path) or {}
+        if run_id is not None and state.get("run_id") == run_id:
+            previous = state["previous"]
+        else:
+            previous = state.get("current", {})
+        current = {entry.get("skyId"): quote_price(entry) for entry in results}
+        _write_json(path, {"run_id": run_id, "previous": previous, "current": current})
+        return [
+            entry
+            for entry in results
+            if entry.get("skyId") not in previous
+            or previous[entry.get("skyId")] != current[entry.get("skyId")]
+        ]
+
+
+response_cache = ResponseCache()
+quote_diff = QuoteDiff()
@@ -0,0 +1,78 @@
+import sys
+import os
+from abc import ABC, abstractmethod
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import (
+    STORAGE_BACKEND,
+    STATISTICS_GROUP_BY,
+    STATISTICS_PARTITIONS,
+    BASELINE_MODE,
+    RAW_RETENTION_MONTHS,
+)
+
+
+class StorageBackend(ABC):
+    """Stores quotes and computes the price statistics alerts are compared with.
+
+    Statistics map a group key (see price_statistics.group_key) to (mean, std) and
+    skip groups with fewer than MIN_COUNT quotes.
+    """
+
+    @abstractmethod
+    def index_data(self, **kwargs):
+        """Stores the rows prepare_price_alerts pushed for the task's shard."""
+
+    @abstractmethod
+    def write(self, rows):
+        """Stores rows without updating statistics; retried rows are not duplicated."""
+
+    @abstractmethod
+    def seed_statistics(self):
+        """Recomputes the statistics kept for the configured modes from all quotes."""
+
+    @abstractmethod
+    def get_location_price_statistics(
+        self, group_by=STATISTICS_GROUP_BY, partitions=STATISTICS_PARTITIONS
+    ):
+        """Statistics over every stored quote."""
+
+    @abstractmethod
+    def get_running_statistics(self, group_by=STATISTICS_GROUP_BY):
+        """Statistics over every stored quote, from incrementally kept summaries."""
+
+    @abstractmethod
+    def get_baseline_statistics(self, mode=BASELINE_MODE, group_by=STATISTICS_GROUP_BY):
+        """Statistics for a baseline mode, see price_statistics.parse_baseline_mode."""
+
+    @abstractmethod
+    def apply_retention(self, retention_months=RAW_RETENTION_MONTHS):
+        """Drops raw quotes older than the retention period."""
+
+
+def _elasticsearch():
+    from elasticsearch_utils import ElasticsearchConnection
+
+    return ElasticsearchConnection()
+
+
+def _parquet():
+    from parquet_store import ParquetStore
+
+    return ParquetStore()
+
+
+STORAGE_BACKENDS = {"elasticsearch": _elasticsearch, "parquet": _parquet}
+
+
+def get_storage_backend(name=STORAGE_BACKEND):
+    """The configured backend; only its module and client library are imported."""
+    return STORAGE_BACKENDS[name]()
+
+
+def index_data(**kwargs):
+    return get_storage_backend().index_data(**kwargs)
+
+
+def apply_retention():
+    return get_storage_backend().apply_retention()
@@ -0,0 +1,137 @@
+import sys
+import os
+import json
+from bisect import bisect_left
+from collections import defaultdict
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import SUBSCRIPTIONS_PATH, DEFAULT_SENSITIVITY, BASELINE_MODE
+from price_statistics import has_mean_floor
+
+
+def normalize(subscription):
+    """Subscription with defaults filled in: any price, the global sensitivity."""
+    return {
+        "locations": [],
+        "sky_ids": [],
+        "max_price": None,
+        "sensitivity": DEFAULT_SENSITIVITY,
+        **subscription,
+    }
+
+
+class SubscriptionStore:
+    """Subscriptions as JSON lines, one per line, e.g.
+
+    {"id": "1", "email": "a@b.c", "locations": ["Denmark"], "sky_ids": [],
+     "max_price": 120.0, "sensitivity": 0.5}
+
+    Locations are written as in the price index (spaces replaced by underscores).
+    A subscription without locations or sky_ids matches every destination.
+    """
+
+    def __init__(self, path=SUBSCRIPTIONS_PATH):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path, "r") as f:
+            return [normalize(json.loads(line)) for line in f if line.strip()]
+
+    def add(self, subscriptions):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            for subscription in subscriptions:
+                f.write(json.dumps(subscription) + "\n")
+
+
+class SubscriptionIndex:
+    """Inverted index from location and sky_id to the subscriptions watching them.
+
+    Each bucket is sorted by sensitivity, so the subscriptions whose price-drop
+    rule a quote meets are a prefix found by bisection; matching a run costs
+    O(quotes + matches) rather than O(subscriptions x quotes). mean_floor is the
+    10% floor of price_statistics.alert_threshold.
+    """
+
+    def __init__(self, subscriptions, mean_floor=True):
+        self.mean_floor = mean_floor
+        buckets = defaultdict(list)
+        for subscription in subscriptions:
+            keys = [
+                *(("location", value) for value in subscription["locations"]),
+                *(("sky_id", value) for value in subscription["sky_ids"]),
+            ]
+            # Subscriptions without filters sit in the wildcard bucket.
+            for key in keys or [None]:
+                buckets[key].append(subscription)
+        self.buckets = {}
+        for key, bucket in buckets.items():
+            bucket.sort(key=lambda subscription: subscription["sensitivity"])
+            self.buckets[key] = (
+                [subscription["sensitivity"] for subscription in bucket],
+                bucket,
+            )
+
+    def _matching(self, key, price, mean, std):
+        if key not in self.buckets:
+            return
+        sensitivities, bucket = self.buckets[key]
+        # price < max(mean - sensitivity * std, 0.9 * mean), solved for sensitivity.
+        if self.mean_floor and price < 0.9 * mean:
+            end = len(bucket)
+        elif std > 0:
+            end = bisect_left(sensitivities, (mean - price) / std)
+        else:
+            end = len(bucket) if price < mean else 0
+        for i in range(end):
+            max_price = bucket[i]["max_price"]
+            if max_price is None or price <= max_price:
+                yield bucket[i]
+
+    def match(self, location, sky_id, price, mean, std):
+        """Subscriptions alerted by a quote, each once."""
+        seen = set()
+        for key in (("location", location), ("sky_id", sky_id), None):
+            for subscription in self._matching(key, price, mean, std):
+                if subscription["id"] not in seen:
+                    seen.add(subscription["id"])
+                    yield subscription
+
+
+def load_subscription_index(store=None, mode=BASELINE_MODE):
+    """Index of the stored subscriptions, or None when there is no store."""
+    store = store or SubscriptionStore()
+    if not store.exists():
+        return None
+    return SubscriptionIndex(store.load(), has_mean_floor(mode))
+
+
+def match_subscriptions(flight_prices_df, index):
+    """One alert row per (quote, subscription) match, with the recipient's email.
+
+    flight_prices_df holds quotes joined with their group's average_price and
+    std_dev, as built by data_pipeline.join_statistics.
+    """
+    positions, emails, subscription_ids = [], [], []
+    columns = [
+        flight_prices_df[field].tolist()
+        for field in (
+            "location",
+            "sky_id",
+            "cheapest_price",
+            "average_price",
+            "std_dev",
+        )
+    ]
+    for position, quote in enumerate(zip(*columns)):
+        for subscription in index.match(*quote):
+            positions.append(position)
+            emails.append(subscription["email"])
+            subscription_ids.append(subscription["id"])
+    # Matched quotes are taken by position instead of copying a dict per match.
+    alerts = flight_prices_df.take(positions).drop(columns=["std_dev"])
+    return alerts.assign(email=emails, subscription_id=subscription_ids)
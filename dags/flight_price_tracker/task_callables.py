@@ -0,0 +1,32 @@
+import sys
+import os
+import importlib
+from airflow.utils.operator_helpers import determine_kwargs
+
+DAG_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def add_dag_folder():
+    """Makes this folder's modules importable; a no-op once they are."""
+    if DAG_FOLDER not in sys.path:
+        sys.path.append(DAG_FOLDER)
+
+
+def lazy_callable(path):
+    """Task callable for "module:attr", imported when the task runs, not on parse.
+
+    Keeps pandas, numpy and the Elasticsearch client out of the scheduler's DAG
+    parsing; only the context arguments the target accepts are passed on.
+    """
+    module_name, _, attr = path.partition(":")
+
+    def call(*args, **kwargs):
+        add_dag_folder()
+        target = importlib.import_module(module_name)
+        for name in attr.split("."):
+            target = getattr(target, name)
+        return target(*args, **determine_kwargs(target, args, kwargs))
+
+    call.__name__ = attr.rsplit(".", 1)[-1]
+    call.__qualname__ = path
+    return call
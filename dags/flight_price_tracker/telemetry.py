@@ -0,0 +1,175 @@
+import sys
+import os
+import time
+import cProfile
+import logging
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+from opentelemetry import trace, metrics
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import TELEMETRY_EXPORTER, TELEMETRY_PROFILE_DIR
+
+logger = logging.getLogger("airflow.task")
+
+tracer = trace.get_tracer("flight_price_tracker")
+meter = metrics.get_meter("flight_price_tracker")
+stage_duration = meter.create_histogram(
+    "flight_price_tracker.stage.duration", unit="ms"
+)
+stage_process_peak_rss = meter.create_histogram(
+    "flight_price_tracker.stage.process_peak_rss", unit="By"
+)
+stage_rows = meter.create_counter("flight_price_tracker.stage.rows")
+stage_payload_bytes = meter.create_counter(
+    "flight_price_tracker.stage.payload_bytes", unit="By"
+)
+
+_current_stage = ContextVar("current_stage", default=None)
+_exporters = {}
+
+
+def configure(exporter=TELEMETRY_EXPORTER):
+    """Installs the tracer and meter providers once per process.
+
+    "memory" keeps spans and metrics in process for tests, "otlp" exports them to
+    the collector configured by the standard OTEL_EXPORTER_OTLP_* variables.
+    Returns the exporters by name ("spans", "metrics") for the memory exporter.
+    """
+    if exporter == "none" or enabled():
+        return _exporters
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.resources import Resource
+
+    service = Resource.create({"service.name": "flight_price_tracker"})
+    if exporter == "memory":
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+            InMemorySpanExporter,
+        )
+        from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+        _exporters["spans"] = InMemorySpanExporter()
+        _exporters["metrics"] = InMemoryMetricReader()
+        span_processor = SimpleSpanProcessor(_exporters["spans"])
+        metric_reader = _exporters["metrics"]
+    elif exporter == "otlp":
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import (
+            OTLPMetricExporter,
+        )
+
+        span_processor = BatchSpanProcessor(OTLPSpanExporter())
+        metric_reader = PeriodicExportingMetricReader(OTLPMetricExporter())
+    else:
+        raise ValueError(f"Unknown telemetry exporter '{exporter}'")
+    tracer_provider = TracerProvider(resource=service)
+    tracer_provider.add_span_processor(span_processor)
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(
+        MeterProvider(resource=service, metric_readers=[metric_reader])
+    )
+    return _exporters
+
+
+def enabled():
+    # Checked on the global provider, which every import of this module shares.
+    return type(trace.get_tracer_provider()).__module__.startswith("opentelemetry.sdk")
+
+
+def payload_size(value):
+    """Size in bytes of a columnar or serialized task payload, None for others.
+
+    Lists of dicts are not sized, as that would mean serializing them once more.
+    """
+    if isinstance(value, pa.Table):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage().sum())
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return None
+
+
+def record(rows=None, payload=None, payload_bytes=None):
+    """Adds row count and payload size to the current stage, when tracing.
+
+    payload_bytes, e.g. the size of the API responses, is used instead of sizing
+    the payload.
+    """
+    name = _current_stage.get()
+    if name is None or not enabled():
+        return
+    span = trace.get_current_span()
+    if rows is not None:
+        span.set_attribute("rows", rows)
+        stage_rows.add(rows, {"stage": name})
+    if payload_bytes is None and payload is not None:
+        payload_bytes = payload_size(payload)
+    if payload_bytes is not None:
+        span.set_attribute("payload_bytes", payload_bytes)
+        stage_payload_bytes.add(payload_bytes, {"stage": name})
+
+
+@contextmanager
+def _profiled(name):
+    """cProfile and tracemalloc dumps of the outermost stage, if a dump dir is set."""
+    if not TELEMETRY_PROFILE_DIR or _current_stage.get() is not None:
+        yield None
+        return
+    os.makedirs(TELEMETRY_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(TELEMETRY_PROFILE_DIR, f"{name}-{datetime.now():%Y%m%dT%H%M%S}")
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    profile.enable()
+    try:
+        yield path
+    finally:
+        profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profile.dump_stats(f"{path}.prof")
+        with open(f"{path}.memory.txt", "w") as f:
+            f.write(f"peak {peak} bytes\n")
+            for stat in snapshot.statistics("lineno")[:25]:
+                f.write(f"{stat}\n")
+        logger.info("Profile of %s written to %s.prof", name, path)
+
+
+@contextmanager
+def stage(name):
+    """Span around a pipeline stage recording its duration and the process peak RSS.
+
+    The peak RSS is the process high-water mark when the stage ends; allocations
+    are traced per stage only in profile mode. Also usable as a decorator; a no-op
+    unless telemetry or profiling is enabled.
+    """
+    configure()
+    if not enabled() and not TELEMETRY_PROFILE_DIR:
+        yield
+        return
+    with _profiled(name), tracer.start_as_current_span(name) as span:
+        token = _current_stage.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_stage.reset(token)
+            elapsed = (time.perf_counter() - start) * 1000
+            # ru_maxrss is in KiB on Linux.
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            span.set_attribute("duration_ms", elapsed)
+            span.set_attribute("process.peak_rss_bytes", peak)
+            stage_duration.record(elapsed, {"stage": name})
+            stage_process_peak_rss.record(peak, {"stage": name})
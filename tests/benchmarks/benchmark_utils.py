@@ -0,0 +1,97 @@
+import json
+import time
+import tracemalloc
+
+
+def load_json(file_path):
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def run_benchmark(name, n_items, func, unit="rows"):
+    """Prints wall time and throughput of func, then its peak traced memory.
+
+    Memory is measured in a second run since tracing slows the interpreter down.
+    """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"\n[benchmark] {name}: {n_items} {unit} in {elapsed:.3f}s "
+        f"({n_items / elapsed:,.0f} {unit}/s, peak {peak / 2**20:.1f} MiB)"
+    )
+    return result
+
+
+def synthetic_results(n_quotes, n_locations=500, seed=0):
+    """Search results shaped like the everywhereDestination payload."""
+    import random
+
+    rng = random.Random(seed)
+    locations = [f"Location {i}" for i in range(n_locations)]
+    results = []
+    for i in range(n_quotes):
+        location = locations[i % n_locations]
+        cheapest = round(rng.uniform(20, 400), 2)
+        direct = rng.random() < 0.5
+        results.append(
+            {
+                "id": f"location-{i}",
+                "type": "LOCATION",
+                "content": {
+                    "location": {
+                        "id": str(i),
+                        "skyCode": f"L{i % n_locations}",
+                        "name": location,
+                        "type": "Nation",
+                    },
+                    "flightQuotes": {
+                        "cheapest": {
+                            "price": f"${cheapest:.0f}",
+                            "rawPrice": cheapest,
+                            "direct": direct,
+                        },
+                        "direct": {
+                            "price": f"${cheapest * 1.2:.0f}",
+                            "rawPrice": round(cheapest * 1.2, 2),
+                            "direct": True,
+                        },
+                    },
+                    "image": {"url": f"https://content.skyscnr.com/{i}.jpg"},
+                    "flightRoutes": {"directFlightsAvailable": direct},
+                },
+                "entityId": f"entity-{i}",
+                "skyId": f"L{i % n_locations}",
+                "timestamp": "2025-03-16T19:25:46.590256",
+            }
+        )
+    return results
+
+
+def location_statistics(n_locations=500):
+    return {f"Location_{i}": (200.0, 50.0) for i in range(n_locations)}
+
+
+def synthetic_history(n_docs, index, n_locations=500, days=365, seed=0):
+    """Bulk actions for raw price documents spread over the last days."""
+    import random
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    for i in range(n_docs):
+        location = i % n_locations
+        timestamp = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        yield {
+            "_index": index,
+            "_source": {
+                "sky_id": f"L{location}",
+                "location": f"Location_{location}",
+                "cheapest_price": round(rng.uniform(20, 400), 2),
+                "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f"),
+            },
+        }
@@ -0,0 +1,59 @@
+import os
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from benchmark_utils import load_json
+
+STUB_LATENCY = float(os.getenv("BENCHMARK_STUB_LATENCY", "0.05"))
+
+
+@pytest.fixture(scope="session")
+def stub_api_url():
+    """Serves the recorded search-roundtrip payload from a local aiohttp server."""
+    payload = load_json("tests/unit/test_data/test_prepare_price_alerts_input.json")
+
+    async def search_roundtrip(request):
+        await asyncio.sleep(STUB_LATENCY)
+        return web.json_response(payload)
+
+    app = web.Application()
+    app.router.add_get("/flights/search-roundtrip", search_roundtrip)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{port}/flights/search-roundtrip"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(runner.cleanup())
+
+
+@pytest.fixture(scope="session")
+def es_client():
+    """Local Elasticsearch for benchmarks, e.g. BENCHMARK_ES_URL=http://localhost:9200."""
+    url = os.getenv("BENCHMARK_ES_URL")
+    if not url:
+        pytest.skip("BENCHMARK_ES_URL is not set")
+    from elasticsearch import Elasticsearch
+
+    password = os.getenv("BENCHMARK_ES_PASSWORD")
+    return Elasticsearch(
+        [url],
+        basic_auth=("elastic", password) if password else None,
+        request_timeout=600,
+    )
+
+
+@pytest.fixture
+def es_connection(es_client):
+    """ElasticsearchConnection on the benchmark cluster."""
+    from unittest.mock import patch
+    from dags.flight_price_tracker.elasticsearch_utils import ElasticsearchConnection
+
+    with patch.object(ElasticsearchConnection, "_bootstrapped", True):
+        yield ElasticsearchConnection(es_client)
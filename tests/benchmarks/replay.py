@@ -0,0 +1,288 @@
+"""Record real search-roundtrip responses and replay them through the pipeline.
+
+    python tests/benchmarks/replay.py record --out recordings/
+    python tests/benchmarks/replay.py serve --recordings recordings/ --port 8099
+    python tests/benchmarks/replay.py run --recordings recordings/ --origins 10 \\
+        --destinations 500 --history-runs 4320 --runs 5 --es-url http://localhost:9200
+
+`run` serves the recordings (or synthetic results) from a local stub, optionally
+synthesizes history into a local Elasticsearch, then runs fetch -> prepare ->
+index -> alert in process and reports per-stage latency and throughput.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import zlib
+import base64
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime, timedelta
+from aiohttp import web
+
+from benchmark_utils import synthetic_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DAG_FOLDER = os.path.join(ROOT, "dags", "flight_price_tracker")
+RUN_INTERVAL = timedelta(minutes=30)
+
+
+class FakeTaskInstance:
+    """Keeps pushed XComs in memory so pulls see what earlier tasks pushed."""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.task_id = None
+        self.xcoms = {}
+
+    def xcom_push(self, key, value):
+        self.xcoms[(self.task_id, key)] = value
+
+    def xcom_pull(self, task_ids, key):
+        return self.xcoms.get((task_ids, key))
+
+
+def origin_entity_id(code):
+    """fromEntityId in the API's base64 JSON format for an origin code."""
+    return base64.b64encode(json.dumps({"s": code}).encode()).decode()
+
+
+def load_recordings(directory):
+    """Recorded result lists, or one synthetic payload when there are none."""
+    paths = sorted(glob.glob(os.path.join(directory or "", "*.json")))
+    recordings = []
+    for path in paths:
+        with open(path, "r") as f:
+            recordings.append(json.load(f))
+    return recordings or [synthetic_results(100, n_locations=100)]
+
+
+def scale_results(base, destinations, rng):
+    """Destinations cloned from recorded ones with unique names and jittered prices."""
+    results = []
+    for i in range(destinations):
+        entry = json.loads(json.dumps(base[i % len(base)]))
+        copy = i // len(base)
+        if copy:
+            entry["skyId"] = f"{entry.get('skyId')}{copy}"
+            location = entry["content"]["location"]
+            location["name"] = f"{location['name']} {copy}"
+        for quote in entry["content"].get("flightQuotes", {}).values():
+            if quote.get("rawPrice") is not None:
+                quote["rawPrice"] = round(quote["rawPrice"] * rng.uniform(0.8, 1.2), 2)
+        results.append(entry)
+    return results
+
+
+def start_stub(recordings, destinations, port=0):
+    """Serves scaled recordings as search-roundtrip responses; returns the url."""
+
+    async def search_roundtrip(request):
+        origin = request.query.get("fromEntityId", "")
+        rng = random.Random()
+        base = recordings[zlib.crc32(origin.encode()) % len(recordings)]
+        results = scale_results(base, destinations, rng)
+        return web.json_response(
+            {"data": {"everywhereDestination": {"results": results}}}
+        )
+
+    app = web.Application()
+    app.router.add_get("/flights/search-roundtrip", search_roundtrip)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}/flights/search-roundtrip"
+
+
+def configure_environment(args, url):
+    """Points the pipeline at the stub and local cluster; must precede its import."""
+    origins = [origin_entity_id(f"O{i}") for i in range(args.origins)]
+    os.environ.update(
+        {
+            "AIRFLOW_VAR_FLIGHT_API_URL": url,
+            "AIRFLOW_VAR_FLIGHT_ORIGINS": ",".join(origins),
+            "AIRFLOW_VAR_API_RATE_LIMIT": "1000000",
+            "AIRFLOW_VAR_API_BURST": "1000000",
+            "AIRFLOW_VAR_FLIGHT_TRACKER_STATE_DIR": tempfile.mkdtemp(),
+        }
+    )
+    if args.es_url:
+        os.environ["AIRFLOW_VAR_ELASTIC_HOSTS"] = args.es_url
+    if args.es_password:
+        os.environ["AIRFLOW_VAR_ELASTIC_PASSWORD"] = args.es_password
+    sys.path.insert(0, DAG_FOLDER)
+
+
+def synthesize_history(recordings, args):
+    """Indexes history_runs past snapshots of every origin and destination."""
+    from elasticsearch_utils import ElasticsearchConnection, document_id
+    from data_pipeline import extract_flight_prices
+
+    rng = random.Random(0)
+    now = datetime.now()
+    snapshots = {
+        f"O{i}": extract_flight_prices(
+            scale_results(recordings[i % len(recordings)], args.destinations, rng)
+        ).to_dict(orient="records")
+        for i in range(args.origins)
+    }
+
+    def actions():
+        for run in range(1, args.history_runs + 1):
+            timestamp = (now - run * RUN_INTERVAL).strftime("%Y-%m-%dT%H:%M:%S.%f")
+            for origin, rows in snapshots.items():
+                for row in rows:
+                    doc = {
+                        **row,
+                        "cheapest_price": round(
+                            row["cheapest_price"] * rng.uniform(0.8, 1.2), 2
+                        ),
+                        "timestamp": timestamp,
+                    }
+                    if args.origins > 1:
+                        doc["origin"] = origin
+                    yield {
+                        "_op_type": "create",
+                        "_index": "flight_prices",
+                        "_id": document_id(doc),
+                        "_source": doc,
+                    }
+
+    storage = ElasticsearchConnection()
+    storage.bootstrap(force=True)
+    n_docs = args.history_runs * sum(len(rows) for rows in snapshots.values())
+    start = time.perf_counter()
+    storage.stream_bulk(actions())
+    storage.es.indices.refresh(index="flight_prices")
+    elapsed = time.perf_counter() - start
+    print(f"history: {n_docs} docs in {elapsed:.1f}s ({n_docs / elapsed:,.0f} docs/s)")
+
+
+def run_pipeline(args):
+    """Runs every stage of one DAG run, returning (stage, seconds, rows) tuples."""
+    import data_pipeline
+    import email_utils
+    from artifact_store import row_count
+    from elasticsearch_utils import ElasticsearchConnection
+
+    ti = FakeTaskInstance(f"replay__{datetime.now().isoformat()}")
+    timings = []
+
+    def timed(name, task_id, func, rows_xcom=None):
+        """Times func as task_id; rows are counted in the (task_id, key) XCom."""
+        ti.task_id = task_id
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        rows = row_count(ti.xcoms.get(rows_xcom)) if rows_xcom else 0
+        timings.append((name, elapsed, rows))
+
+    def fetch():
+        data_pipeline.fetch_data(ti=ti)
+
+    def prepare():
+        if args.es_url:
+            data_pipeline.check_for_price_alerts(ti=ti)
+        else:
+            data_pipeline.prepare_price_alerts({}, ti=ti)
+
+    def alert():
+        if data_pipeline.should_send_email(ti=ti):
+            email_utils.prepare_digests(ti=ti)
+            email_utils.record_sent_alerts(ti=ti)
+
+    def index():
+        ElasticsearchConnection().index_data(ti=ti)
+
+    all_rows = ("prepare_price_alerts", "all_rows")
+    timed("fetch", "fetch_data", fetch, ("fetch_data", "fetched_data"))
+    timed("prepare", "prepare_price_alerts", prepare, all_rows)
+    if args.es_url:
+        timed("index", "index_data", index, all_rows)
+    timed(
+        "alert",
+        "generate_email_content",
+        alert,
+        ("prepare_price_alerts", "rows_to_notify"),
+    )
+    return timings
+
+
+def report(runs):
+    print(f"{'stage':<12}{'mean s':>10}{'p95 s':>10}{'rows':>10}{'rows/s':>12}")
+    for name in dict.fromkeys(name for timings in runs for name, _, _ in timings):
+        samples = [(s, rows) for t in runs for n, s, rows in t if n == name]
+        seconds = sorted(s for s, _ in samples)
+        rows = statistics.mean(rows for _, rows in samples)
+        mean = statistics.mean(seconds)
+        p95 = seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))]
+        throughput = f"{rows / mean:,.0f}" if mean else "-"
+        print(f"{name:<12}{mean:>10.3f}{p95:>10.3f}{rows:>10.0f}{throughput:>12}")
+
+
+def record(args):
+    sys.path.insert(0, DAG_FOLDER)
+    from api_client import build_search_params, fetch_origin, origin_label
+
+    os.makedirs(args.out, exist_ok=True)
+    for params in build_search_params():
+        path = os.path.join(args.out, f"{origin_label(params)}.json")
+        with open(path, "w") as f:
+            json.dump(fetch_origin(params), f)
+        print(f"recorded {path}")
+
+
+def serve(args):
+    url = start_stub(load_recordings(args.recordings), args.destinations, args.port)
+    print(f"serving {url}, set AIRFLOW_VAR_FLIGHT_API_URL to use it")
+    threading.Event().wait()
+
+
+def run(args):
+    recordings = load_recordings(args.recordings)
+    configure_environment(args, start_stub(recordings, args.destinations))
+    if args.es_url and args.history_runs:
+        synthesize_history(recordings, args)
+    runs = [run_pipeline(args) for _ in range(args.runs)]
+    print(
+        f"{args.runs} runs, {args.origins} origins x {args.destinations} destinations"
+    )
+    report(runs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="save real API responses")
+    record_parser.add_argument("--out", required=True)
+    record_parser.set_defaults(func=record)
+    for name, func in (("serve", serve), ("run", run)):
+        command = commands.add_parser(name)
+        command.add_argument("--recordings", help="directory written by record")
+        command.add_argument("--destinations", type=int, default=200)
+        command.set_defaults(func=func)
+    commands.choices["serve"].add_argument("--port", type=int, default=8099)
+    run_parser = commands.choices["run"]
+    run_parser.add_argument("--origins", type=int, default=1)
+    run_parser.add_argument("--history-runs", type=int, default=0)
+    run_parser.add_argument("--runs", type=int, default=3)
+    run_parser.add_argument(
+        "--es-url", help="local cluster, e.g. http://localhost:9200"
+    )
+    run_parser.add_argument("--es-password")
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
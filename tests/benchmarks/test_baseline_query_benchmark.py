@@ -0,0 +1,99 @@
+import os
+from unittest.mock import patch
+import pytest
+from elasticsearch import helpers
+from dags.flight_price_tracker import elasticsearch_utils
+from benchmark_utils import run_benchmark, synthetic_history
+
+# Set BENCHMARK_ES_DOCS=10000000 to compare at production history sizes.
+N_DOCS = int(os.getenv("BENCHMARK_ES_DOCS", "1000000"))
+RAW_INDEX = "benchmark_flight_prices"
+ROLLUP_INDEX = "benchmark_flight_prices_daily"
+
+
+@pytest.fixture(scope="module")
+def history(es_client):
+    if not es_client.indices.exists(index=RAW_INDEX):
+        es_client.indices.create(
+            index=RAW_INDEX,
+            body={
+                "mappings": {
+                    "properties": {
+                        "location": {
+                            "type": "text",
+                            "fields": {"keyword": {"type": "keyword"}},
+                        },
+                        "cheapest_price": {"type": "float"},
+                        "timestamp": {"type": "date"},
+                    }
+                }
+            },
+        )
+        for _ in helpers.parallel_bulk(
+            es_client, synthetic_history(N_DOCS, RAW_INDEX), chunk_size=5000
+        ):
+            pass
+        es_client.indices.refresh(index=RAW_INDEX)
+    yield
+
+
+@pytest.fixture
+def benchmark_indices(es_client, history):
+    # Benchmark indices are not covered by the bootstrapped templates.
+    es_client.options(ignore_status=400).indices.create(
+        index=ROLLUP_INDEX,
+        mappings={
+            "properties": {
+                **elasticsearch_utils.SUMMARY_PROPERTIES,
+                "day": {"type": "date"},
+            }
+        },
+    )
+    with patch.object(elasticsearch_utils, "INDEX", RAW_INDEX), patch.object(
+        elasticsearch_utils, "ROLLUP_INDEX", ROLLUP_INDEX
+    ):
+        yield
+
+
+def raw_window_statistics(es, days):
+    query = {
+        "size": 0,
+        "query": {"range": {"timestamp": {"gte": f"now-{days}d/d"}}},
+        "aggs": {
+            "by_location": {
+                "terms": {"field": "location.keyword", "size": 1000},
+                "aggs": {
+                    "price_stats": {"extended_stats": {"field": "cheapest_price"}}
+                },
+            }
+        },
+    }
+    return es.search(index=RAW_INDEX, body=query, request_cache=False)
+
+
+@pytest.mark.parametrize("days", [7, 30, 90])
+def test_raw_document_window(es_client, benchmark_indices, days):
+    run_benchmark(
+        f"raw aggregation window:{days} over {N_DOCS} docs",
+        1,
+        lambda: raw_window_statistics(es_client, days),
+        unit="queries",
+    )
+
+
+@pytest.mark.parametrize("mode", ["window:7", "window:30", "window:90", "ewm:7"])
+def test_rollup_baseline(es_connection, benchmark_indices, mode):
+    if not es_connection.es.count(index=ROLLUP_INDEX)["count"]:
+        run_benchmark(
+            "rebuild daily rollups",
+            N_DOCS,
+            es_connection.rebuild_daily_rollups,
+            unit="docs",
+        )
+    statistics = run_benchmark(
+        f"rollup baseline {mode}",
+        1,
+        lambda: es_connection.get_baseline_statistics(mode),
+        unit="queries",
+    )
+    assert statistics
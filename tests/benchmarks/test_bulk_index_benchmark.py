@@ -0,0 +1,55 @@
+import os
+import pytest
+from elasticsearch import helpers
+from dags.flight_price_tracker.elasticsearch_utils import document_id
+from benchmark_utils import run_benchmark, synthetic_history
+
+N_DOCS = int(os.getenv("BENCHMARK_BULK_DOCS", "200000"))
+BULK_INDEX = "benchmark_flight_prices_bulk"
+
+
+@pytest.fixture
+def bulk_index(es_client):
+    es_client.options(ignore_status=404).indices.delete(index=BULK_INDEX)
+    yield BULK_INDEX
+    es_client.options(ignore_status=404).indices.delete(index=BULK_INDEX)
+
+
+def docs():
+    for action in synthetic_history(N_DOCS, BULK_INDEX):
+        yield action["_source"]
+
+
+def test_single_bulk_without_ids(es_client, bulk_index):
+    def index():
+        actions = [{"_index": bulk_index, "_source": doc} for doc in docs()]
+        helpers.bulk(es_client, actions)
+
+    run_benchmark("single helpers.bulk, no ids", N_DOCS, index, unit="docs")
+
+
+@pytest.mark.parametrize(
+    "thread_count,chunk_size", [(1, 500), (4, 500), (4, 2000), (8, 1000)]
+)
+def test_stream_bulk(es_connection, bulk_index, thread_count, chunk_size):
+    def index():
+        actions = (
+            {
+                "_op_type": "create",
+                "_index": bulk_index,
+                "_id": document_id(doc),
+                "_source": doc,
+            }
+            for doc in docs()
+        )
+        es_connection.stream_bulk(
+            actions, chunk_size=chunk_size, thread_count=thread_count
+        )
+
+    # The traced second run replays every document, measuring the retry path.
+    run_benchmark(
+        f"stream_bulk threads={thread_count} chunk={chunk_size}",
+        N_DOCS,
+        index,
+        unit="docs",
+    )
@@ -0,0 +1,38 @@
+import os
+from unittest.mock import patch
+import pytest
+from dags.flight_price_tracker.api_client import fetch_origin, fetch_origins
+from dags.flight_price_tracker.rate_limiter import RequestScheduler
+from benchmark_utils import run_benchmark
+
+N_ORIGINS = int(os.getenv("BENCHMARK_ORIGINS", "48"))
+SEARCH_PARAMS = [{"fromEntityId": f"origin-{i}"} for i in range(N_ORIGINS)]
+
+
+@pytest.fixture(autouse=True)
+def unthrottled_scheduler():
+    """Measures the client itself rather than the configured plan rate."""
+    scheduler = RequestScheduler(rate=1e9, capacity=10**9)
+    with patch("dags.flight_price_tracker.api_client.scheduler", scheduler):
+        yield
+
+
+def test_fetch_serial(stub_api_url):
+    results = run_benchmark(
+        "fetch serial",
+        N_ORIGINS,
+        lambda: [fetch_origin(params, url=stub_api_url) for params in SEARCH_PARAMS],
+        unit="origins",
+    )
+    assert len(results) == N_ORIGINS
+
+
+@pytest.mark.parametrize("concurrency", [4, 16])
+def test_fetch_concurrent(stub_api_url, concurrency):
+    results = run_benchmark(
+        f"fetch concurrent x{concurrency}",
+        N_ORIGINS,
+        lambda: fetch_origins(SEARCH_PARAMS, url=stub_api_url, concurrency=concurrency),
+        unit="origins",
+    )
+    assert not [r for _, r in results if isinstance(r, Exception)]
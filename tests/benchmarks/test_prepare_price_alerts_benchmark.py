@@ -0,0 +1,35 @@
+import os
+from unittest.mock import MagicMock
+import pytest
+from dags.flight_price_tracker.data_pipeline import prepare_price_alerts
+from dags.flight_price_tracker.artifact_store import to_table
+from benchmark_utils import run_benchmark, synthetic_results, location_statistics
+
+# Set BENCHMARK_QUOTES=1000,10000,100000,1000000 for the full range.
+SIZES = [int(n) for n in os.getenv("BENCHMARK_QUOTES", "1000,10000,100000").split(",")]
+
+
+@pytest.mark.parametrize("n_quotes", SIZES)
+def test_prepare_price_alerts_records(n_quotes):
+    data = synthetic_results(n_quotes)
+    mock_ti = MagicMock()
+    mock_ti.xcom_pull.return_value = data
+    run_benchmark(
+        "prepare_price_alerts (records)",
+        n_quotes,
+        lambda: prepare_price_alerts(location_statistics(), ti=mock_ti),
+    )
+    assert len(mock_ti.xcom_push.call_args_list[0].kwargs["value"]) == n_quotes
+
+
+@pytest.mark.parametrize("n_quotes", SIZES)
+def test_prepare_price_alerts_arrow(n_quotes):
+    data = to_table(synthetic_results(n_quotes))
+    mock_ti = MagicMock()
+    mock_ti.xcom_pull.return_value = data
+    run_benchmark(
+        "prepare_price_alerts (arrow)",
+        n_quotes,
+        lambda: prepare_price_alerts(location_statistics(), ti=mock_ti),
+    )
+    assert len(mock_ti.xcom_push.call_args_list[0].kwargs["value"]) == n_quotes
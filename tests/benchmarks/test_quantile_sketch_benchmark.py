@@ -0,0 +1,79 @@
+import os
+import time
+import numpy as np
+import pytest
+from dags.flight_price_tracker.quantile_sketch import TDigest
+from benchmark_utils import run_benchmark
+
+# Prices per location, e.g. 30 min quotes over a year from several origins.
+SIZES = [
+    int(n)
+    for n in os.getenv("BENCHMARK_SKETCH_PRICES", "10000,100000,1000000").split(",")
+]
+QUANTILES = (0.1, 0.25, 0.5)
+RUNS_PER_MONTH = 1440
+
+
+def skewed_prices(n, seed=0):
+    """Lognormal prices with occasional fare spikes, like real destination quotes."""
+    rng = np.random.default_rng(seed)
+    prices = rng.lognormal(5, 0.5, n)
+    spikes = rng.random(n) < 0.02
+    prices[spikes] *= rng.uniform(2, 5, spikes.sum())
+    return prices
+
+
+@pytest.mark.parametrize("n_prices", SIZES)
+def test_sketch_accuracy_and_latency(n_prices):
+    prices = skewed_prices(n_prices)
+    batches = np.array_split(prices, max(1, n_prices // 100))
+
+    def incremental():
+        digest = TDigest()
+        for batch in batches:
+            digest.update(batch)
+        return digest
+
+    digest = run_benchmark("tdigest incremental updates", n_prices, incremental)
+    months = [
+        TDigest().update(part)
+        for part in np.array_split(prices, max(1, n_prices // RUNS_PER_MONTH))
+    ]
+    merged = run_benchmark(
+        "tdigest merge of monthly sketches",
+        len(months),
+        lambda: sum_digests(months),
+        unit="sketches",
+    )
+
+    start = time.perf_counter()
+    exact = np.percentile(prices, [q * 100 for q in QUANTILES])
+    exact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    approximate = [merged.quantile(q) for q in QUANTILES]
+    sketch_seconds = time.perf_counter() - start
+
+    ordered = np.sort(prices)
+    for name, sketch in (("incremental", digest), ("merged", merged)):
+        errors = [
+            abs(np.searchsorted(ordered, sketch.quantile(q)) / n_prices - q)
+            for q in QUANTILES
+        ]
+        print(
+            f"[benchmark] {name} rank error "
+            + ", ".join(f"p{q * 100:.0f} {e:.5f}" for q, e in zip(QUANTILES, errors))
+        )
+        assert max(errors) < 0.005
+    print(
+        f"[benchmark] quantiles: exact {exact_seconds * 1000:.2f} ms over "
+        f"{prices.nbytes / 2**20:.1f} MiB, sketch {sketch_seconds * 1000:.3f} ms over "
+        f"{len(merged.to_base64())} bytes; relative error "
+        + ", ".join(f"{abs(a - e) / e:.4f}" for a, e in zip(approximate, exact))
+    )
+
+
+def sum_digests(digests):
+    merged = TDigest()
+    for digest in digests:
+        merged.merge(digest)
+    return merged
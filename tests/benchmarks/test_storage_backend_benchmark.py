@@ -0,0 +1,66 @@
+import os
+from unittest.mock import patch
+import pandas as pd
+import pytest
+from dags.flight_price_tracker.parquet_store import ParquetStore
+from benchmark_utils import run_benchmark, synthetic_history
+from test_baseline_query_benchmark import (  # noqa: F401
+    RAW_INDEX,
+    history,
+    raw_window_statistics,
+)
+
+# Same history as the Elasticsearch baseline benchmark, for a like-for-like run.
+N_DOCS = int(os.getenv("BENCHMARK_ES_DOCS", "1000000"))
+BATCH_SIZE = 50000
+MODES = ["all", "window:7", "window:30", "window:90", "ewm:7", "quantile:10"]
+
+
+@pytest.fixture(scope="module")
+def parquet_store(tmp_path_factory):
+    store = ParquetStore(str(tmp_path_factory.mktemp("prices")))
+    batch = []
+
+    def write():
+        for action in synthetic_history(N_DOCS, RAW_INDEX):
+            batch.append(action["_source"])
+            if len(batch) == BATCH_SIZE:
+                store.write(pd.DataFrame(batch))
+                batch.clear()
+        store.write(pd.DataFrame(batch))
+        batch.clear()
+
+    run_benchmark("parquet write", N_DOCS, write, unit="docs")
+    return store
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_parquet_baseline(parquet_store, mode):
+    statistics = run_benchmark(
+        f"parquet baseline {mode} over {N_DOCS} docs",
+        1,
+        lambda: parquet_store.get_baseline_statistics(mode, ("location",)),
+        unit="queries",
+    )
+    assert statistics
+
+
+def test_elasticsearch_baseline(es_connection, history):  # noqa: F811
+    with patch("dags.flight_price_tracker.elasticsearch_utils.INDEX", RAW_INDEX):
+        statistics = run_benchmark(
+            f"elasticsearch baseline all over {N_DOCS} docs",
+            1,
+            lambda: es_connection.get_baseline_statistics("all", ("location",)),
+            unit="queries",
+        )
+    assert statistics
+
+
+@pytest.mark.parametrize("days", [7, 30, 90])
+def test_elasticsearch_raw_window(es_client, history, days):  # noqa: F811
+    run_benchmark(
+        f"elasticsearch raw window:{days} over {N_DOCS} docs",
+        1,
+        lambda: raw_window_statistics(es_client, days),
+        unit="queries",
+    )
@@ -0,0 +1,62 @@
+import os
+import random
+import pytest
+from dags.flight_price_tracker.data_pipeline import (
+    extract_flight_prices,
+    join_statistics,
+)
+from dags.flight_price_tracker.subscriptions import (
+    SubscriptionIndex,
+    match_subscriptions,
+    normalize,
+)
+from benchmark_utils import run_benchmark, synthetic_results, location_statistics
+
+N_SUBSCRIPTIONS = int(os.getenv("BENCHMARK_SUBSCRIPTIONS", "100000"))
+SIZES = [int(n) for n in os.getenv("BENCHMARK_QUOTES", "1000,10000").split(",")]
+
+
+def synthetic_subscriptions(n, n_locations=500, seed=0):
+    """Mostly single-location subscriptions, some per sky_id, a few for everywhere."""
+    rng = random.Random(seed)
+    subscriptions = []
+    for i in range(n):
+        subscription = {"id": str(i), "email": f"user{i}@example.com"}
+        kind = rng.random()
+        if kind < 0.9:
+            location = f"Location_{rng.randrange(n_locations)}"
+            subscription["locations"] = [location]
+        elif kind < 0.999:
+            subscription["sky_ids"] = [f"L{rng.randrange(n_locations)}"]
+        subscription["sensitivity"] = rng.uniform(0, 2)
+        if rng.random() < 0.3:
+            subscription["max_price"] = rng.uniform(20, 400)
+        subscriptions.append(normalize(subscription))
+    return subscriptions
+
+
+@pytest.fixture(scope="module")
+def subscription_index():
+    subscriptions = synthetic_subscriptions(N_SUBSCRIPTIONS)
+    return run_benchmark(
+        "subscription index build",
+        N_SUBSCRIPTIONS,
+        lambda: SubscriptionIndex(subscriptions),
+        unit="subscriptions",
+    )
+
+
+@pytest.mark.parametrize("n_quotes", SIZES)
+def test_match_subscriptions(subscription_index, n_quotes):
+    quotes = join_statistics(
+        extract_flight_prices(synthetic_results(n_quotes)),
+        location_statistics(),
+        ("location",),
+    )
+    alerts = run_benchmark(
+        f"match_subscriptions ({N_SUBSCRIPTIONS} subscriptions)",
+        n_quotes,
+        lambda: match_subscriptions(quotes, subscription_index),
+    )
+    print(f"[benchmark] {len(alerts)} alerts")
+    assert len(alerts) > 0
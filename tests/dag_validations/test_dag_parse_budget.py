@@ -0,0 +1,46 @@
+import sys
+import json
+import subprocess
+import pytest
+
+DAG_FILES = [
+    "dags/flight_price_tracker/flight_price_tracker_dag.py",
+    "dags/flight_price_tracker/flight_price_retention_dag.py",
+]
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "elasticsearch", "aiohttp"]
+# Generous for CI; parsing took ~0.3 s and ~2 MB against ~6 s and ~46 MB before
+# task modules were imported lazily.
+PARSE_SECONDS = 2.0
+PARSE_PEAK_BYTES = 16 * 1024 * 1024
+
+# Airflow itself is imported first, as it is already loaded in the scheduler.
+PARSE_SCRIPT = """
+import sys, json, time, runpy, tracemalloc
+from airflow import DAG
+from airflow.operators.python import PythonOperator, ShortCircuitOperator
+from airflow.operators.email import EmailOperator
+
+tracemalloc.start()
+start = time.perf_counter()
+runpy.run_path(sys.argv[1])
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "peak_bytes": tracemalloc.get_traced_memory()[1],
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+@pytest.mark.parametrize("dag_file", DAG_FILES)
+def test_dag_parse_stays_within_budget(dag_file):
+    # A fresh interpreter, so modules imported by other tests do not hide imports.
+    output = subprocess.run(
+        [sys.executable, "-c", PARSE_SCRIPT, dag_file],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    parse = json.loads(output.splitlines()[-1])
+    assert not set(HEAVY_MODULES) & set(parse["modules"])
+    assert parse["seconds"] < PARSE_SECONDS
+    assert parse["peak_bytes"] < PARSE_PEAK_BYTES
@@ -1,12 +1,20 @@
+import os
 from airflow.models import DagBag
 from dags.flight_price_tracker.flight_price_tracker_dag import flight_price_dag
 
 
 def test_dag_loading():
-    dag_bag = DagBag(dag_folder="dags/flight_price_tracker")
+    dag_bag = DagBag(dag_folder="dags/flight_price_tracker", include_examples=False)
     assert len(dag_bag.import_errors) == 0, f"Import errors: {dag_bag.import_errors}"
     dag = dag_bag.get_dag("flight_price_tracker")
     assert dag is not None
+    assert dag_bag.get_dag("flight_price_retention") is not None
+
+
+def test_only_dag_files_are_parsed():
+    dag_bag = DagBag(dag_folder="dags/flight_price_tracker", include_examples=False)
+    parsed = {os.path.basename(path) for path in dag_bag.file_last_changed}
+    assert parsed == {"flight_price_tracker_dag.py", "flight_price_retention_dag.py"}
 
 
 def test_task_cirularity():
@@ -25,3 +33,20 @@ def test_task_cirularity():
     ]
     for task in downstream_tasks:
         assert task not in fetch_data_task.downstream_task_ids
+
+
+def test_alerting_does_not_wait_for_indexing():
+    index_data_task = flight_price_dag.get_task("index_data")
+    should_continue_task = flight_price_dag.get_task("should_continue")
+    assert "prepare_price_alerts" in index_data_task.upstream_task_ids
+    assert "prepare_price_alerts" in should_continue_task.upstream_task_ids
+    assert "index_data" not in should_continue_task.get_flat_relative_ids(
+        upstream=True
+    )
+    assert not index_data_task.downstream_task_ids
+
+
+def test_alerts_are_recorded_after_sending():
+    record_alerts = flight_price_dag.get_task("record_alerts")
+    assert record_alerts.upstream_task_ids == {"send_email"}
+    assert record_alerts.trigger_rule == "all_success"
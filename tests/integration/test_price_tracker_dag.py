@@ -177,7 +177,7 @@ def test_dag_failed_to_fetch_data():
 
 def test_dag_failed_to_index():
     with patch(
-        "elasticsearch.helpers.bulk",
+        "elasticsearch.helpers.parallel_bulk",
         side_effect=ConnectionError("Simulated bulk failure"),
     ):
         dag.test()
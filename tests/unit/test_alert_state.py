@@ -0,0 +1,65 @@
+from unittest.mock import MagicMock, patch
+import pandas as pd
+from dags.flight_price_tracker import email_utils
+from dags.flight_price_tracker.alert_state import AlertStateStore
+
+HOUR = 3600
+
+
+def alerts(*prices):
+    return pd.DataFrame(
+        {
+            "sky_id": ["DK", "BE"][: len(prices)],
+            "location": ["Denmark", "Belgium"][: len(prices)],
+            "cheapest_price": list(prices),
+            "email": "a@example.com",
+        }
+    )
+
+
+def test_suppresses_unchanged_deals_within_cooldown(tmp_path):
+    store = AlertStateStore(str(tmp_path / "state.sqlite"), cooldown_hours=6)
+    store.record(alerts(100.0, 80.0).to_dict(orient="records"), now=0)
+    # Same price half an hour later: both suppressed.
+    assert store.suppress(alerts(100.0, 80.0), now=HOUR / 2).empty
+    # Cheaper Denmark is alerted again; after the cooldown everything is.
+    assert store.suppress(alerts(99.0, 80.0), now=HOUR)["sky_id"].tolist() == ["DK"]
+    assert len(store.suppress(alerts(100.0, 80.0), now=7 * HOUR)) == 2
+
+
+def test_min_price_drop_and_recipients(tmp_path):
+    store = AlertStateStore(
+        str(tmp_path / "state.sqlite"), cooldown_hours=6, min_drop=10
+    )
+    store.record(alerts(100.0).to_dict(orient="records"), now=0)
+    assert store.suppress(alerts(95.0), now=HOUR).empty
+    assert len(store.suppress(alerts(85.0), now=HOUR)) == 1
+    # Another recipient of the same destination is not suppressed.
+    assert len(store.suppress(alerts(100.0).assign(email="b@example.com"), now=HOUR))
+
+
+def test_expired_entries_are_deleted(tmp_path):
+    store = AlertStateStore(str(tmp_path / "state.sqlite"), cooldown_hours=1)
+    store.record(alerts(100.0).to_dict(orient="records"), now=0)
+    store.record(alerts(100.0, 80.0).iloc[1:].to_dict(orient="records"), now=2 * HOUR)
+    assert store.last_alerts([("a@example.com", "", "DK")]) == [None]
+
+
+def test_disabled_store_keeps_everything(tmp_path):
+    store = AlertStateStore(str(tmp_path / "state.sqlite"), cooldown_hours=0)
+    store.record(alerts(100.0).to_dict(orient="records"), now=0)
+    assert len(store.suppress(alerts(100.0), now=1)) == 1
+    assert not list(tmp_path.iterdir())
+
+
+def test_alerts_are_recorded_only_once_sent(tmp_path):
+    store = AlertStateStore(str(tmp_path / "state.sqlite"), cooldown_hours=6)
+    ti = MagicMock()
+    ti.xcom_pull.return_value = (
+        alerts(100.0).assign(average_price=120.0).to_dict(orient="records")
+    )
+    with patch.object(email_utils, "alert_state", store):
+        email_utils.prepare_digests(ti=ti)
+        assert store.last_alerts([("a@example.com", "", "DK")]) == [None]
+        email_utils.record_sent_alerts(ti=ti)
+    assert store.last_alerts([("a@example.com", "", "DK")])[0][0] == 100.0
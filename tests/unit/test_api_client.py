@@ -0,0 +1,62 @@
+from unittest.mock import patch, MagicMock
+import pytest
+from dags.flight_price_tracker.api_client import build_search_params, origin_label
+from dags.flight_price_tracker.data_pipeline import fetch_data
+
+WARSAW = "eyJlIjoiMjc1NDc0NTQiLCJzIjoiV0FSUyIsImgiOiIyNzU0NzQ1NCIsInQiOiJDSVRZIn0="
+
+
+def test_build_search_params_with_date_windows():
+    origins = [{"fromEntityId": "A"}, {"fromEntityId": "B"}]
+    windows = [{"departDate": "2025-05-01", "returnDate": "2025-05-08"}]
+    assert build_search_params(origins, windows) == [
+        {"fromEntityId": "A", "departDate": "2025-05-01", "returnDate": "2025-05-08"},
+        {"fromEntityId": "B", "departDate": "2025-05-01", "returnDate": "2025-05-08"},
+    ]
+    assert build_search_params(origins, []) == origins
+
+
+def test_origin_label():
+    assert origin_label({"fromEntityId": WARSAW}) == "WARS"
+    assert origin_label({"fromEntityId": "not-base64"}) == "not-base64"
+
+
+def test_fetch_data_multiple_origins():
+    search_params = [
+        {"fromEntityId": WARSAW},
+        {"fromEntityId": "KRK"},
+        {"fromEntityId": "GDN"},
+    ]
+    results = [
+        (search_params[0], [{"skyId": "DK"}]),
+        (search_params[1], [{"skyId": "BE"}, {"skyId": "IT"}]),
+        (search_params[2], Exception("Simulated failure")),
+    ]
+    mock_ti = MagicMock()
+    with patch(
+        "dags.flight_price_tracker.data_pipeline.build_search_params",
+        return_value=search_params,
+    ), patch(
+        "dags.flight_price_tracker.data_pipeline.fetch_origins", return_value=results
+    ):
+        fetch_data(ti=mock_ti)
+    pushed = mock_ti.xcom_push.call_args.kwargs["value"]
+    assert [(row["skyId"], row["origin"]) for row in pushed] == [
+        ("DK", "WARS"),
+        ("BE", "KRK"),
+        ("IT", "KRK"),
+    ]
+    assert len({row["timestamp"] for row in pushed}) == 1
+
+
+def test_fetch_data_all_origins_failed():
+    search_params = [{"fromEntityId": "KRK"}, {"fromEntityId": "GDN"}]
+    results = [(params, Exception("Simulated failure")) for params in search_params]
+    with patch(
+        "dags.flight_price_tracker.data_pipeline.build_search_params",
+        return_value=search_params,
+    ), patch(
+        "dags.flight_price_tracker.data_pipeline.fetch_origins", return_value=results
+    ):
+        with pytest.raises(Exception):
+            fetch_data(ti=MagicMock())
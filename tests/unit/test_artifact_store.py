@@ -0,0 +1,171 @@
+import json
+from unittest.mock import patch, MagicMock
+import pytest
+import pyarrow as pa
+from dags.flight_price_tracker.artifact_store import (
+    LocalArtifactStore,
+    push_rows,
+    pull_rows,
+    pull_table,
+    row_count,
+)
+from dags.flight_price_tracker.data_pipeline import (
+    fetch_data,
+    prepare_price_alerts,
+    should_send_email,
+)
+
+
+def load_json(file_path):
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+class FakeTaskInstance:
+    """Keeps pushed XComs in memory so pulls see what earlier tasks pushed."""
+
+    def __init__(self, task_id="fetch_data"):
+        self.run_id = "manual__2025-03-16T19:25:46+00:00"
+        self.task_id = task_id
+        self.xcoms = {}
+
+    def xcom_push(self, key, value):
+        self.xcoms[(self.task_id, key)] = value
+
+    def xcom_pull(self, task_ids, key):
+        return self.xcoms.get((task_ids, key))
+
+
+class MappedTaskInstance:
+    """Keeps XComs per map index; pulls from mapped tasks return a lazy sequence."""
+
+    def __init__(self, xcoms, task_id, map_index=-1):
+        self.run_id = "manual__2025-03-16T19:25:46+00:00"
+        self.xcoms = xcoms
+        self.task_id = task_id
+        self.map_index = map_index
+
+    def xcom_push(self, key, value):
+        self.xcoms[(self.task_id, key, self.map_index)] = value
+
+    def xcom_pull(self, task_ids, key, map_indexes=None):
+        if map_indexes is not None:
+            return self.xcoms.get((task_ids, key, map_indexes))
+        values = [
+            v
+            for (t, k, _), v in sorted(self.xcoms.items())
+            if (t, k) == (task_ids, key)
+        ]
+        return iter(values)
+
+
+@pytest.fixture
+def local_store(tmp_path):
+    store = LocalArtifactStore(root=str(tmp_path))
+    # The pipeline modules import artifact_store through the dag folder on sys.path.
+    with patch(
+        "dags.flight_price_tracker.artifact_store.get_artifact_store",
+        return_value=store,
+    ), patch("artifact_store.get_artifact_store", return_value=store):
+        yield store
+
+
+def test_push_rows_writes_reference(local_store):
+    ti = FakeTaskInstance()
+    rows = [{"sky_id": "DK", "price": 34.0}, {"sky_id": "BE", "nested": {"a": 1}}]
+    push_rows(ti, "fetched_data", rows)
+    reference = ti.xcoms[("fetch_data", "fetched_data")]
+    assert reference["rows"] == 2 and reference["artifact"].endswith(".arrow")
+    assert row_count(reference) == 2
+    assert list(pull_rows(ti, "fetch_data", "fetched_data")) == [
+        {"sky_id": "DK", "price": 34.0, "nested": None},
+        {"sky_id": "BE", "price": None, "nested": {"a": 1}},
+    ]
+
+
+def test_push_empty_rows(local_store):
+    ti = FakeTaskInstance()
+    push_rows(ti, "rows_to_notify", [])
+    assert row_count(ti.xcoms[("fetch_data", "rows_to_notify")]) == 0
+    assert list(pull_rows(ti, "fetch_data", "rows_to_notify")) == []
+
+
+def test_push_rows_without_store_uses_xcom():
+    ti = MagicMock()
+    push_rows(ti, "all_rows", [{"sky_id": "DK"}])
+    ti.xcom_push.assert_called_once_with(key="all_rows", value=[{"sky_id": "DK"}])
+
+
+def test_prepare_price_alerts_from_artifacts(local_store):
+    data = load_json("tests/unit/test_data/test_prepare_price_alerts_input.json")
+    expected = load_json("tests/unit/test_data/test_prepare_price_alerts_expected.json")
+    location_price_statistics = {
+        "Denmark": (90, 10),
+        "Belgium": (100, 10),
+        "Austria": (44, 0),
+    }
+    ti = FakeTaskInstance()
+    push_rows(ti, "fetched_data", data["data"]["everywhereDestination"]["results"])
+    ti.task_id = "prepare_price_alerts"
+    prepare_price_alerts(location_price_statistics, ti=ti)
+
+    expected_rows = {call["key"]: call["value"] for call in expected["expected_calls"]}
+    assert (
+        list(pull_rows(ti, "prepare_price_alerts", "all_rows"))
+        == expected_rows["all_rows"]
+    )
+    assert (
+        list(pull_rows(ti, "prepare_price_alerts", "rows_to_notify"))
+        == expected_rows["rows_to_notify"]
+    )
+
+
+def test_fetched_fields_that_are_never_read_may_change_type(local_store):
+    data = load_json("tests/unit/test_data/test_prepare_price_alerts_input.json")
+    expected = load_json("tests/unit/test_data/test_prepare_price_alerts_expected.json")
+    results = data["data"]["everywhereDestination"]["results"]
+    results[0]["content"]["image"] = {"url": "https://example.com/a.jpg"}
+    results[1]["content"]["image"] = "https://example.com/b.jpg"
+    ti = FakeTaskInstance()
+    with patch(
+        "dags.flight_price_tracker.data_pipeline.build_search_params",
+        return_value=[{"fromEntityId": "eyJzIjoiV0FSUyJ9"}],
+    ), patch(
+        "dags.flight_price_tracker.data_pipeline.fetch_origin", return_value=results
+    ), patch(
+        "dags.flight_price_tracker.data_pipeline.STATISTICS_GROUP_BY", ("location",)
+    ):
+        fetch_data(ti=ti)
+    ti.task_id = "prepare_price_alerts"
+    prepare_price_alerts({"Denmark": (90, 10), "Belgium": (100, 10)}, ti=ti)
+
+    expected_rows = {call["key"]: call["value"] for call in expected["expected_calls"]}
+    all_rows = list(pull_rows(ti, "prepare_price_alerts", "all_rows"))
+    assert [row["sky_id"] for row in all_rows] == [
+        row["sky_id"] for row in expected_rows["all_rows"]
+    ]
+
+
+def test_shards_pull_their_own_rows_and_reduce_pulls_all(local_store):
+    xcoms = {}
+    for map_index, location in enumerate(["Denmark", "Belgium"]):
+        shard = MappedTaskInstance(xcoms, "prepare_price_alerts", map_index)
+        push_rows(shard, "rows_to_notify", [{"location": location}])
+        shard.task_id = "index_data"
+        assert pull_table(shard, "prepare_price_alerts", "rows_to_notify")[
+            "location"
+        ].to_pylist() == [location]
+    reduce = MappedTaskInstance(xcoms, "generate_email_content")
+    assert [
+        row["location"]
+        for row in pull_rows(reduce, "prepare_price_alerts", "rows_to_notify")
+    ] == ["Denmark", "Belgium"]
+    assert should_send_email(ti=reduce)
+
+
+def test_purge_removes_old_runs(tmp_path):
+    store = LocalArtifactStore(root=str(tmp_path))
+    store.write("old_run", "rows", pa.table({"a": [1]}))
+    with patch("time.time", return_value=10**12):
+        store.purge(retention_days=1)
+    assert not list(tmp_path.iterdir())
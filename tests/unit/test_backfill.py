@@ -0,0 +1,90 @@
+import os
+import json
+import gzip
+from unittest.mock import MagicMock
+import pytest
+from dags.flight_price_tracker import backfill
+from dags.flight_price_tracker.data_pipeline import extract_flight_prices
+from dags.flight_price_tracker.elasticsearch_utils import document_id
+from dags.flight_price_tracker.parquet_store import ParquetStore
+
+with open("tests/unit/test_data/test_prepare_price_alerts_input.json", "r") as f:
+    PAYLOAD = json.load(f)
+RESULTS = PAYLOAD["data"]["everywhereDestination"]["results"]
+N_ROWS = len(extract_flight_prices(json.loads(json.dumps(RESULTS))))
+
+
+@pytest.fixture
+def archive(tmp_path):
+    directory = tmp_path / "archive"
+    directory.mkdir()
+    with gzip.open(directory / "2025-01-01.ndjson.gz", "wt") as f:
+        for hour in (8, 9):
+            envelope = {
+                "timestamp": f"2025-01-01T{hour:02d}:00:00",
+                "params": {"fromEntityId": "eyJzIjoiV0FSUyJ9"},
+                "payload": PAYLOAD,
+            }
+            f.write(json.dumps(envelope) + "\n")
+    with open(directory / "2025-01-02.json", "w") as f:
+        json.dump({"stored_at": 1735812000, "origin": "KRK", "results": RESULTS}, f)
+    (directory / "notes.txt").write_text("not an archive")
+    return str(directory)
+
+
+def test_transform_file_tags_fetch_time_and_origin(archive):
+    path, rows = backfill.transform_file(os.path.join(archive, "2025-01-01.ndjson.gz"))
+    rows = rows.to_pandas()
+    assert len(rows) == 2 * N_ROWS
+    assert set(rows["timestamp"]) == {
+        "2025-01-01T08:00:00.000000",
+        "2025-01-01T09:00:00.000000",
+    }
+    assert set(rows["origin"]) == {"WARS"}
+
+
+def test_bare_responses_take_the_file_time(tmp_path):
+    path = tmp_path / "response.json"
+    path.write_text(json.dumps(PAYLOAD))
+    os.utime(path, (1735732800, 1735732800))
+    _, rows = backfill.transform_file(str(path))
+    assert set(rows["timestamp"].to_pylist()) == {
+        backfill.datetime.fromtimestamp(1735732800).strftime(backfill.TIMESTAMP_FORMAT)
+    }
+    assert "origin" not in rows.column_names
+
+
+def test_bare_responses_of_one_file_keep_distinct_quotes(tmp_path):
+    path = tmp_path / "responses.ndjson"
+    path.write_text("".join(json.dumps(PAYLOAD) + "\n" for _ in range(3)))
+    _, rows = backfill.transform_file(str(path))
+    rows = rows.to_pylist()
+    assert len(rows) == 3 * N_ROWS
+    assert len({row["timestamp"] for row in rows}) == 3
+    assert len({document_id(row) for row in rows}) == 3 * N_ROWS
+
+
+def test_backfill_loads_archive_and_resumes(archive, tmp_path):
+    store = ParquetStore(str(tmp_path / "prices"))
+    checkpoint = str(tmp_path / "checkpoint.json")
+    assert backfill.run_backfill(archive, store, 2, checkpoint) == 3 * N_ROWS
+    assert store._scan(["sky_id"]).num_rows == 3 * N_ROWS
+    assert sorted(os.listdir(store.root)) == ["month=2025-01"]
+    storage = MagicMock()
+    # Loaded files are skipped, statistics are still seeded.
+    assert backfill.run_backfill(archive, storage, 2, checkpoint) == 0
+    storage.write.assert_not_called()
+    storage.seed_statistics.assert_called_once()
+
+
+def test_interrupted_file_is_reloaded_without_duplicates(archive, tmp_path):
+    store = ParquetStore(str(tmp_path / "prices"))
+    checkpoint = str(tmp_path / "checkpoint.json")
+    backfill.run_backfill(archive, store, 1, checkpoint)
+    with open(checkpoint, "r") as f:
+        loaded = json.load(f)
+    loaded.pop(os.path.join(archive, "2025-01-02.json"))
+    with open(checkpoint, "w") as f:
+        json.dump(loaded, f)
+    assert backfill.run_backfill(archive, store, 1, checkpoint) == N_ROWS
+    assert store._scan(["sky_id"]).num_rows == 3 * N_ROWS
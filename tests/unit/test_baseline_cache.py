@@ -0,0 +1,67 @@
+import threading
+from unittest.mock import patch, MagicMock
+from dags.flight_price_tracker.baseline_cache import (
+    BaselineCache,
+    LocalBaselineStore,
+)
+
+PARTS = ("flight_prices", "all", "aggregation", ("location",), 30)
+STATISTICS = {"Denmark": (35.0, 5.0), ("WARS", "Belgium"): (40.0, 4.0)}
+
+
+def make_cache(tmp_path, **kwargs):
+    return BaselineCache(store=LocalBaselineStore(str(tmp_path)), ttl=60, **kwargs)
+
+
+def test_reuses_baseline_until_it_expires(tmp_path):
+    cache = make_cache(tmp_path)
+    compute = MagicMock(return_value=STATISTICS)
+    assert cache.get_or_compute(PARTS, compute) == STATISTICS
+    assert cache.get_or_compute(PARTS, compute) == STATISTICS
+    assert compute.call_count == 1
+    with patch("time.time", return_value=10**12):
+        cache.get_or_compute(PARTS, compute)
+    assert compute.call_count == 2
+
+
+def test_version_bump_invalidates_baselines(tmp_path):
+    cache = make_cache(tmp_path)
+    compute = MagicMock(return_value=STATISTICS)
+    cache.get_or_compute(PARTS, compute)
+    # Another process indexing prices invalidates this process's entry too.
+    make_cache(tmp_path).bump_version()
+    cache.get_or_compute(PARTS, compute)
+    assert compute.call_count == 2
+
+
+def test_concurrent_runs_compute_baseline_once(tmp_path):
+    compute = MagicMock(return_value=STATISTICS)
+    results = []
+
+    def run():
+        results.append(make_cache(tmp_path).get_or_compute(PARTS, compute))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert compute.call_count == 1
+    assert results == [STATISTICS] * 4
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    for mode in ("all", "window:30", "ewm:7"):
+        cache.get_or_compute((mode,), lambda: STATISTICS)
+    assert len(cache._entries) == 2
+
+
+def test_disabled_cache_always_computes(tmp_path):
+    cache = BaselineCache(store=LocalBaselineStore(str(tmp_path)), ttl=0)
+    compute = MagicMock(return_value=STATISTICS)
+    cache.get_or_compute(PARTS, compute)
+    cache.get_or_compute(PARTS, compute)
+    cache.bump_version()
+    assert compute.call_count == 2
+    assert not list(tmp_path.iterdir())
@@ -1,7 +1,17 @@
 import json
+import random
 from unittest.mock import patch, MagicMock, call
+import numpy as np
+import pandas as pd
 import pytest
-from dags.flight_price_tracker.data_pipeline import fetch_data, prepare_price_alerts
+from dags.flight_price_tracker.data_pipeline import (
+    fetch_data,
+    prepare_price_alerts,
+    find_price_drops,
+    extract_flight_prices,
+    plan_shards,
+)
+from dags.flight_price_tracker.artifact_store import to_table
 
 
 def load_json(file_path):
@@ -91,3 +101,141 @@ def test_prepare_price_alerts_no_price_drops():
     )
 
     mock_ti.xcom_push.assert_called_once_with(**expected_call)
+
+
+def legacy_prepare_price_alerts(data, location_price_statistics):
+    """The original json_normalize based transform, kept as the reference output."""
+    flight_prices_df = pd.json_normalize(data, sep="_")
+    flight_prices_df["cheapest_price"] = np.where(
+        flight_prices_df["content_flightQuotes_cheapest_direct"],
+        flight_prices_df["content_flightQuotes_cheapest_rawPrice"],
+        flight_prices_df["content_flightQuotes_direct_rawPrice"],
+    )
+    flight_prices_df = flight_prices_df[flight_prices_df["cheapest_price"] >= 0]
+    flight_prices_df["content_location_name"] = flight_prices_df[
+        "content_location_name"
+    ].replace(r" ", "_", regex=True)
+    flight_prices_df = (
+        flight_prices_df.loc[
+            :, ["skyId", "content_location_name", "cheapest_price", "timestamp"]
+        ]
+        .rename(columns={"content_location_name": "location", "skyId": "sky_id"})
+        .dropna()
+    )
+    all_rows = flight_prices_df.to_dict(orient="records")
+    flight_prices_df[["average_price", "std_dev"]] = flight_prices_df["location"].apply(
+        lambda loc: pd.Series(location_price_statistics.get(loc, (np.nan, np.nan)))
+    )
+    flight_prices_df = flight_prices_df.dropna(subset=["average_price", "std_dev"])
+    low_flight_prices_df = flight_prices_df[
+        flight_prices_df["cheapest_price"]
+        < np.maximum(
+            flight_prices_df["average_price"] - 0.5 * flight_prices_df["std_dev"],
+            flight_prices_df["average_price"] * 0.9,
+        )
+    ].drop(columns=["std_dev"])
+    return all_rows, low_flight_prices_df.to_dict(orient="records")
+
+
+def irregular_results(n, seed=0, flags=(True, False, None, "missing")):
+    """Results with missing, null and negative fields as the API sometimes returns."""
+    rng = random.Random(seed)
+    results = []
+    for i in range(n):
+        quotes = {
+            "cheapest": {"rawPrice": rng.choice([rng.uniform(20, 300), -1.0])},
+            "direct": {"rawPrice": rng.uniform(20, 300)},
+        }
+        flag = rng.choice(flags)
+        if flag != "missing":
+            quotes["cheapest"]["direct"] = flag
+        if rng.random() < 0.05:
+            del quotes["direct"]["rawPrice"]
+        location = {"name": rng.choice(["Denmark", "United Kingdom", "Costa Rica"])}
+        if rng.random() < 0.05:
+            location = {}
+        entry = {
+            "skyId": rng.choice(["DK", "UK", "CR", None]),
+            "content": {"location": location, "flightQuotes": quotes},
+            "timestamp": "2025-03-16 19:25:46.590256",
+        }
+        results.append(entry)
+    return results
+
+
+def test_arrow_transform_matches_legacy_transform_with_null_flags():
+    # Arrow tables, as the local artifact store hands them over, cannot keep a
+    # flag missing from only some results apart from a null one.
+    data = irregular_results(2000, flags=(True, False, None))
+    expected, _ = legacy_prepare_price_alerts(data, {})
+    assert extract_flight_prices(to_table(data)).to_dict(orient="records") == expected
+
+
+def test_arrow_transform_treats_absent_flags_as_direct():
+    data = irregular_results(200, flags=("missing",))
+    expected = extract_flight_prices(data)
+    assert extract_flight_prices(to_table(data)).equals(expected)
+
+
+def test_prepare_price_alerts_matches_legacy_transform():
+    data = irregular_results(2000)
+    location_price_statistics = {"Denmark": (150, 40), "United_Kingdom": (200.5, 0)}
+    mock_ti = MagicMock()
+    mock_ti.xcom_pull.return_value = data
+    prepare_price_alerts(location_price_statistics, ti=mock_ti)
+
+    all_rows, rows_to_notify = legacy_prepare_price_alerts(
+        data, location_price_statistics
+    )
+    mock_ti.xcom_push.assert_has_calls(
+        [
+            call(key="all_rows", value=all_rows),
+            call(key="rows_to_notify", value=rows_to_notify),
+        ]
+    )
+    assert rows_to_notify
+
+
+def test_find_price_drops_per_origin():
+    flight_prices_df = pd.DataFrame(
+        {
+            "location": ["Belgium", "Belgium"],
+            "origin": ["WARS", "KRK"],
+            "cheapest_price": [85.0, 85.0],
+        }
+    )
+    statistics = {
+        ("WARS", "Belgium"): (100.0, 10.0),
+        ("KRK", "Belgium"): (80.0, 4.0),
+    }
+    drops = find_price_drops(flight_prices_df, statistics, ("origin", "location"))
+    assert drops["origin"].tolist() == ["WARS"]
+
+
+def test_quantile_baselines_alert_below_the_percentile_only():
+    rng = np.random.default_rng(0)
+    prices = rng.lognormal(5, 0.5, 10000)
+    quotes = pd.DataFrame({"location": "Belgium", "cheapest_price": prices})
+    drops = {}
+    for percent in (10, 25):
+        median, percentile = np.quantile(prices, [0.5, percent / 100])
+        statistics = {"Belgium": (median, 2 * (median - percentile))}
+        drops[percent] = len(
+            find_price_drops(quotes, statistics, mode=f"quantile:{percent}")
+        )
+        assert drops[percent] == pytest.approx(percent / 100 * len(prices), rel=0.01)
+    statistics = {"Belgium": (median, 2 * (median - percentile))}
+    # Other modes also alert 10% below the mean, whatever the spread.
+    assert len(find_price_drops(quotes, statistics, mode="all")) > drops[25]
+
+
+def test_plan_shards_splits_origins():
+    origins = [{"fromEntityId": f"origin-{i}"} for i in range(5)]
+    with patch(
+        "dags.flight_price_tracker.data_pipeline.build_search_params",
+        return_value=origins,
+    ):
+        shards = plan_shards(2)
+        assert plan_shards(1) == [{"search_params": origins}]
+        assert len(plan_shards(10)) == 5
+    assert [len(shard["search_params"]) for shard in shards] == [3, 2]
@@ -0,0 +1,321 @@
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock, call
+import numpy as np
+import pandas as pd
+import pytest
+from airflow.exceptions import AirflowException
+from dags.flight_price_tracker import elasticsearch_utils
+from dags.flight_price_tracker.quantile_sketch import TDigest
+from dags.flight_price_tracker.elasticsearch_utils import (
+    ElasticsearchConnection,
+    document_id,
+    price_read_indices,
+)
+
+ROWS = [
+    {
+        "sky_id": "DK",
+        "location": "Denmark",
+        "cheapest_price": 30.0,
+        "timestamp": "2025-03-16T19:25:46.590256",
+    },
+    {
+        "sky_id": "BE",
+        "location": "Belgium",
+        "cheapest_price": 40.0,
+        "timestamp": "2025-03-16T19:25:46.590256",
+    },
+]
+
+
+@pytest.fixture
+def mock_es():
+    es = MagicMock()
+    with patch.object(ElasticsearchConnection, "_client", es), patch.object(
+        ElasticsearchConnection, "_bootstrapped", True
+    ):
+        yield es
+
+
+def bulk_results(actions, statuses):
+    """parallel_bulk style (ok, item) results for the given per-document statuses."""
+    for action, status in zip(actions, statuses):
+        result = {"_id": action["_id"], "status": status}
+        if status >= 300:
+            result["error"] = {"type": "mapper_parsing_exception"}
+        yield status < 300, {"create": result}
+
+
+def test_document_id_is_deterministic():
+    assert document_id(ROWS[0]) == document_id(dict(ROWS[0]))
+    assert document_id(ROWS[0]) != document_id({**ROWS[0], "origin": "WARS"})
+
+
+def test_index_data_retry_merges_the_batch_again(mock_es):
+    # A retry after a failed merge finds every document indexed already.
+    ti = MagicMock(run_id="scheduled__2025-03-16", map_index=2)
+    ti.xcom_pull.return_value = ROWS
+    with patch(
+        "elasticsearch.helpers.parallel_bulk",
+        side_effect=lambda es, actions, **kwargs: bulk_results(actions, [409, 409]),
+    ), patch.object(
+        elasticsearch_utils, "STATISTICS_MODE", "incremental"
+    ), patch.object(
+        ElasticsearchConnection, "update_running_statistics"
+    ) as update, patch.object(
+        elasticsearch_utils, "baseline_cache"
+    ) as baseline_cache:
+        ElasticsearchConnection().index_data(ti=ti)
+    assert update.call_args.args[0]["location"].tolist() == ["Denmark", "Belgium"]
+    assert update.call_args.kwargs["batch"] == "scheduled__2025-03-16|2"
+    baseline_cache.bump_version.assert_called_once()
+
+
+def test_merges_record_their_batch(mock_es):
+    rows = pd.DataFrame({"location": ["Denmark"], "cheapest_price": [30.0]})
+    with patch("elasticsearch.helpers.bulk") as mock_bulk:
+        ElasticsearchConnection().update_running_statistics(rows, batch="run|0")
+    (action,) = mock_bulk.call_args.args[1]
+    assert action["script"]["params"]["batch"] == "run|0"
+    assert action["upsert"]["batches"] == ["run|0"]
+
+
+def test_sketches_skip_batches_already_merged(mock_es):
+    stored = TDigest().update([100.0])
+    mock_es.mget.return_value = {
+        "docs": [
+            {
+                "_id": "WARS|Denmark|2025-03",
+                "found": True,
+                "_seq_no": 7,
+                "_primary_term": 1,
+                "_source": {"sketch": stored.to_base64(), "batches": ["run|0"]},
+            }
+        ]
+    }
+    rows = pd.DataFrame(
+        {
+            "origin": ["WARS"],
+            "location": ["Denmark"],
+            "cheapest_price": [80.0],
+            "timestamp": ["2025-03-16T19:25:46.590256"],
+        }
+    )
+    with patch("elasticsearch.helpers.bulk", return_value=(0, [])) as mock_bulk:
+        ElasticsearchConnection().update_quantile_sketches(rows, batch="run|0")
+        assert list(mock_bulk.call_args.args[1]) == []
+        ElasticsearchConnection().update_quantile_sketches(rows, batch="run|1")
+        (action,) = mock_bulk.call_args.args[1]
+    assert action["_source"]["batches"] == ["run|0", "run|1"]
+    assert action["_source"]["count"] == 2
+
+
+def test_seed_statistics_rebuilds_what_the_modes_read(mock_es):
+    with patch.object(
+        elasticsearch_utils, "STATISTICS_MODE", "incremental"
+    ), patch.object(
+        elasticsearch_utils, "BASELINE_MODE", "quantile:25"
+    ), patch.multiple(
+        ElasticsearchConnection,
+        rebuild_running_statistics=MagicMock(),
+        rebuild_daily_rollups=MagicMock(),
+        rebuild_quantile_sketches=MagicMock(),
+    ), patch.object(
+        elasticsearch_utils, "baseline_cache"
+    ) as baseline_cache:
+        ElasticsearchConnection().seed_statistics()
+        ElasticsearchConnection.rebuild_running_statistics.assert_called_once()
+        ElasticsearchConnection.rebuild_quantile_sketches.assert_called_once()
+        ElasticsearchConnection.rebuild_daily_rollups.assert_not_called()
+    mock_es.indices.refresh.assert_called_once()
+    baseline_cache.bump_version.assert_called_once()
+
+
+def test_stream_bulk_reports_failures_after_all_chunks(mock_es):
+    actions = [{"_id": str(i)} for i in range(5)]
+    consumed = []
+
+    def parallel_bulk(es, actions, **kwargs):
+        for result in bulk_results(actions, [201, 400, 201, 201, 400]):
+            consumed.append(result)
+            yield result
+
+    with patch(
+        "elasticsearch.helpers.parallel_bulk", side_effect=parallel_bulk
+    ), patch.object(elasticsearch_utils.logger, "warning") as warning:
+        with pytest.raises(AirflowException, match="2 documents failed"):
+            ElasticsearchConnection().stream_bulk(iter(actions), chunk_size=2)
+    assert len(consumed) == 5
+    assert [c.args[1] for c in warning.call_args_list] == ["1", "4"]
+
+
+def test_stream_bulk_logs_the_first_failures_only(mock_es):
+    actions = [{"_id": str(i)} for i in range(25)]
+    results = bulk_results(actions, [400] * 25)
+    with patch(
+        "elasticsearch.helpers.parallel_bulk", return_value=results
+    ), patch.object(elasticsearch_utils.logger, "warning") as warning:
+        with pytest.raises(AirflowException, match="25 documents failed"):
+            ElasticsearchConnection().stream_bulk(iter(actions))
+    assert warning.call_count == elasticsearch_utils.FAILURES_LOGGED
+
+
+def test_read_indices_cover_the_window_months():
+    now = datetime(2025, 3, 16, tzinfo=timezone.utc)
+    with patch.object(elasticsearch_utils, "INDEX_PARTITIONING", "monthly"):
+        assert price_read_indices(45, now=now) == [
+            "flight_prices-2025.01",
+            "flight_prices-2025.02",
+            "flight_prices-2025.03",
+        ]
+        assert price_read_indices() == "flight_prices_read"
+    assert price_read_indices(45, now=now) == "flight_prices"
+
+
+def test_retention_downsamples_before_deleting(mock_es):
+    mock_es.indices.get.return_value = {
+        "flight_prices-2024.01": {},
+        "flight_prices-2024.02": {},
+        "flight_prices-2025.03": {},
+    }
+    calls = MagicMock()
+    mock_es.indices.delete.side_effect = calls.delete
+    with patch.object(
+        elasticsearch_utils, "INDEX_PARTITIONING", "monthly"
+    ), patch.object(
+        elasticsearch_utils, "months_ago", return_value="flight_prices-2024.02"
+    ), patch.object(
+        ElasticsearchConnection, "rebuild_daily_rollups", side_effect=calls.rebuild
+    ):
+        ElasticsearchConnection().apply_retention()
+    assert calls.mock_calls == [
+        call.rebuild(source="flight_prices-2024.01"),
+        call.delete(index="flight_prices-2024.01"),
+    ]
+
+
+def test_client_is_recreated_after_fork_with_cached_hosts():
+    with patch.object(ElasticsearchConnection, "_client", None), patch.object(
+        ElasticsearchConnection, "_hosts", None
+    ), patch.object(elasticsearch_utils, "ELASTIC_HOSTS", []), patch.object(
+        elasticsearch_utils, "ELASTIC_PASSWORD", "password"
+    ), patch(
+        "airflow.hooks.base.BaseHook.get_connection",
+        return_value=MagicMock(host="http://localhost:9200"),
+    ) as get_connection:
+        first = ElasticsearchConnection().es
+        assert ElasticsearchConnection().es is first
+        ElasticsearchConnection._reset_after_fork()
+        assert ElasticsearchConnection().es is not first
+    get_connection.assert_called_once()
+
+
+def test_operation_errors_are_counted(mock_es):
+    mock_es.search.side_effect = ConnectionError("unreachable")
+    with patch("airflow.stats.Stats.incr") as incr:
+        with pytest.raises(ConnectionError):
+            ElasticsearchConnection().get_location_price_statistics(("location",))
+    incr.assert_called_once_with("flight_price_tracker.es.search.errors")
+
+
+def test_index_creation_is_timed(mock_es):
+    with patch.object(
+        ElasticsearchConnection, "_iter_price_stats", return_value=[]
+    ), patch.object(elasticsearch_utils.helpers, "bulk"), patch(
+        "airflow.stats.Stats.timing"
+    ) as timing:
+        ElasticsearchConnection().rebuild_running_statistics()
+    timed = [call.args[0] for call in timing.call_args_list]
+    assert "flight_price_tracker.es.create" in timed
+
+
+def test_bootstrap_installs_templates_once_per_deployment(mock_es, tmp_path):
+    with patch.object(
+        elasticsearch_utils, "BOOTSTRAP_MARKER", str(tmp_path / "marker")
+    ), patch.object(
+        ElasticsearchConnection, "_hosts", ["http://localhost:9200"]
+    ), patch.object(
+        ElasticsearchConnection, "_bootstrapped", False
+    ):
+        ElasticsearchConnection().bootstrap()
+        ElasticsearchConnection().bootstrap()
+        # A new worker process finds the marker left by the first one.
+        ElasticsearchConnection._bootstrapped = False
+        ElasticsearchConnection().bootstrap()
+    templates = [
+        template.kwargs["name"]
+        for template in mock_es.indices.put_index_template.mock_calls
+    ]
+    assert templates == [
+        "flight_prices",
+        "flight_prices_location_stats",
+        "flight_prices_daily",
+        "flight_prices_location_sketches",
+    ]
+
+
+def test_sketch_updates_retry_conflicting_writes(mock_es):
+    stored = TDigest().update([100.0, 120.0])
+    mock_es.mget.side_effect = [
+        {"docs": [{"_id": "WARS|Denmark|2025-03", "found": False}]},
+        {
+            "docs": [
+                {
+                    "_id": "WARS|Denmark|2025-03",
+                    "found": True,
+                    "_seq_no": 7,
+                    "_primary_term": 1,
+                    "_source": {"sketch": stored.to_base64()},
+                }
+            ]
+        },
+    ]
+    writes = []
+
+    def bulk(es, actions, **kwargs):
+        writes.append(list(actions))
+        # Another run created the sketch between the first read and write.
+        if len(writes) == 1:
+            return 0, [{"create": {"_id": "WARS|Denmark|2025-03", "status": 409}}]
+        return 1, []
+
+    rows = pd.DataFrame(
+        {
+            "origin": ["WARS"],
+            "location": ["Denmark"],
+            "cheapest_price": [80.0],
+            "timestamp": ["2025-03-16T19:25:46.590256"],
+        }
+    )
+    with patch("elasticsearch.helpers.bulk", side_effect=bulk):
+        ElasticsearchConnection().update_quantile_sketches(rows)
+    retry = writes[1][0]
+    assert retry["_op_type"] == "index" and retry["if_seq_no"] == 7
+    assert retry["_source"]["count"] == 3
+    assert TDigest.from_base64(retry["_source"]["sketch"]).min == 80.0
+
+
+def test_quantile_statistics_merge_origins_and_months(mock_es):
+    rng = np.random.default_rng(0)
+    prices = rng.lognormal(5, 0.5, 4000)
+    hits = [
+        {
+            "_source": {
+                "origin": origin,
+                "location": "Denmark",
+                "month": month,
+                "sketch": TDigest().update(part).to_base64(),
+            }
+        }
+        for (origin, month), part in zip(
+            [("WARS", "2025-02"), ("WARS", "2025-03"), ("KRK", "2025-03")],
+            np.array_split(prices, 3),
+        )
+    ]
+    with patch("elasticsearch.helpers.scan", return_value=hits):
+        statistics = ElasticsearchConnection().get_quantile_statistics(
+            25, ("location",)
+        )
+    median, spread = statistics["Denmark"]
+    assert median == pytest.approx(np.percentile(prices, 50), rel=0.01)
+    assert median - 0.5 * spread == pytest.approx(np.percentile(prices, 25), rel=0.01)
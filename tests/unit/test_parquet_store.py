@@ -0,0 +1,139 @@
+import os
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from dags.flight_price_tracker.parquet_store import ParquetStore
+from dags.flight_price_tracker.elasticsearch_utils import ElasticsearchConnection
+from dags.flight_price_tracker import data_pipeline
+from dags.flight_price_tracker.storage_backend import (
+    StorageBackend,
+    get_storage_backend,
+)
+
+NOW = datetime(2025, 3, 16, 12)
+
+
+def quotes(n, location, origin=None, days=60, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(
+        {
+            "sky_id": [f"{location[:2].upper()}{i}" for i in range(n)],
+            "location": location,
+            "cheapest_price": rng.uniform(50, 150, n).round(2),
+            "timestamp": [
+                (NOW - timedelta(days=float(age))).isoformat()
+                for age in np.linspace(0, days, n)
+            ],
+        }
+    )
+    return frame if origin is None else frame.assign(origin=origin)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ParquetStore(str(tmp_path / "prices"))
+
+
+def test_statistics_match_pandas(store):
+    rows = pd.concat([quotes(40, "Denmark"), quotes(20, "Belgium", seed=1)])
+    store.write(rows)
+    # A retried write of the same rows replaces its file instead of adding one.
+    store.write(rows)
+    statistics = store.get_location_price_statistics(("location",))
+    denmark = rows[rows["location"] == "Denmark"]["cheapest_price"]
+    assert list(statistics) == ["Denmark"]
+    assert statistics["Denmark"] == pytest.approx((denmark.mean(), denmark.std(ddof=0)))
+
+
+def test_window_and_location_filters(store):
+    store.write(quotes(60, "Denmark", days=59).to_dict(orient="records"))
+    store.write(quotes(60, "Spain", days=59, seed=2).to_dict(orient="records"))
+    assert {
+        len(os.listdir(os.path.join(store.root, p))) for p in os.listdir(store.root)
+    }
+    table = store._scan(
+        ["location", "timestamp"], days=30, locations=["Spain"], now=NOW
+    )
+    assert set(table["location"].to_pylist()) == {"Spain"}
+    assert min(table["timestamp"].to_pylist()) >= (NOW - timedelta(days=30)).isoformat()
+    assert table.num_rows == 31
+
+
+def test_statistics_per_origin_skip_rows_without_origin(store):
+    store.write(quotes(30, "Denmark", origin="WARS"))
+    store.write(quotes(30, "Denmark", seed=3))
+    statistics = store.get_location_price_statistics(("origin", "location"))
+    assert list(statistics) == [("WARS", "Denmark")]
+
+
+def test_quantile_baseline_is_exact(store):
+    rows = quotes(101, "Denmark")
+    store.write(rows)
+    median, spread = store.get_baseline_statistics("quantile:25", ("location",))[
+        "Denmark"
+    ]
+    prices = rows["cheapest_price"]
+    assert median == pytest.approx(prices.quantile(0.5))
+    assert median - 0.5 * spread == pytest.approx(prices.quantile(0.25))
+
+
+def test_retention_compacts_and_deletes_months(store):
+    now = datetime.now()
+    old = (now - timedelta(days=800)).isoformat()
+    last_month = (now.replace(day=1) - timedelta(days=1)).isoformat()
+    for location, timestamp in [
+        ("Denmark", old),
+        ("Denmark", last_month),
+        ("Spain", last_month),
+    ]:
+        store.write(quotes(5, location).assign(timestamp=timestamp))
+    store.apply_retention(retention_months=12)
+    assert os.listdir(store.root) == [f"month={last_month[:7]}"]
+    assert os.listdir(os.path.join(store.root, f"month={last_month[:7]}")) == [
+        "compacted.parquet"
+    ]
+    assert store._scan(["location"]).num_rows == 10
+
+
+def test_index_data_writes_prepared_rows(store):
+    ti = MagicMock()
+    ti.xcom_pull.return_value = quotes(3, "Denmark").to_dict(orient="records")
+    store.index_data(ti=ti)
+    assert store._scan(["sky_id"]).num_rows == 3
+
+
+def test_index_data_writes_rows_from_the_local_artifact_store(store):
+    ti = MagicMock()
+    ti.xcom_pull.return_value = pa.Table.from_pandas(quotes(3, "Denmark"))
+    store.index_data(ti=ti)
+    assert store._scan(["sky_id"]).num_rows == 3
+
+
+def test_get_storage_backend():
+    # The registry imports the flat DAG-folder modules, so classes compare by name.
+    for name, class_name in (
+        ("parquet", "ParquetStore"),
+        ("elasticsearch", "ElasticsearchConnection"),
+    ):
+        backend_type = type(get_storage_backend(name))
+        assert backend_type.__name__ == class_name
+        assert "StorageBackend" in [base.__name__ for base in backend_type.__mro__]
+
+
+def test_storage_backends_implement_the_whole_interface():
+    with pytest.raises(TypeError):
+        StorageBackend()
+    assert not ParquetStore.__abstractmethods__
+    assert not ElasticsearchConnection.__abstractmethods__
+
+
+def test_baseline_cache_is_keyed_by_backend():
+    with patch.object(data_pipeline, "baseline_cache") as baseline_cache:
+        data_pipeline.get_baseline_statistics()
+        with patch.object(data_pipeline, "STORAGE_BACKEND", "parquet"):
+            data_pipeline.get_baseline_statistics()
+    keys = [c.args[0] for c in baseline_cache.get_or_compute.call_args_list]
+    assert keys[0][0] == "elasticsearch" and keys[1][0] == "parquet"
@@ -0,0 +1,234 @@
+from unittest.mock import patch, MagicMock
+import numpy as np
+import pandas as pd
+import pytest
+from dags.flight_price_tracker.elasticsearch_utils import ElasticsearchConnection
+from dags.flight_price_tracker.price_statistics import (
+    summarize_batch,
+    merge_statistics,
+    summaries_to_statistics,
+    parse_baseline_mode,
+    weighted_statistics,
+)
+
+
+@pytest.fixture
+def mock_es():
+    es = MagicMock()
+    with patch.object(ElasticsearchConnection, "_client", es):
+        yield es
+
+
+def test_merged_batches_match_full_history():
+    rng = np.random.default_rng(0)
+    prices = rng.lognormal(5, 0.5, 1000)
+    summary = (0, 0.0, 0.0)
+    for batch in np.array_split(prices, 7):
+        rows = pd.DataFrame({"location": "Denmark", "cheapest_price": batch})
+        batch_summary = summarize_batch(rows).iloc[0]
+        summary = merge_statistics(
+            summary,
+            (batch_summary["count"], batch_summary["mean"], batch_summary["m2"]),
+        )
+    mean, std = summaries_to_statistics({"Denmark": summary}, min_count=30)["Denmark"]
+    assert summary[0] == 1000
+    assert mean == pytest.approx(prices.mean())
+    assert std == pytest.approx(prices.std())
+
+
+def test_summaries_below_min_count_are_skipped():
+    summaries = {"Denmark": (30, 90.0, 3000.0), "Belgium": (29, 100.0, 0.0)}
+    assert summaries_to_statistics(summaries, min_count=30) == {"Denmark": (90.0, 10.0)}
+
+
+def test_update_running_statistics(mock_es):
+    rows = pd.DataFrame(
+        {
+            "location": ["Denmark", "Denmark", "Belgium"],
+            "cheapest_price": [30.0, 40.0, 37.0],
+        }
+    )
+    with patch("elasticsearch.helpers.bulk") as mock_bulk:
+        ElasticsearchConnection().update_running_statistics(rows)
+    actions = list(mock_bulk.call_args.args[1])
+    assert [action["_id"] for action in actions] == ["Denmark", "Belgium"]
+    assert actions[0]["upsert"] == {
+        "location": "Denmark",
+        "count": 2,
+        "mean": 35.0,
+        "sum": 70.0,
+        "m2": 50.0,
+        "sum_sq": 2500.0,
+    }
+    assert actions[0]["script"]["params"].items() >= actions[0]["upsert"].items()
+
+
+def test_get_running_statistics(mock_es):
+    hits = [
+        {"_source": {"location": "Denmark", "count": 30, "mean": 90.0, "m2": 3000.0}},
+        {"_source": {"location": "Belgium", "count": 2, "mean": 37.0, "m2": 0.0}},
+    ]
+    with patch("elasticsearch.helpers.scan", return_value=hits):
+        assert ElasticsearchConnection().get_running_statistics() == {
+            "Denmark": (90.0, 10.0)
+        }
+
+
+def test_parse_baseline_mode():
+    assert parse_baseline_mode("all") == ("all", None)
+    assert parse_baseline_mode("window:30") == ("window", 30.0)
+    assert parse_baseline_mode("ewm:3.5") == ("ewm", 3.5)
+    assert parse_baseline_mode("quantile:25") == ("quantile", 25.0)
+    with pytest.raises(ValueError):
+        parse_baseline_mode("window")
+    with pytest.raises(ValueError):
+        parse_baseline_mode("quantile:75")
+
+
+def test_weighted_statistics_match_daily_rollups():
+    rng = np.random.default_rng(1)
+    days = [rng.normal(100, 20, size) for size in (10, 25, 40)]
+    prices = np.concatenate(days)
+    mean, std = weighted_statistics(
+        sum(len(day) for day in days),
+        sum(day.sum() for day in days),
+        sum((day**2).sum() for day in days),
+    )
+    assert mean == pytest.approx(prices.mean())
+    assert std == pytest.approx(prices.std())
+
+
+def test_update_daily_rollups(mock_es):
+    rows = pd.DataFrame(
+        {
+            "location": ["Denmark", "Denmark", "Denmark"],
+            "cheapest_price": [30.0, 40.0, 37.0],
+            "timestamp": [
+                "2025-03-16T19:25:46.590256",
+                "2025-03-16T19:55:46.590256",
+                "2025-03-17T08:25:46.590256",
+            ],
+        }
+    )
+    with patch("elasticsearch.helpers.bulk") as mock_bulk:
+        ElasticsearchConnection().update_daily_rollups(rows)
+    actions = list(mock_bulk.call_args.args[1])
+    assert [(action["_id"], action["upsert"]["count"]) for action in actions] == [
+        ("Denmark|2025-03-16", 2),
+        ("Denmark|2025-03-17", 1),
+    ]
+
+
+def test_get_baseline_statistics_with_decay(mock_es):
+    mock_es.search.return_value = {
+        "aggregations": {
+            "groups": {
+                "buckets": [
+                    {
+                        "key": {"location": "Denmark"},
+                        "count": {"value": 40},
+                        "weight": {"value": 20.0},
+                        "weighted_sum": {"value": 2000.0},
+                        "weighted_sum_sq": {"value": 202000.0},
+                    },
+                    {
+                        "key": {"location": "Belgium"},
+                        "count": {"value": 10},
+                        "weight": {"value": 10.0},
+                        "weighted_sum": {"value": 1000.0},
+                        "weighted_sum_sq": {"value": 100000.0},
+                    },
+                ]
+            }
+        }
+    }
+    statistics = ElasticsearchConnection().get_baseline_statistics("ewm:7")
+    assert statistics == {"Denmark": (100.0, 10.0)}
+    query = mock_es.search.call_args.kwargs["body"]
+    assert query["query"] == {"range": {"day": {"gte": "now-35d/d"}}}
+    weight = query["aggs"]["groups"]["aggs"]["weight"]["sum"]["script"]
+    assert weight["params"]["half_life"] == 7 * 86400 * 1000
+
+
+def price_stats(avg, std):
+    return {"avg": avg, "std_deviation": std}
+
+
+def test_location_statistics_follow_composite_pages(mock_es):
+    mock_es.search.side_effect = [
+        {
+            "aggregations": {
+                "groups": {
+                    "after_key": {"location": "Belgium"},
+                    "buckets": [
+                        {
+                            "key": {"location": "Belgium"},
+                            "doc_count": 40,
+                            "price_stats": price_stats(100.0, 10.0),
+                        }
+                    ],
+                }
+            }
+        },
+        {
+            "aggregations": {
+                "groups": {
+                    "after_key": {"location": "Denmark"},
+                    "buckets": [
+                        {
+                            "key": {"location": "Denmark"},
+                            "doc_count": 10,
+                            "price_stats": price_stats(90.0, 5.0),
+                        }
+                    ],
+                }
+            }
+        },
+        {"aggregations": {"groups": {"buckets": []}}},
+    ]
+    statistics = ElasticsearchConnection().get_location_price_statistics(("location",))
+    assert statistics == {"Belgium": (100.0, 10.0)}
+    last_query = mock_es.search.call_args.kwargs["body"]
+    assert last_query["aggs"]["groups"]["composite"]["after"] == {"location": "Denmark"}
+
+
+def test_partitioned_statistics_group_by_origin(mock_es):
+    mock_es.search.return_value = {
+        "aggregations": {
+            "location": {
+                "sum_other_doc_count": 0,
+                "buckets": [
+                    {
+                        "key": "Belgium",
+                        "doc_count": 70,
+                        "origin": {
+                            "buckets": [
+                                {
+                                    "key": "WARS",
+                                    "doc_count": 40,
+                                    "price_stats": price_stats(100.0, 10.0),
+                                },
+                                {
+                                    "key": "KRK",
+                                    "doc_count": 30,
+                                    "price_stats": price_stats(80.0, 4.0),
+                                },
+                            ]
+                        },
+                    }
+                ],
+            }
+        }
+    }
+    statistics = ElasticsearchConnection().get_location_price_statistics(
+        ("origin", "location"), partitions=2
+    )
+    assert statistics == {
+        ("WARS", "Belgium"): (100.0, 10.0),
+        ("KRK", "Belgium"): (80.0, 4.0),
+    }
+    includes = sorted(
+        call.kwargs["body"]["aggs"]["location"]["terms"]["include"]["partition"]
+        for call in mock_es.search.call_args_list
+    )
+    assert includes == [0, 1]
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from dags.flight_price_tracker.quantile_sketch import TDigest
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.9, 0.99]
+
+
+def rank_errors(digest, values):
+    values = np.sort(values)
+    return [
+        abs(np.searchsorted(values, digest.quantile(q)) / len(values) - q)
+        for q in QUANTILES
+    ]
+
+
+def test_incremental_updates_track_exact_quantiles():
+    prices = np.random.default_rng(0).lognormal(5, 0.6, 50000)
+    digest = TDigest()
+    for batch in np.array_split(prices, 500):
+        digest.update(batch)
+    assert max(rank_errors(digest, prices)) < 0.005
+    assert digest.count == len(prices)
+    assert len(digest.means) <= digest.compression / 2 + 1
+
+
+def test_merged_sketches_match_a_single_sketch():
+    prices = np.random.default_rng(1).lognormal(5, 0.6, 20000)
+    merged = TDigest()
+    for part in np.array_split(prices, 12):
+        merged.merge(TDigest().update(part))
+    assert max(rank_errors(merged, prices)) < 0.005
+    assert merged.min == prices.min() and merged.max == prices.max()
+
+
+def test_serialization_round_trip():
+    digest = TDigest().update([10.0, 20.0, 30.0, 40.0])
+    restored = TDigest.from_base64(digest.to_base64())
+    assert restored.quantile(0.25) == digest.quantile(0.25)
+    assert restored.count == 4
+    assert TDigest.from_base64(TDigest().to_base64()).count == 0
+
+
+def test_small_and_empty_sketches():
+    assert np.isnan(TDigest().quantile(0.5))
+    assert TDigest().update([42.0]).quantile(0.1) == 42.0
+    assert TDigest().update([10.0, 20.0]).quantile(0.5) == pytest.approx(15.0)
@@ -0,0 +1,101 @@
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+import aiohttp
+import pytest
+from dags.flight_price_tracker.rate_limiter import (
+    TokenBucket,
+    RequestScheduler,
+    parse_retry_after,
+)
+
+
+def mock_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+def test_token_bucket_queues_callers_beyond_capacity():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 5.0
+    assert bucket.reserve() == 0.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def test_scheduler_retries_throttled_requests():
+    scheduler = RequestScheduler(rate=100, capacity=10, max_retries=3)
+    responses = [
+        mock_response(429, {"Retry-After": "2"}),
+        mock_response(503),
+        mock_response(200),
+    ]
+    with patch("requests.get", side_effect=responses), patch(
+        "time.sleep"
+    ) as mock_sleep:
+        response = scheduler.get("https://example.com")
+    assert response.status_code == 200
+    assert scheduler.counters == {"sent": 3, "throttled": 1, "retried": 2}
+    assert max(call.args[0] for call in mock_sleep.call_args_list) >= 2
+
+
+def test_scheduler_gives_up_after_max_retries():
+    scheduler = RequestScheduler(rate=100, capacity=10, max_retries=2)
+    with patch("requests.get", return_value=mock_response(429)), patch("time.sleep"):
+        response = scheduler.get("https://example.com")
+    assert response.status_code == 429
+    assert scheduler.counters == {"sent": 3, "throttled": 3, "retried": 2}
+
+
+def test_scheduler_does_not_retry_client_errors():
+    scheduler = RequestScheduler(rate=100, capacity=10)
+    with patch("requests.get", return_value=mock_response(404)) as mock_get:
+        assert scheduler.get("https://example.com").status_code == 404
+    assert mock_get.call_count == 1
+
+
+class FakeSession:
+    """aiohttp-like session whose requests fail or answer from a list of outcomes."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    def get(self, url, **kwargs):
+        outcome = self.outcomes.pop(0)
+        context = MagicMock()
+        if isinstance(outcome, Exception):
+            context.__aenter__ = AsyncMock(side_effect=outcome)
+        else:
+            response = MagicMock(status=outcome, headers={}, content_length=100)
+            response.json = AsyncMock(return_value={"status": outcome})
+            context.__aenter__ = AsyncMock(return_value=response)
+        context.__aexit__ = AsyncMock(return_value=False)
+        return context
+
+
+def test_async_scheduler_retries_transport_errors():
+    scheduler = RequestScheduler(rate=100, capacity=10, max_retries=3)
+    session = FakeSession(
+        [aiohttp.ClientConnectionError("reset"), asyncio.TimeoutError(), 200]
+    )
+    with patch("asyncio.sleep", AsyncMock()):
+        status, body = asyncio.run(scheduler.get_async(session, "https://example.com"))
+    assert (status, body) == (200, {"status": 200})
+    assert scheduler.counters == {"sent": 3, "throttled": 0, "retried": 2}
+    assert scheduler.received_bytes == 100
+
+
+def test_async_scheduler_raises_after_max_retries():
+    scheduler = RequestScheduler(rate=100, capacity=10, max_retries=1)
+    session = FakeSession([aiohttp.ClientConnectionError("reset")] * 2)
+    with patch("asyncio.sleep", AsyncMock()), pytest.raises(aiohttp.ClientError):
+        asyncio.run(scheduler.get_async(session, "https://example.com"))
+    assert scheduler.counters["sent"] == 2
@@ -0,0 +1,71 @@
+from unittest.mock import patch
+from dags.flight_price_tracker.response_cache import (
+    ResponseCache,
+    QuoteDiff,
+    cache_key,
+    quote_price,
+)
+
+URL = "https://sky-scanner3.p.rapidapi.com/flights/search-roundtrip"
+
+
+def quote(sky_id, price, direct=True):
+    return {
+        "skyId": sky_id,
+        "content": {
+            "flightQuotes": {
+                "cheapest": {"rawPrice": price, "direct": direct},
+                "direct": {"rawPrice": price + 10, "direct": True},
+            }
+        },
+    }
+
+
+def test_cache_key_ignores_param_order():
+    assert cache_key(URL, {"a": 1, "b": 2}) == cache_key(URL, {"b": 2, "a": 1})
+    assert cache_key(URL, {"a": 1}) != cache_key(URL, {"a": 2})
+
+
+def test_quote_price():
+    assert quote_price(quote("DK", 34.0)) == 34.0
+    assert quote_price(quote("DK", 34.0, direct=False)) == 44.0
+
+
+def test_response_cache_expires(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), ttl=60)
+    cache.put(URL, {"fromEntityId": "A"}, [quote("DK", 34.0)])
+    assert cache.get(URL, {"fromEntityId": "A"}) == [quote("DK", 34.0)]
+    assert cache.get(URL, {"fromEntityId": "B"}) is None
+    with patch("time.time", return_value=10**12):
+        assert cache.get(URL, {"fromEntityId": "A"}) is None
+
+
+def test_response_cache_disabled(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), ttl=0)
+    cache.put(URL, {"fromEntityId": "A"}, [quote("DK", 34.0)])
+    assert cache.get(URL, {"fromEntityId": "A"}) is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_quote_diff_passes_only_changed_quotes(tmp_path):
+    diff = QuoteDiff(directory=str(tmp_path))
+    params = {"fromEntityId": "A"}
+    first = [quote("DK", 34.0), quote("BE", 37.0)]
+    assert diff.changed_quotes(URL, params, first) == first
+    second = [quote("DK", 34.0), quote("BE", 30.0), quote("IT", 43.0)]
+    assert [q["skyId"] for q in diff.changed_quotes(URL, params, second)] == [
+        "BE",
+        "IT",
+    ]
+    assert diff.changed_quotes(URL, {"fromEntityId": "B"}, first) == first
+
+
+def test_quote_diff_retry_passes_on_the_same_quotes(tmp_path):
+    diff = QuoteDiff(directory=str(tmp_path))
+    params = {"fromEntityId": "A"}
+    diff.changed_quotes(URL, params, [quote("DK", 34.0)], run_id="run_1")
+    second = [quote("DK", 30.0), quote("BE", 37.0)]
+    for _ in range(2):
+        changed = diff.changed_quotes(URL, params, second, run_id="run_2")
+        assert [q["skyId"] for q in changed] == ["DK", "BE"]
+    assert diff.changed_quotes(URL, params, second, run_id="run_3") == []
@@ -0,0 +1,153 @@
+import random
+import pandas as pd
+from dags.flight_price_tracker.subscriptions import (
+    SubscriptionIndex,
+    SubscriptionStore,
+    load_subscription_index,
+    match_subscriptions,
+    normalize,
+)
+from dags.flight_price_tracker.email_utils import build_digests
+from dags.flight_price_tracker.price_statistics import baseline_label
+
+LOCATIONS = ["Denmark", "Belgium", "Spain", "Italy"]
+
+
+def random_subscriptions(n, rng):
+    subscriptions = []
+    for i in range(n):
+        subscription = {"id": str(i), "email": f"user{i % 7}@example.com"}
+        kind = rng.random()
+        if kind < 0.5:
+            subscription["locations"] = rng.sample(LOCATIONS, rng.randint(1, 2))
+        elif kind < 0.8:
+            subscription["sky_ids"] = [f"SKY{rng.randint(0, 9)}"]
+        if rng.random() < 0.5:
+            subscription["max_price"] = rng.uniform(50, 150)
+        subscription["sensitivity"] = rng.uniform(0, 2)
+        subscriptions.append(normalize(subscription))
+    return subscriptions
+
+
+def brute_force_match(subscriptions, location, sky_id, price, mean, std, floor=0.9):
+    return {
+        subscription["id"]
+        for subscription in subscriptions
+        if (
+            not subscription["locations"]
+            and not subscription["sky_ids"]
+            or location in subscription["locations"]
+            or sky_id in subscription["sky_ids"]
+        )
+        and price < max(mean - subscription["sensitivity"] * std, floor * mean)
+        and (subscription["max_price"] is None or price <= subscription["max_price"])
+    }
+
+
+def test_index_matches_brute_force():
+    rng = random.Random(0)
+    subscriptions = random_subscriptions(500, rng)
+    index = SubscriptionIndex(subscriptions)
+    for _ in range(500):
+        quote = (
+            rng.choice(LOCATIONS),
+            f"SKY{rng.randint(0, 9)}",
+            rng.uniform(40, 160),
+            rng.uniform(80, 120),
+            rng.choice([0.0, rng.uniform(1, 30)]),
+        )
+        matched = [subscription["id"] for subscription in index.match(*quote)]
+        assert len(matched) == len(set(matched))
+        assert set(matched) == brute_force_match(subscriptions, *quote)
+
+
+def test_quantile_index_has_no_mean_floor():
+    rng = random.Random(1)
+    subscriptions = random_subscriptions(500, rng)
+    index = SubscriptionIndex(subscriptions, mean_floor=False)
+    for _ in range(500):
+        quote = (
+            rng.choice(LOCATIONS),
+            f"SKY{rng.randint(0, 9)}",
+            rng.uniform(40, 160),
+            rng.uniform(80, 120),
+            rng.choice([0.0, rng.uniform(1, 30)]),
+        )
+        matched = {subscription["id"] for subscription in index.match(*quote)}
+        assert matched == brute_force_match(subscriptions, *quote, floor=0)
+
+
+def test_match_subscriptions_emits_one_row_per_recipient_match():
+    index = SubscriptionIndex(
+        [
+            normalize({"id": "1", "email": "a@example.com", "locations": ["Denmark"]}),
+            normalize({"id": "2", "email": "b@example.com", "max_price": 50.0}),
+        ]
+    )
+    quotes = pd.DataFrame(
+        {
+            "sky_id": ["DK", "BE"],
+            "location": ["Denmark", "Belgium"],
+            "cheapest_price": [80.0, 80.0],
+            "average_price": [100.0, 100.0],
+            "std_dev": [10.0, 10.0],
+        }
+    )
+    alerts = match_subscriptions(quotes, index)
+    assert alerts[["location", "email"]].values.tolist() == [
+        ["Denmark", "a@example.com"]
+    ]
+    assert "std_dev" not in alerts.columns
+
+
+def test_store_round_trip(tmp_path):
+    store = SubscriptionStore(str(tmp_path / "subscriptions.jsonl"))
+    assert load_subscription_index(store) is None
+    store.add([{"id": "1", "email": "a@example.com", "sky_ids": ["DK"]}])
+    assert store.load() == [
+        {
+            "id": "1",
+            "email": "a@example.com",
+            "locations": [],
+            "sky_ids": ["DK"],
+            "max_price": None,
+            "sensitivity": 0.5,
+        }
+    ]
+    assert ("sky_id", "DK") in load_subscription_index(store).buckets
+
+
+def test_build_digests_groups_alerts_by_recipient():
+    rows = [
+        {"location": "Denmark", "cheapest_price": 80.0, "average_price": 100.0},
+        {
+            "location": "Belgium",
+            "origin": "WARS",
+            "cheapest_price": 70.0,
+            "average_price": 90.0,
+            "email": "a@example.com",
+        },
+        {
+            "location": "Spain",
+            "cheapest_price": 60.0,
+            "average_price": 80.0,
+            "email": "a@example.com",
+        },
+    ]
+    digests = build_digests(rows, default_recipient="ops@example.com")
+    assert [digest["to"] for digest in digests] == [
+        "ops@example.com",
+        "a@example.com",
+    ]
+    assert digests[0]["html_content"] == (
+        "The following locations have flight deals:\n\n"
+        "Location: Denmark, Cheapest Price: $80.0, Average Price: $100.0\n"
+    )
+    assert "Origin: WARS, Location: Belgium" in digests[1]["html_content"]
+    assert "Location: Spain" in digests[1]["html_content"]
+
+
+def test_quantile_digests_show_the_median():
+    rows = [{"location": "Denmark", "cheapest_price": 80.0, "average_price": 100.0}]
+    digest = build_digests(rows, "ops@example.com", baseline_label("quantile:10"))[0]
+    assert "Median Price: $100.0" in digest["html_content"]
@@ -0,0 +1,72 @@
+import json
+import tracemalloc
+from unittest.mock import patch, MagicMock
+import pandas as pd
+import pyarrow as pa
+import pytest
+from dags.flight_price_tracker import telemetry
+from dags.flight_price_tracker.data_pipeline import prepare_price_alerts
+
+
+def load_json(file_path):
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def exporters():
+    exporters = telemetry.configure("memory")
+    exporters["spans"].clear()
+    yield exporters
+
+
+def test_prepare_price_alerts_records_stage_spans(exporters):
+    mock_ti = MagicMock()
+    mock_ti.xcom_pull.return_value = load_json(
+        "tests/unit/test_data/test_prepare_price_alerts_input.json"
+    )["data"]["everywhereDestination"]["results"]
+    prepare_price_alerts({"Denmark": (90, 10), "Belgium": (100, 10)}, ti=mock_ti)
+
+    spans = {span.name: span for span in exporters["spans"].get_finished_spans()}
+    assert set(spans) == {
+        "prepare_price_alerts",
+        "prepare_price_alerts.extract",
+        "prepare_price_alerts.find_price_drops",
+    }
+    extract = spans["prepare_price_alerts.extract"]
+    assert extract.parent.span_id == spans["prepare_price_alerts"].context.span_id
+    assert extract.attributes["rows"] > 0
+    assert spans["prepare_price_alerts"].attributes["duration_ms"] > 0
+
+    metrics = exporters["metrics"].get_metrics_data()
+    names = {
+        metric.name
+        for resource_metrics in metrics.resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    }
+    assert "flight_price_tracker.stage.duration" in names
+    assert "flight_price_tracker.stage.rows" in names
+
+
+def test_profile_mode_dumps_outermost_stage(exporters, tmp_path):
+    with patch.object(telemetry, "TELEMETRY_PROFILE_DIR", str(tmp_path)):
+        with telemetry.stage("outer"):
+            with telemetry.stage("inner"):
+                sum(range(1000))
+    dumps = sorted(path.name.split("-")[0] for path in tmp_path.iterdir())
+    assert dumps == ["outer", "outer"]
+
+
+def test_stages_trace_allocations_only_in_profile_mode(exporters):
+    with telemetry.stage("outer"):
+        assert not tracemalloc.is_tracing()
+    span = exporters["spans"].get_finished_spans()[-1]
+    assert span.attributes["process.peak_rss_bytes"] > 0
+
+
+def test_payload_size_does_not_serialize_rows():
+    rows = [{"cheapest_price": 40.0}, {"cheapest_price": 50.0}]
+    assert telemetry.payload_size(pa.Table.from_pylist(rows)) > 0
+    assert telemetry.payload_size(pd.DataFrame(rows)) > 0
+    assert telemetry.payload_size(rows) is None